@@ -0,0 +1,129 @@
+"""Compare the original image loader with the current one.
+
+The original read every pixel into a list of ints and rebuilt the frame buffer with one pixel call per pixel on every
+get_framebuffer. The current loader reads straight into the RGB565 buffer and builds the frame buffer once.
+
+Run on the Pico with `mpremote run benchmarks/bench_image.py` after copying the logger's files to the board, or on a
+host with `python benchmarks/bench_image.py`. Host runs use the stand-in modules from tests/fakes, so only the
+allocation figures are meaningful there.
+"""
+import os
+import struct
+import sys
+
+try:
+    import framebuf
+except ImportError:
+    # CPython, use the stand-ins for the MicroPython modules
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path[:0] = [os.path.join(root, "tests", "fakes"), root]
+    import framebuf
+
+import deflate
+import gc
+import utime
+
+import image
+
+WIDTH = 64
+HEIGHT = 64
+REPEATS = 5
+FILENAME = "bench_image.bin"
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+
+def measure(function) -> tuple:
+    """Run function REPEATS times. Returns the mean time in microseconds and the mean bytes allocated per call.
+
+    On the Pico the allocation is everything allocated with the garbage collector paused. CPython frees memory as it
+    goes, so there it is the peak memory in use during the call."""
+    gc.collect()
+    start = utime.ticks_us()
+    for _ in range(REPEATS):
+        function()
+    elapsed = utime.ticks_diff(utime.ticks_us(), start)
+
+    allocated = 0
+    gc.collect()
+    for _ in range(REPEATS):
+        if tracemalloc:
+            tracemalloc.start()
+            function()
+            allocated += tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        else:
+            gc.disable()
+            before = gc.mem_alloc()
+            function()
+            allocated += gc.mem_alloc() - before
+            gc.enable()
+    return elapsed // REPEATS, allocated // REPEATS
+
+
+def sample_payload() -> bytes:
+    """A greyscale image in the original format: mode, width and height then one byte per pixel."""
+    pixels = bytearray(WIDTH * HEIGHT)
+    for i in range(len(pixels)):
+        pixels[i] = (i * 7) & 0xFF
+    return bytes([0, WIDTH, HEIGHT]) + pixels
+
+
+def write_zlib(filename: str, data: bytes):
+    """Write data as a zlib stream of uncompressed blocks, which needs no compressor on the device."""
+    a = 1
+    b = 0
+    for byte in data:
+        a = (a + byte) % 65521
+        b = (b + a) % 65521
+    with open(filename, "wb") as f:
+        f.write(b"\x78\x01")
+        for start in range(0, len(data), 65535):
+            block = data[start:start + 65535]
+            final = 1 if start + 65535 >= len(data) else 0
+            f.write(struct.pack("<BHH", final, len(block), len(block) ^ 0xFFFF))
+            f.write(block)
+        f.write(struct.pack(">I", b << 16 | a))
+
+
+def old_load(filename: str) -> list:
+    """The original loader: inflate to bytes, then a list of ints converted to RGB565."""
+    with open(filename, "rb") as f:
+        with deflate.DeflateIO(f, deflate.ZLIB) as d:
+            data = d.read()
+    data = [int(x) for x in data[3:]]
+    return [(pixel & 0b00011100) << 11 | (pixel & 0b11111000) << 5 | (pixel & 0b11111000) |
+            (pixel & 0b11100000) >> 5 for pixel in data]
+
+
+def old_get_framebuffer(data: list) -> framebuf.FrameBuffer:
+    buffer = framebuf.FrameBuffer(bytearray(HEIGHT * WIDTH * 2), WIDTH, HEIGHT, framebuf.RGB565)
+    for x in range(WIDTH):
+        for y in range(HEIGHT):
+            buffer.pixel(x, y, data[x + y * WIDTH])
+    return buffer
+
+
+def main():
+    write_zlib(FILENAME, sample_payload())
+    try:
+        data = old_load(FILENAME)
+        loaded = image.Image(FILENAME)
+        results = (
+            ("old load", measure(lambda: old_load(FILENAME))),
+            ("old get_framebuffer", measure(lambda: old_get_framebuffer(data))),
+            ("new load", measure(lambda: image.Image(FILENAME))),
+            ("new get_framebuffer", measure(loaded.get_framebuffer)),
+        )
+    finally:
+        os.remove(FILENAME)
+    print(f"{WIDTH}x{HEIGHT} greyscale image, mean of {REPEATS} runs")
+    for name, (us, allocated) in results:
+        print(f"{name:20} {us / 1000:8.1f} ms {allocated:8d} bytes")
+
+
+if __name__ == "__main__":
+    main()
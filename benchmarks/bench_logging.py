@@ -0,0 +1,115 @@
+"""Compare the frame time of drawing plot points with the original per-point prints against the levelled logger.
+
+The original plot_data_points printed six lines for every point. On the Pico these go to the USB serial port, which
+dominates the frame time. The current code logs one debug message per point, which is skipped entirely at the
+default level.
+
+Run on the Pico with `mpremote run benchmarks/bench_logging.py` after copying the logger's files to the board, or on
+a host with `python benchmarks/bench_logging.py`. Host runs use the stand-in modules from tests/fakes and print to
+the null device, so they show the formatting cost but not the cost of the serial port.
+"""
+import os
+import sys
+
+try:
+    import framebuf
+except ImportError:
+    # CPython, use the stand-ins for the MicroPython modules
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    sys.path[:0] = [os.path.join(root, "tests", "fakes"), root]
+
+import utime
+
+from ext.waveshare.lcd import LCD
+from logger import log, DEBUG, INFO, ERROR
+from plot import ScatterPlot
+
+POINTS = 120
+REPEATS = 5
+
+if sys.implementation.name == "micropython":
+    echo = print
+else:
+    _null = open(os.devnull, "w")
+
+    def echo(text: str):
+        print(text, file=_null)
+
+
+def old_plot_data_points(plot: ScatterPlot, data: tuple, x_labels: list, y_labels: list, x_axis: tuple,
+                         y_axis: tuple):
+    """plot_data_points as it was before the logger, with its prints."""
+    x_axis_min = float(x_labels[0])
+    x_axis_max = float(x_labels[-1])
+    echo(f"x axis range: {x_axis_min}, {x_axis_max}")
+    x_axis_range = x_axis_max - x_axis_min
+    y_axis_min = float(y_labels[0])
+    y_axis_max = float(y_labels[-1])
+    echo(f"y axis range: {y_axis_min}, {y_axis_max}")
+    y_axis_range = y_axis_max - y_axis_min
+    x_axis_pixel_min = x_axis[0]
+    x_axis_pixel_max = x_axis[2]
+    echo(f"x axis pixel range: {x_axis_pixel_min}, {x_axis_pixel_max}")
+    x_axis_pixel_range = x_axis_pixel_max - x_axis_pixel_min
+    y_axis_pixel_min = y_axis[1]
+    y_axis_pixel_max = y_axis[3]
+    echo(f"y axis pixel range: {y_axis_pixel_min}, {y_axis_pixel_max}")
+    y_axis_pixel_range = y_axis_pixel_max - y_axis_pixel_min
+    for index in range(len(data[0])):
+        echo(f"data: x {data[0][index]}, y{data[1][index]}")
+        data_x_fraction = (data[0][index] - x_axis_min) / x_axis_range
+        echo(f"data: x fraction {data_x_fraction}")
+        x_pixel_position = round(x_axis_pixel_min + (x_axis_pixel_range * data_x_fraction))
+        echo(f"data: x pixel position {x_pixel_position}")
+        data_y_fraction = (data[1][index] - y_axis_min) / y_axis_range
+        echo(f"data: y fraction {data_y_fraction}")
+        y_pixel_position = round(y_axis_pixel_max - (y_axis_pixel_range * data_y_fraction))
+        echo(f"data: y pixel position {y_pixel_position}")
+        plot.screen.pixel(x_pixel_position, y_pixel_position, plot.colour)
+
+
+def frame_us(draw) -> int:
+    """Mean time in microseconds to draw the points and send them to the display."""
+    start = utime.ticks_us()
+    for _ in range(REPEATS):
+        draw()
+    return utime.ticks_diff(utime.ticks_us(), start) // REPEATS
+
+
+def main():
+    screen = LCD()
+    plot = ScatterPlot(screen, (0, 40), (160, 88))
+    y_data = [2000 + (i * 37) % 400 for i in range(POINTS)]
+    data = (range(POINTS), y_data)
+    plot.update_plot(data, y_scale=100)
+    x_labels = [str(value) for value in plot.axis_labels(data[0], 8)[0]]
+    y_labels = [str(value) for value in plot.axis_labels(y_data, 6, 100)[0]]
+    float_data = (data[0], [value / 100 for value in y_data])
+    x_axis, y_axis = plot._axes
+    x_transform, y_transform = plot._transforms
+
+    def old():
+        old_plot_data_points(plot, float_data, x_labels, y_labels, x_axis, y_axis)
+        screen.show()
+
+    def new():
+        plot.plot_data_points(data, x_transform, y_transform)
+        screen.show()
+
+    level, echo_level = log.level, log.echo_level
+    results = [("print per point", frame_us(old))]
+    log.level = INFO
+    results.append(("logger, debug off", frame_us(new)))
+    # Debug messages kept in the ring buffer but not printed
+    log.level = DEBUG
+    log.echo_level = ERROR
+    results.append(("logger, debug on", frame_us(new)))
+    log.level, log.echo_level = level, echo_level
+
+    print(f"{POINTS} points, mean of {REPEATS} frames")
+    for name, us in results:
+        print(f"{name:20} {us / 1000:8.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+import os
+import struct
+
+RECORD_FORMAT = "<Ihh"  # Timestamp in seconds, temperature and humidity multiplied by SCALE
+RECORD_SIZE = struct.calcsize(RECORD_FORMAT)
+SCALE = 100
+SEGMENT_SUFFIX = ".bin"
+
+
+class DataLog:
+    """Append-only log of readings stored in flash as fixed size binary records.
+
+    Records are buffered in RAM and written a block at a time to limit flash wear. The log is split into numbered
+    segment files in directory, and the oldest segment is deleted once there are more than max_segments. At boot the
+    write position comes from the size of the newest segment and the newest timestamp from its last record, so the log
+    is never scanned. Records older than the newest are rejected, for example ones stamped with the RTC's power-on
+    time before the clock is set, so timestamps never decrease and reads can find a time range by binary search.
+    """
+
+    def __init__(self, directory: str = "log", buffer_records: int = 64, segment_records: int = 8192,
+                 max_segments: int = 8):
+        """
+        :param directory: Directory holding the segment files.
+        :param buffer_records: Number of records held in RAM before they are written.
+        :param segment_records: Number of records in a segment before a new one is started.
+        :param max_segments: Number of segments to keep.
+        """
+        self.directory = directory
+        self.segment_records = segment_records
+        self.max_segments = max_segments
+        self._buffer = bytearray(buffer_records * RECORD_SIZE)
+        self._buffer_records = buffer_records
+        self._buffered = 0
+        self.rejected = 0  # Records not added because they were older than the newest
+
+        if directory not in os.listdir():
+            os.mkdir(directory)
+        self.segments = self._list_segments()
+        if not self.segments:
+            self.segments.append(0)
+            self._segment_len = 0
+        else:
+            size = self._segment_size(self.segments[-1])
+            self._segment_len = size // RECORD_SIZE
+            if size < RECORD_SIZE:
+                # A write was interrupted before a whole record was written, so start the segment again
+                os.remove(self._path(self.segments[-1]))
+                self._segment_len = 0
+            elif size % RECORD_SIZE:
+                # A write was interrupted, leave the partial record behind and start afresh
+                self._rotate()
+        self.last_timestamp = self._last_timestamp()
+
+    def _list_segments(self) -> list[int]:
+        names = [name for name in os.listdir(self.directory) if name.endswith(SEGMENT_SUFFIX)]
+        return sorted(int(name[:-len(SEGMENT_SUFFIX)]) for name in names)
+
+    def _path(self, segment: int) -> str:
+        return f"{self.directory}/{segment:05}{SEGMENT_SUFFIX}"
+
+    def _segment_size(self, segment: int) -> int:
+        return os.stat(self._path(segment))[6]
+
+    def _rotate(self):
+        self.segments.append(self.segments[-1] + 1)
+        self._segment_len = 0
+        while len(self.segments) > self.max_segments:
+            os.remove(self._path(self.segments.pop(0)))
+
+    def append(self, timestamp: int, temperature: float, humidity: float) -> bool:
+        """Add a record, writing the buffer to flash if it is full. Returns False, without adding it, if the record is
+        older than the newest in the log."""
+        if timestamp < self.last_timestamp:
+            self.rejected += 1
+            return False
+        self.last_timestamp = timestamp
+        struct.pack_into(RECORD_FORMAT, self._buffer, self._buffered * RECORD_SIZE, timestamp,
+                         round(temperature * SCALE), round(humidity * SCALE))
+        self._buffered += 1
+        if self._buffered == self._buffer_records:
+            self.flush()
+        return True
+
+    def flush(self):
+        """Write any buffered records to flash."""
+        view = memoryview(self._buffer)
+        written = 0
+        while written < self._buffered:
+            if self._segment_len == self.segment_records:
+                self._rotate()
+            count = min(self._buffered - written, self.segment_records - self._segment_len)
+            with open(self._path(self.segments[-1]), "ab") as f:
+                f.write(view[written * RECORD_SIZE:(written + count) * RECORD_SIZE])
+            written += count
+            self._segment_len += count
+        self._buffered = 0
+
+    def records(self, start_time: int = 0, end_time: int = None):
+        """Iterate over (timestamp, temperature, humidity) for records with start_time <= timestamp <= end_time,
+        oldest first. Buffered records are flushed first."""
+        self.flush()
+        record = bytearray(RECORD_SIZE)
+        # Binary search for the last segment whose first record is not after start_time. Only the newest segment can
+        # be empty.
+        low = 0
+        high = len(self.segments)
+        if not self._segment_count(self.segments[-1]):
+            high -= 1
+        while low < high:
+            middle = (low + high) // 2
+            if self._first_timestamp(self.segments[middle], record) <= start_time:
+                low = middle + 1
+            else:
+                high = middle
+        first = max(low - 1, 0)
+
+        for index in range(first, len(self.segments)):
+            segment = self.segments[index]
+            count = self._segment_count(segment)
+            if count == 0:
+                continue
+            with open(self._path(segment), "rb") as f:
+                position = _bisect(f, count, start_time, record) if index == first else 0
+                f.seek(position * RECORD_SIZE)
+                for _ in range(position, count):
+                    f.readinto(record)
+                    timestamp, temperature, humidity = struct.unpack(RECORD_FORMAT, record)
+                    if end_time is not None and timestamp > end_time:
+                        return
+                    yield timestamp, temperature / SCALE, humidity / SCALE
+
+    def _segment_count(self, segment: int) -> int:
+        if segment == self.segments[-1]:
+            return self._segment_len
+        return self._segment_size(segment) // RECORD_SIZE
+
+    def _first_timestamp(self, segment: int, record: bytearray) -> int:
+        with open(self._path(segment), "rb") as f:
+            f.readinto(record)
+        return struct.unpack_from("<I", record)[0]
+
+    def _last_timestamp(self) -> int:
+        """The timestamp of the newest record in flash, or 0 if there are none."""
+        record = bytearray(RECORD_SIZE)
+        for segment in reversed(self.segments):
+            count = self._segment_count(segment)
+            if count:
+                with open(self._path(segment), "rb") as f:
+                    f.seek((count - 1) * RECORD_SIZE)
+                    f.readinto(record)
+                return struct.unpack_from("<I", record)[0]
+        return 0
+
+
+def _bisect(f, count: int, timestamp: int, record: bytearray) -> int:
+    """Index of the first record in the open segment f with a timestamp of at least timestamp."""
+    low = 0
+    high = count
+    while low < high:
+        middle = (low + high) // 2
+        f.seek(middle * RECORD_SIZE)
+        f.readinto(record)
+        if struct.unpack_from("<I", record)[0] < timestamp:
+            low = middle + 1
+        else:
+            high = middle
+    return low
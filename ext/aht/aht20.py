@@ -26,6 +26,7 @@ MicroPython driver for the AHT20 Humidity and Temperature Sensor
 Author(s): Peter Crowther, Andreas Bühl, Kattni Rembor
 """
 
+import asyncio
 import utime
 from micropython import const
 from machine import I2C
@@ -60,10 +61,7 @@ class AHT20:
 
     def initialize(self):
         """Ask the sensor to self-initialize. Returns True on success, False otherwise."""
-        self._buf[0] = self.AHTX0_CMD_INITIALIZE
-        self._buf[1] = 0x08
-        self._buf[2] = 0x00
-        self._i2c.writeto(self._address, self._buf[0:3])
+        self._send_initialize()
         self._wait_for_idle()
         if not self.status & self.AHTX0_STATUS_CALIBRATED:
             return False
@@ -79,20 +77,41 @@ class AHT20:
     def relative_humidity(self) -> float:
         """The measured relative humidity in percent."""
         self._perform_measurement()
+        return self._convert_humidity()
+
+    @property
+    def temperature(self) -> float:
+        """The measured temperature in degrees Celsius."""
+        self._perform_measurement()
+        return self._convert_temperature()
+
+    def measure(self) -> tuple[float, float]:
+        """Take a single measurement. Returns the temperature in degrees Celsius and the relative humidity in
+        percent, both from the same conversion."""
+        self._perform_measurement()
+        return self._convert_temperature(), self._convert_humidity()
+
+    def _convert_humidity(self) -> float:
+        """Relative humidity from the last measurement in the buffer."""
         self._humidity = (
             (self._buf[1] << 12) | (self._buf[2] << 4) | (self._buf[3] >> 4)
         )
         self._humidity = (self._humidity * 100) / 0x100000
         return self._humidity
 
-    @property
-    def temperature(self) -> float:
-        """The measured temperature in degrees Celsius."""
-        self._perform_measurement()
+    def _convert_temperature(self) -> float:
+        """Temperature from the last measurement in the buffer."""
         self._temp = ((self._buf[3] & 0xF) << 16) | (self._buf[4] << 8) | self._buf[5]
         self._temp = ((self._temp * 200.0) / 0x100000) - 50
         return self._temp
 
+    def _send_initialize(self):
+        """Internal function for sending the calibration command."""
+        self._buf[0] = self.AHTX0_CMD_INITIALIZE
+        self._buf[1] = 0x08
+        self._buf[2] = 0x00
+        self._i2c.writeto(self._address, self._buf[0:3])
+
     def _read_to_buffer(self):
         """Read sensor data to buffer."""
         self._i2c.readfrom_into(self._address, self._buf)
@@ -114,3 +133,77 @@ class AHT20:
         self._trigger_measurement()
         self._wait_for_idle()
         self._read_to_buffer()
+
+
+class AsyncAHT20(AHT20):
+    """AHT20 driver which waits for conversions without blocking other asyncio tasks.
+
+    Usage::
+
+        sensor.trigger()
+        temperature, humidity = await sensor.result()
+    """
+
+    CONVERSION_TIME_MS = const(80)  # Measurement time from the datasheet
+    POLL_INTERVAL_MS = const(5)
+    BUSY_TIMEOUT_MS = const(200)  # Give up on a conversion and trigger another after this long
+
+    def __init__(self, i2c: I2C, address: int = AHT20.AHTX0_I2CADDR_DEFAULT, retries: int = 3):
+        """
+        :param i2c: The I2C bus the sensor is on.
+        :param address: The I2C address of the sensor.
+        :param retries: The number of times to retrigger a measurement that is busy, uncalibrated or fails its CRC.
+        """
+        self.retries = retries
+        self._frame = bytearray(7)  # Status, 5 data bytes and CRC
+        self._triggered_at = None
+        super().__init__(i2c, address)
+
+    def trigger(self):
+        """Start a measurement. The values are collected with result."""
+        self._trigger_measurement()
+        self._triggered_at = utime.ticks_ms()
+
+    async def result(self) -> tuple[float, float]:
+        """Wait for the triggered measurement, starting one if needed. Returns the temperature in degrees Celsius and
+        the relative humidity in percent."""
+        for _ in range(self.retries + 1):
+            if self._triggered_at is None:
+                self.trigger()
+            triggered_at = self._triggered_at
+            self._triggered_at = None
+
+            # The sensor is always busy until the conversion time has passed so don't poll before then
+            remaining = self.CONVERSION_TIME_MS - utime.ticks_diff(utime.ticks_ms(), triggered_at)
+            if remaining > 0:
+                await asyncio.sleep_ms(remaining)
+            self._i2c.readfrom_into(self._address, self._frame)
+            while (self._frame[0] & self.AHTX0_STATUS_BUSY and
+                   utime.ticks_diff(utime.ticks_ms(), triggered_at) < self.BUSY_TIMEOUT_MS):
+                await asyncio.sleep_ms(self.POLL_INTERVAL_MS)
+                self._i2c.readfrom_into(self._address, self._frame)
+
+            status = self._frame[0]
+            if not status & self.AHTX0_STATUS_CALIBRATED:
+                self._send_initialize()
+                await asyncio.sleep_ms(10)
+                continue
+            if status & self.AHTX0_STATUS_BUSY or _crc8(self._frame, 6) != self._frame[6]:
+                continue
+
+            self._buf[:] = self._frame[:6]
+            return self._convert_temperature(), self._convert_humidity()
+        raise RuntimeError("No valid measurement from sensor")
+
+
+def _crc8(data, length: int) -> int:
+    """CRC-8 of the first length bytes of data as calculated by the AHT20: polynomial 0x31, initial value 0xFF."""
+    crc = 0xFF
+    for index in range(length):
+        crc ^= data[index]
+        for _ in range(8):
+            if crc & 0x80:
+                crc = ((crc << 1) ^ 0x31) & 0xFF
+            else:
+                crc = (crc << 1) & 0xFF
+    return crc
@@ -1,4 +1,5 @@
 from machine import Pin, SPI, PWM
+import _thread
 import framebuf
 import utime
 
@@ -9,9 +10,45 @@ MOSI = 11
 SCK = 10
 CS = 9
 
+DEFAULT_BAUDRATE = 10_000_000
+# SPI clocks tried by LCD.calibrate. The RP2040 rounds each down to a divider of its peripheral clock.
+CALIBRATION_RATES = (10_000_000, 15_000_000, 20_000_000, 25_000_000, 31_250_000, 40_000_000, 50_000_000, 62_500_000)
+
+MAX_DIRTY_REGIONS = 8  # Above this the regions are collapsed into their bounding box
+
+# ST7735R initialisation as (command, parameters) pairs, sent in order.
+INIT_SEQUENCE = (
+    (0x36, b"\x70"),  # Memory data access control
+    (0x3A, b"\x05"),  # 16 bit colour
+    # ST7735R Frame Rate
+    (0xB1, b"\x01\x2C\x2D"),
+    (0xB2, b"\x01\x2C\x2D"),
+    (0xB3, b"\x01\x2C\x2D\x01\x2C\x2D"),
+    (0xB4, b"\x07"),  # Column inversion
+    # ST7735R Power Sequence
+    (0xC0, b"\xA2\x02\x84"),
+    (0xC1, b"\xC5"),
+    (0xC2, b"\x0A\x00"),
+    (0xC3, b"\x8A\x2A"),
+    (0xC4, b"\x8A\xEE"),
+    (0xC5, b"\x0E"),  # VCOM
+    # ST7735R Gamma Sequence
+    (0xE0, b"\x0F\x1A\x0F\x18\x2F\x28\x20\x22\x1F\x1B\x23\x37\x00\x07\x02\x10"),
+    (0xE1, b"\x0F\x1B\x0F\x17\x33\x2C\x29\x2E\x30\x30\x39\x3F\x00\x07\x03\x10"),
+    (0xF0, b"\x01"),  # Enable test command
+    (0xF6, b"\x00"),  # Disable ram power save mode
+    (0x11, b""),  # Sleep out
+    (0x29, b""),  # Turn on the LCD display
+)
+
 
 class LCD(framebuf.FrameBuffer):
-    def __init__(self):
+    def __init__(self, double_buffer: bool = False, baudrate: int = DEFAULT_BAUDRATE):
+        """
+        :param double_buffer: Send frames from a second buffer on another thread, so drawing can continue while the
+            previous frame is transferred.
+        :param baudrate: SPI clock in Hz. Use calibrate to find the fastest the display accepts.
+        """
         self.width = 160
         self.height = 128
 
@@ -19,14 +56,34 @@ class LCD(framebuf.FrameBuffer):
         self.rst = Pin(RST, Pin.OUT)
 
         self.cs(1)
-        self.spi = SPI(1)
-        self.spi = SPI(1, 1000_000)
-        self.spi = SPI(1, 10000_000, polarity=0, phase=0, sck=Pin(SCK), mosi=Pin(MOSI), miso=None)
+        self.baudrate = baudrate
+        self.spi = SPI(1, baudrate, polarity=0, phase=0, sck=Pin(SCK), mosi=Pin(MOSI), miso=None)
         self.dc = Pin(DC, Pin.OUT)
         self.dc(1)
+        # Preallocated so that commands do not allocate on every write
+        self._cmd_buf = bytearray(1)
+        self._window_buf = bytearray(4)
         self.buffer = bytearray(self.height * self.width * 2)
+        self._view = memoryview(self.buffer)
         super().__init__(self.buffer, self.width, self.height, framebuf.RGB565)
+        # Regions of the buffer changed since the last show as inclusive [x0, y0, x1, y1] pixel bounds
+        self.dirty = []
+        self.mark_dirty(0, 0, self.width, self.height)
+        self.reset_stats()
         self.init_display()
+
+        self.double_buffer = double_buffer
+        if double_buffer:
+            self._front = bytearray(len(self.buffer))
+            self._front_view = memoryview(self._front)
+            # Regions copied to the front buffer and waiting to be sent
+            self._pending = []
+            # Held by the main thread while there is no work for the transfer thread
+            self._work = _thread.allocate_lock()
+            self._work.acquire()
+            # Held while a transfer is in progress
+            self._idle = _thread.allocate_lock()
+            _thread.start_new_thread(self._transfer_worker, ())
         
         self.WHITE = 0xFFFF
         self.BLACK = 0x0000
@@ -34,18 +91,192 @@ class LCD(framebuf.FrameBuffer):
         self.BLUE = 0xF800
         self.RED = 0x07E0
 
+    def mark_dirty(self, x: int, y: int, w: int, h: int):
+        """Record a rectangle of the buffer as changed so that the next call to show sends it to the display.
+        Overlapping or touching regions are merged."""
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self.width) - 1
+        y1 = min(y + h, self.height) - 1
+        if x1 < x0 or y1 < y0:
+            return
+        regions = self.dirty
+        i = 0
+        while i < len(regions):
+            r = regions[i]
+            if x0 <= r[2] + 1 and r[0] <= x1 + 1 and y0 <= r[3] + 1 and r[1] <= y1 + 1:
+                x0 = min(x0, r[0])
+                y0 = min(y0, r[1])
+                x1 = max(x1, r[2])
+                y1 = max(y1, r[3])
+                regions.pop(i)
+                # The grown region may now touch one already checked
+                i = 0
+            else:
+                i += 1
+        regions.append([x0, y0, x1, y1])
+        if len(regions) > MAX_DIRTY_REGIONS:
+            bounds = [min(r[0] for r in regions), min(r[1] for r in regions),
+                      max(r[2] for r in regions), max(r[3] for r in regions)]
+            regions.clear()
+            regions.append(bounds)
+
+    def fill(self, c):
+        super().fill(c)
+        self.mark_dirty(0, 0, self.width, self.height)
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            return super().pixel(x, y)
+        super().pixel(x, y, c)
+        self.mark_dirty(x, y, 1, 1)
+
+    def hline(self, x, y, w, c):
+        super().hline(x, y, w, c)
+        self.mark_dirty(x, y, w, 1)
+
+    def vline(self, x, y, h, c):
+        super().vline(x, y, h, c)
+        self.mark_dirty(x, y, 1, h)
+
+    def line(self, x1, y1, x2, y2, c):
+        super().line(x1, y1, x2, y2, c)
+        self.mark_dirty(min(x1, x2), min(y1, y2), abs(x2 - x1) + 1, abs(y2 - y1) + 1)
+
+    def rect(self, x, y, w, h, c, f=False):
+        super().rect(x, y, w, h, c, f)
+        self.mark_dirty(x, y, w, h)
+
+    def fill_rect(self, x, y, w, h, c):
+        super().fill_rect(x, y, w, h, c)
+        self.mark_dirty(x, y, w, h)
+
+    def text(self, s, x, y, c=1):
+        super().text(s, x, y, c)
+        self.mark_dirty(x, y, 8 * len(s), 8)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        """As FrameBuffer.blit. The source size is taken from its width and height attributes if it has them,
+        otherwise the whole screen is marked as changed."""
+        super().blit(fbuf, x, y, key, palette)
+        width = getattr(fbuf, "width", None)
+        height = getattr(fbuf, "height", None)
+        if width is None or height is None:
+            self.mark_dirty(0, 0, self.width, self.height)
+        else:
+            self.mark_dirty(x, y, width, height)
+
+    def scroll(self, xstep, ystep):
+        super().scroll(xstep, ystep)
+        self.mark_dirty(0, 0, self.width, self.height)
+
+    def reset_stats(self):
+        """Clear the transfer statistics."""
+        self.frames = 0
+        self.bytes_sent = 0
+        self.transfer_us = 0
+        self.last_frame_us = 0
+        self.max_frame_us = 0
+        self.transfer_errors = 0  # Frames the transfer thread failed to send
+        self.last_transfer_error = None
+
+    @property
+    def bytes_per_second(self) -> float:
+        """Measured throughput of the frames sent so far, including command overhead."""
+        if self.transfer_us == 0:
+            return 0
+        return self.bytes_sent * 1_000_000 / self.transfer_us
+
+    @property
+    def mean_frame_us(self) -> float:
+        if self.frames == 0:
+            return 0
+        return self.transfer_us / self.frames
+
+    def report(self) -> str:
+        return (f"display: {self.frames} frames at {self.baudrate / 1_000_000:.1f} MHz, "
+                f"{self.bytes_per_second / 1000:.0f} kB/s, frame mean {self.mean_frame_us / 1000:.1f} ms "
+                f"max {self.max_frame_us / 1000:.1f} ms, errors {self.transfer_errors}")
+
+    def set_baudrate(self, baudrate: int):
+        """Change the SPI clock, after any frame being sent in the background has finished."""
+        self.wait()
+        self.spi.init(baudrate=baudrate)
+        self.baudrate = baudrate
+
+    def draw_test_pattern(self, label: str):
+        """Fill the screen with colour bars above single pixel stripes, which are the most sensitive to a clock that
+        is too fast, and write label in the middle."""
+        colours = (self.WHITE, self.RED, self.GREEN, self.BLUE, self.BLACK)
+        bar_width = self.width // len(colours)
+        half = self.height // 2
+        self.fill(self.BLACK)
+        for i, colour in enumerate(colours):
+            self.fill_rect(i * bar_width, 0, bar_width, half, colour)
+        for x in range(0, self.width, 2):
+            self.vline(x, half, half // 2, self.WHITE)
+        for y in range(half + half // 2, self.height, 2):
+            self.hline(0, y, self.width, self.WHITE)
+        self.fill_rect(0, half - 4, self.width, 8, self.BLACK)
+        self.text(label, 2, half - 4, self.WHITE)
+
+    def calibrate(self, confirm, rates: tuple = CALIBRATION_RATES, repeats: int = 4) -> int:
+        """Find the fastest SPI clock at which the display is drawn correctly and leave the SPI set to it.
+
+        The rates are tried in increasing order, sending a test pattern repeats times at each to measure the
+        throughput. The display cannot be read back so confirm decides whether the pattern is correct. The search
+        stops at the first rate rejected, or when the throughput stops rising because the clock has reached the limit
+        of the SPI peripheral.
+        :param confirm: A function taking the rate in Hz and the measured bytes per second, returning True if the test
+            pattern is drawn correctly.
+        :param rates: SPI clocks in Hz to try.
+        :param repeats: Number of full frames to time at each rate.
+        :return: The fastest rate accepted.
+        """
+        best = self.baudrate
+        best_throughput = 0
+        for rate in rates:
+            self.set_baudrate(rate)
+            self.draw_test_pattern(f"{rate / 1_000_000:.1f} MHz")
+            self.reset_stats()
+            for _ in range(repeats):
+                self.mark_dirty(0, 0, self.width, self.height)
+                self.show()
+                self.wait()
+            throughput = self.bytes_per_second
+            # A few percent is allowed for timing noise between rates which map to the same divider
+            if throughput < best_throughput * 1.05 or not confirm(rate, throughput):
+                break
+            best = rate
+            best_throughput = throughput
+        self.set_baudrate(best)
+        self.reset_stats()
+        return best
+
     def write_cmd(self, cmd):
+        self.write_cmd_data(cmd)
+
+    def write_data(self, buf):
+        self._cmd_buf[0] = buf
         self.cs(1)
-        self.dc(0)
+        self.dc(1)
         self.cs(0)
-        self.spi.write(bytearray([cmd]))
+        self.spi.write(self._cmd_buf)
         self.cs(1)
 
-    def write_data(self, buf):
+    def write_cmd_data(self, cmd: int, payload=None):
+        """Send a command followed by its parameters, holding CS low for the whole transfer.
+        :param cmd: The command byte.
+        :param payload: An optional buffer of parameter bytes.
+        """
+        self._cmd_buf[0] = cmd
         self.cs(1)
-        self.dc(1)
+        self.dc(0)
         self.cs(0)
-        self.spi.write(bytearray([buf]))
+        self.spi.write(self._cmd_buf)
+        if payload:
+            self.dc(1)
+            self.spi.write(payload)
         self.cs(1)
 
     def init_display(self):
@@ -53,128 +284,102 @@ class LCD(framebuf.FrameBuffer):
         self.rst(1)
         self.rst(0)
         self.rst(1)
-        
-        self.write_cmd(0x36)
-        self.write_data(0x70)
-        
-        self.write_cmd(0x3A)
-        self.write_data(0x05)
-
-        # ST7735R Frame Rate
-        self.write_cmd(0xB1)
-        self.write_data(0x01)
-        self.write_data(0x2C)
-        self.write_data(0x2D)
-
-        self.write_cmd(0xB2)
-        self.write_data(0x01)
-        self.write_data(0x2C)
-        self.write_data(0x2D)
-
-        self.write_cmd(0xB3)
-        self.write_data(0x01)
-        self.write_data(0x2C)
-        self.write_data(0x2D)
-        self.write_data(0x01)
-        self.write_data(0x2C)
-        self.write_data(0x2D)
-
-        # Column inversion
-        self.write_cmd(0xB4)
-        self.write_data(0x07)
-
-        # ST7735R Power Sequence
-        self.write_cmd(0xC0)
-        self.write_data(0xA2)
-        self.write_data(0x02)
-        self.write_data(0x84)
-        self.write_cmd(0xC1)
-        self.write_data(0xC5)
-
-        self.write_cmd(0xC2)
-        self.write_data(0x0A)
-        self.write_data(0x00)
-
-        self.write_cmd(0xC3)
-        self.write_data(0x8A)
-        self.write_data(0x2A)
-        self.write_cmd(0xC4)
-        self.write_data(0x8A)
-        self.write_data(0xEE)
-
-        self.write_cmd(0xC5)  # VCOM
-        self.write_data(0x0E)
-
-        # ST7735R Gamma Sequence
-        self.write_cmd(0xe0)
-        self.write_data(0x0f)
-        self.write_data(0x1a)
-        self.write_data(0x0f)
-        self.write_data(0x18)
-        self.write_data(0x2f)
-        self.write_data(0x28)
-        self.write_data(0x20)
-        self.write_data(0x22)
-        self.write_data(0x1f)
-        self.write_data(0x1b)
-        self.write_data(0x23)
-        self.write_data(0x37)
-        self.write_data(0x00)
-        self.write_data(0x07)
-        self.write_data(0x02)
-        self.write_data(0x10)
-
-        self.write_cmd(0xe1)
-        self.write_data(0x0f)
-        self.write_data(0x1b)
-        self.write_data(0x0f)
-        self.write_data(0x17)
-        self.write_data(0x33)
-        self.write_data(0x2c)
-        self.write_data(0x29)
-        self.write_data(0x2e)
-        self.write_data(0x30)
-        self.write_data(0x30)
-        self.write_data(0x39)
-        self.write_data(0x3f)
-        self.write_data(0x00)
-        self.write_data(0x07)
-        self.write_data(0x03)
-        self.write_data(0x10)
-
-        self.write_cmd(0xF0)  # Enable test command
-        self.write_data(0x01)
-
-        self.write_cmd(0xF6)  # Disable ram power save mode
-        self.write_data(0x00)
-
-        # sleep out
-        self.write_cmd(0x11)
-
-        # Turn on the LCD display
-        self.write_cmd(0x29)
+
+        for cmd, payload in INIT_SEQUENCE:
+            self.write_cmd_data(cmd, payload)
 
     def show(self):
-        self.write_cmd(0x2A)
-        self.write_data(0x00)
-        self.write_data(0x01)
-        self.write_data(0x00)
-        self.write_data(0xA0)
-        
-        self.write_cmd(0x2B)
-        self.write_data(0x00)
-        self.write_data(0x02)
-        self.write_data(0x00)
-        self.write_data(0x81)
-        
-        self.write_cmd(0x2C)
-        
+        """Send the regions of the buffer changed since the last call to the display.
+
+        With double buffering the regions are copied to the front buffer and sent on the transfer thread, so this
+        returns as soon as any previous transfer has finished and the copy is made."""
+        if not self.dirty:
+            return
+        if not self.double_buffer:
+            self._send(self.dirty, self._view)
+            self.dirty.clear()
+            return
+
+        self._idle.acquire()
+        row_bytes = self.width * 2
+        for x0, y0, x1, y1 in self.dirty:
+            start = y0 * row_bytes + x0 * 2
+            end = start + (x1 - x0 + 1) * 2
+            for _ in range(y0, y1 + 1):
+                self._front_view[start:end] = self._view[start:end]
+                start += row_bytes
+                end += row_bytes
+        # Swap the lists rather than copying so that no allocation is needed
+        self._pending, self.dirty = self.dirty, self._pending
+        self.dirty.clear()
+        self._work.release()
+
+    def wait(self):
+        """Block until any background transfer has finished."""
+        if self.double_buffer:
+            self._idle.acquire()
+            self._idle.release()
+
+    def _transfer_worker(self):
+        """Send each frame handed over by show from the front buffer. A frame which fails to send is counted in
+        transfer_errors and the thread carries on, so that show and wait never block on a transfer that has died."""
+        while True:
+            self._work.acquire()
+            try:
+                self._send(self._pending, self._front_view)
+            except Exception as e:
+                self.transfer_errors += 1
+                self.last_transfer_error = e
+            finally:
+                self._idle.release()
+
+    def _send(self, regions: list, view: memoryview):
+        """Send each region of view to the display and record the time taken."""
+        start = utime.ticks_us()
+        sent = 0
+        for x0, y0, x1, y1 in regions:
+            sent += self._write_window(x0, y0, x1, y1, view)
+        elapsed = utime.ticks_diff(utime.ticks_us(), start)
+        self.frames += 1
+        self.bytes_sent += sent
+        self.transfer_us += elapsed
+        self.last_frame_us = elapsed
+        self.max_frame_us = max(self.max_frame_us, elapsed)
+
+    def _write_window(self, x0: int, y0: int, x1: int, y1: int, view: memoryview) -> int:
+        """Send the inclusive rectangle x0, y0, x1, y1 of view to the same place on the display. Returns the number
+        of bytes written."""
+        # The panel RAM is offset by 1 column and 2 rows from the visible area
+        window = self._window_buf
+        window[0] = 0x00
+        window[1] = x0 + 1
+        window[2] = 0x00
+        window[3] = x1 + 1
+        self.write_cmd_data(0x2A, window)
+        window[1] = y0 + 2
+        window[3] = y1 + 2
+        self.write_cmd_data(0x2B, window)
+
+        # Keep CS low after RAMWR so the pixel data follows in the same transfer
+        self._cmd_buf[0] = 0x2C
         self.cs(1)
-        self.dc(1)
+        self.dc(0)
         self.cs(0)
-        self.spi.write(self.buffer)
+        self.spi.write(self._cmd_buf)
+        self.dc(1)
+        row_bytes = self.width * 2
+        if x0 == 0 and x1 == self.width - 1:
+            # Full width rows are contiguous in the buffer
+            self.spi.write(view[y0 * row_bytes:(y1 + 1) * row_bytes])
+        else:
+            start = y0 * row_bytes + x0 * 2
+            length = (x1 - x0 + 1) * 2
+            for _ in range(y0, y1 + 1):
+                self.spi.write(view[start:start + length])
+                start += row_bytes
         self.cs(1)
-
+        # Two windows of a command and four parameters, then RAMWR and the pixels
+        return 11 + (x1 - x0 + 1) * (y1 - y0 + 1) * 2
 
 if __name__ == '__main__':
     pwm = PWM(Pin(BL))
@@ -0,0 +1,89 @@
+import collections
+import deflate
+import framebuf
+import struct
+
+from ext.waveshare.lcd import LCD
+from image import Sprite, _readinto_all
+
+# Font header: magic, version, glyph height, number of glyphs. Each glyph then has FONT_ENTRY.
+FONT_MAGIC = b"FNT"
+FONT_HEADER = "<3sBBB"
+FONT_ENTRY = "<HBH"  # Character code, width, offset of the glyph bitmap
+
+
+class Font:
+    """A proportional bitmap font made by tools/font_to_binary.py.
+
+    Glyphs are stored packed at one bit per pixel and converted to RGB565 the first time they are drawn in a given
+    colour. The converted glyphs are kept in a least recently used cache so repeated characters cost a single blit.
+    """
+
+    def __init__(self, filename: str, cache_size: int = None):
+        """
+        :param filename: Path of the font file.
+        :param cache_size: The maximum number of converted glyphs to keep. By default one of each glyph in the font,
+            so text in a single colour is only converted once.
+        """
+        self.glyphs = {}
+        self.misses = 0  # Glyphs converted because they were not in the cache
+        self._cache = collections.OrderedDict()
+        self._palette = framebuf.FrameBuffer(bytearray(4), 2, 1, framebuf.RGB565)
+        with open(filename, 'rb') as f:
+            with deflate.DeflateIO(f, deflate.ZLIB) as d:
+                header = d.read(struct.calcsize(FONT_HEADER))
+                if len(header) != struct.calcsize(FONT_HEADER):
+                    raise SyntaxError(f"Error reading font from '{filename}'. Truncated header.")
+                magic, version, self.height, count = struct.unpack(FONT_HEADER, header)
+                if magic != FONT_MAGIC or version != 1:
+                    raise SyntaxError(f"Error reading font from '{filename}'. Unsupported font format.")
+                size = 0
+                for _ in range(count):
+                    code, width, offset = struct.unpack(FONT_ENTRY, d.read(struct.calcsize(FONT_ENTRY)))
+                    self.glyphs[chr(code)] = (width, offset)
+                    size = max(size, offset + (width + 7) // 8 * self.height)
+                # framebuf needs a writable buffer, so the bitmaps are read into a bytearray rather than as bytes
+                self.bitmaps = bytearray(size)
+                if _readinto_all(d, self.bitmaps) != size:
+                    raise SyntaxError(f"Error reading font from '{filename}'. Truncated glyph bitmaps.")
+        self.cache_size = len(self.glyphs) if cache_size is None else cache_size
+
+    def glyph(self, char: str, colour: int, background: int) -> Sprite:
+        """Get the glyph for char ready to blit, or None if the font does not have it."""
+        key = (char, colour, background)
+        sprite = self._cache.pop(key, None)
+        if sprite is None:
+            if char not in self.glyphs:
+                return None
+            self.misses += 1
+            width, offset = self.glyphs[char]
+            length = (width + 7) // 8 * self.height
+            mono = framebuf.FrameBuffer(memoryview(self.bitmaps)[offset:offset + length], width, self.height,
+                                        framebuf.MONO_HLSB)
+            sprite = Sprite(bytearray(width * self.height * 2), width, self.height)
+            self._palette.pixel(0, 0, background)
+            self._palette.pixel(1, 0, colour)
+            sprite.blit(mono, 0, 0, -1, self._palette)
+            if len(self._cache) >= self.cache_size:
+                self._cache.pop(next(iter(self._cache)))
+        # Insert last to mark as most recently used
+        self._cache[key] = sprite
+        return sprite
+
+    def text(self, screen: LCD, string: str, x: int, y: int, colour: int, background: int = 0) -> int:
+        """Draw string with its top left corner at x, y. Characters not in the font are drawn with the built-in 8x8
+        font. Returns the width drawn."""
+        start = x
+        for char in string:
+            sprite = self.glyph(char, colour, background)
+            if sprite is None:
+                screen.text(char, x, y, colour)
+                x += 8
+            else:
+                screen.blit(sprite, x, y)
+                x += sprite.width
+        return x - start
+
+    def measure(self, string: str) -> int:
+        """Get the width of string in pixels."""
+        return sum(self.glyphs[char][0] if char in self.glyphs else 8 for char in string)
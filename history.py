@@ -0,0 +1,274 @@
+from array import array
+
+INT16_MIN = -32768
+INT16_MAX = 32767
+
+
+class RingBuffer:
+    """A fixed capacity history of readings, oldest first.
+
+    Values are stored as int16 fixed point in a preallocated array so appending and iterating do not allocate, and a
+    Pico can hold thousands of samples per channel. The minimum, maximum and sum are maintained as each value is added
+    and evicted, so reading them does not walk the buffer.
+    """
+
+    def __init__(self, capacity: int, scale: int = 100):
+        """
+        :param capacity: The number of values to keep.
+        :param scale: Values are stored as round(value * scale). The default keeps two decimal places for values
+            between -327.68 and 327.67.
+        """
+        self.capacity = capacity
+        self.scale = scale
+        self._data = array('h', bytes(2 * capacity))
+        self._start = 0  # Index of the oldest value
+        self._len = 0
+        self._sum = 0
+        self._min = 0
+        self._max = 0
+        self._min_count = 0  # Number of values equal to the minimum
+        self._max_count = 0
+
+    def append(self, value: float):
+        """Add a value, evicting the oldest one if the buffer is full."""
+        self.append_raw(round(value * self.scale))
+
+    def append_raw(self, raw: int):
+        """Add a value already multiplied by scale."""
+        raw = min(max(raw, INT16_MIN), INT16_MAX)
+        if self._len < self.capacity:
+            self._data[(self._start + self._len) % self.capacity] = raw
+            self._len += 1
+            evicted = None
+        else:
+            evicted = self._data[self._start]
+            self._data[self._start] = raw
+            self._start = (self._start + 1) % self.capacity
+            self._sum -= evicted
+        self._sum += raw
+
+        if self._len == 1 and evicted is None:
+            self._min = self._max = raw
+            self._min_count = self._max_count = 1
+        else:
+            self._include(raw)
+            if evicted is not None:
+                self._exclude(evicted)
+
+    def _include(self, raw: int):
+        if raw < self._min:
+            self._min = raw
+            self._min_count = 1
+        elif raw == self._min:
+            self._min_count += 1
+        if raw > self._max:
+            self._max = raw
+            self._max_count = 1
+        elif raw == self._max:
+            self._max_count += 1
+
+    def _exclude(self, raw: int):
+        if raw == self._min:
+            self._min_count -= 1
+        if raw == self._max:
+            self._max_count -= 1
+        if self._min_count == 0 or self._max_count == 0:
+            # The last copy of an extreme value has gone so find the new one
+            self._min = self._max = self._data[self._start]
+            self._min_count = self._max_count = 0
+            for value in self.iter_raw():
+                self._include(value)
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+        self._sum = 0
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __getitem__(self, index: int) -> float:
+        """Get a value by position, 0 being the oldest and -1 the newest."""
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError("RingBuffer index out of range")
+        return self._data[(self._start + index) % self.capacity] / self.scale
+
+    def iter_raw(self, start: int = 0, count: int = None):
+        """Iterate over stored fixed point values, oldest first.
+        :param start: Position of the first value, 0 being the oldest.
+        :param count: Maximum number of values, all remaining values if None.
+        """
+        if count is None or start + count > self._len:
+            count = self._len - start
+        index = (self._start + start) % self.capacity
+        for _ in range(count):
+            yield self._data[index]
+            index += 1
+            if index == self.capacity:
+                index = 0
+
+    def __iter__(self):
+        for raw in self.iter_raw():
+            yield raw / self.scale
+
+    def window(self, count: int):
+        """Iterate over the most recent count values, oldest first."""
+        count = min(count, self._len)
+        for raw in self.iter_raw(self._len - count, count):
+            yield raw / self.scale
+
+    @property
+    def latest(self) -> float:
+        return self[-1]
+
+    @property
+    def min(self) -> float:
+        if self._len == 0:
+            raise ValueError("RingBuffer is empty")
+        return self._min / self.scale
+
+    @property
+    def max(self) -> float:
+        if self._len == 0:
+            raise ValueError("RingBuffer is empty")
+        return self._max / self.scale
+
+    @property
+    def mean(self) -> float:
+        if self._len == 0:
+            raise ValueError("RingBuffer is empty")
+        return self._sum / (self._len * self.scale)
+
+
+class Tier:
+    """A history at a fixed resolution where each entry summarises a bucket of samples by its min, mean and max."""
+
+    def __init__(self, capacity: int, resolution_s: int, scale: int = 100, buffer: RingBuffer = None):
+        """
+        :param capacity: The number of buckets to keep.
+        :param resolution_s: The time covered by each bucket in seconds.
+        :param scale: Fixed point scale of the stored values, see RingBuffer.
+        :param buffer: Use the values in this buffer as the min, mean and max of single sample buckets.
+        """
+        self.resolution_s = resolution_s
+        if buffer is None:
+            self.min = RingBuffer(capacity, scale)
+            self.mean = RingBuffer(capacity, scale)
+            self.max = RingBuffer(capacity, scale)
+        else:
+            self.min = self.mean = self.max = buffer
+
+    def __len__(self) -> int:
+        return len(self.mean)
+
+    @property
+    def span_s(self) -> int:
+        """The time covered by the buckets currently held."""
+        return len(self) * self.resolution_s
+
+    def add_bucket(self, bucket: "_Bucket"):
+        self.min.append_raw(bucket.min)
+        self.mean.append_raw(round(bucket.sum / bucket.count))
+        self.max.append_raw(bucket.max)
+
+    def window_range(self, span_s: int) -> tuple[int, int]:
+        """Get the position of the first bucket covering the most recent span_s seconds and the number of buckets,
+        for use with RingBuffer.iter_raw."""
+        count = min(-(-span_s // self.resolution_s), len(self))
+        return len(self) - count, count
+
+    def window(self, span_s: int):
+        """Iterate over (min, mean, max) of the buckets covering the most recent span_s seconds, oldest first."""
+        start, count = self.window_range(span_s)
+        scale = self.mean.scale
+        for low, mean, high in zip(self.min.iter_raw(start, count), self.mean.iter_raw(start, count),
+                                   self.max.iter_raw(start, count)):
+            yield low / scale, mean / scale, high / scale
+
+
+class _Bucket:
+    """Running min, max and sum of fixed point values."""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.min = INT16_MAX
+        self.max = INT16_MIN
+        self.sum = 0
+        self.count = 0
+
+    def add(self, low: int, mean: int, high: int):
+        self.min = min(self.min, low)
+        self.max = max(self.max, high)
+        self.sum += mean
+        self.count += 1
+
+
+class TieredHistory:
+    """Raw samples rolled up into per-minute and per-hour buckets, each tier held in bounded memory.
+
+    With the default capacities and one sample per second this keeps 10 minutes of raw samples, 24 hours of minutes
+    and 7 days of hours in about 11 KB.
+    """
+
+    def __init__(self, raw_capacity: int = 600, minute_capacity: int = 1440, hour_capacity: int = 168,
+                 sample_period_s: int = 1, scale: int = 100):
+        """
+        :param raw_capacity: The number of raw samples to keep.
+        :param minute_capacity: The number of per-minute buckets to keep.
+        :param hour_capacity: The number of per-hour buckets to keep.
+        :param sample_period_s: Time between samples in seconds. Must divide 60.
+        :param scale: Fixed point scale of the stored values, see RingBuffer.
+        """
+        if 60 % sample_period_s:
+            raise ValueError("sample_period_s must divide 60")
+        self.raw = RingBuffer(raw_capacity, scale)
+        self.tiers = (Tier(raw_capacity, sample_period_s, buffer=self.raw),
+                      Tier(minute_capacity, 60, scale),
+                      Tier(hour_capacity, 3600, scale))
+        self._samples_per_minute = 60 // sample_period_s
+        self._minute = _Bucket()
+        self._hour = _Bucket()
+
+    @property
+    def minutes(self) -> Tier:
+        return self.tiers[1]
+
+    @property
+    def hours(self) -> Tier:
+        return self.tiers[2]
+
+    @property
+    def latest(self) -> float:
+        return self.raw.latest
+
+    def append(self, value: float):
+        raw = min(max(round(value * self.raw.scale), INT16_MIN), INT16_MAX)
+        self.raw.append_raw(raw)
+        self._minute.add(raw, raw, raw)
+        if self._minute.count == self._samples_per_minute:
+            self.minutes.add_bucket(self._minute)
+            self._hour.add(self._minute.min, round(self._minute.sum / self._minute.count), self._minute.max)
+            self._minute.reset()
+            if self._hour.count == 60:
+                self.hours.add_bucket(self._hour)
+                self._hour.reset()
+
+    def select(self, span_s: int) -> Tier:
+        """Get the finest tier which holds the whole of the most recent span_s seconds. If none do, get the tier
+        holding the longest span, the finest if several hold the same, so a young history is not answered from an
+        empty coarse tier."""
+        longest = self.tiers[0]
+        for tier in self.tiers:
+            if tier.span_s >= span_s:
+                return tier
+            if tier.span_s > longest.span_s:
+                longest = tier
+        return longest
+
+    def window(self, span_s: int):
+        """Iterate over (min, mean, max) covering the most recent span_s seconds from the best fitting tier."""
+        return self.select(span_s).window(span_s)
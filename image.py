@@ -1,63 +1,228 @@
 import deflate
 import framebuf
+import struct
 from machine import PWM, Pin
 
-from ext.waveshare.lcd import LCD, BL
+from ext.waveshare.lcd import LCD, BL, DEFAULT_BAUDRATE
+
+# Version 2 header: magic, version, pixel format, encoding, width, height, palette size.
+V2_MAGIC = b"PIC"
+V2_HEADER = "<3sBBBHHH"
+FORMAT_RGB565 = 0  # Two bytes per pixel, stored in frame buffer byte order
+FORMAT_INDEXED = 1  # Palette of RGB565 colours followed by one byte per pixel
+ENCODING_RAW = 0
+ENCODING_RLE = 1  # Sequence of (count, value) runs
+
+# Atlas header: magic, version, number of sprites. Each sprite then has a length-prefixed name and ATLAS_ENTRY.
+ATLAS_MAGIC = b"ATL"
+ATLAS_HEADER = "<3sBB"
+ATLAS_ENTRY = "<HHHH"
+
+
+class Sprite(framebuf.FrameBuffer):
+    """An RGB565 frame buffer which knows its own size."""
+
+    def __init__(self, buffer, width: int, height: int, stride: int = None):
+        super().__init__(buffer, width, height, framebuf.RGB565, stride or width)
+        self.buffer = buffer
+        self.width = width
+        self.height = height
 
 
 class Image:
     valid_modes = [0, 1]  # 0 = Greyscale, 1 = BRG556
+    _palettes = {}  # Shared 256 colour lookup tables, one per mode
 
     def __init__(self, filename: str):
-        self.data = []
         self.format = ""
         self.width = 0
         self.height = 0
         self.mode = ""
+        self.framebuffer = None
         self._load_image(filename)
 
     def _load_image(self, filename: str):
-        """Assumes data are compressed space delimited integers. First letter indicates image format, second
-        indicates number of pixels per row, third indicates number of rows. Following integers are pixel values in row,
-        column order."""
+        """Load a compressed image. Version 2 images start with V2_HEADER, see tools/image_to_binary.py for the
+        layout. Older images start with three bytes giving the image mode, number of pixels per row and number of
+        rows, followed by one byte per pixel in row, column order.
+
+        Pixels are decoded straight into the final RGB565 buffer. One byte per pixel data are inflated into the back
+        half of the buffer and then expanded in place by a palette blit, so no intermediate copies are made."""
         with open(filename, 'rb') as f:
             with deflate.DeflateIO(f, deflate.ZLIB) as d:
-                self.data = d.read()
-        self.mode = self.data[0]
-        if self.mode not in self.valid_modes:
-            raise SyntaxError("Error reading image from '{filename}'. Invalid image mode.")
-        self.width = int(self.data[1])
-        self.height = int(self.data[2])
-        self.data = [int(x) for x in self.data[3:]]
-        if len(self.data) != self.width * self.height:
-            raise SyntaxError("Error reading image from '{filename}'. Number of pixels does not match width and height.")
-
-    def get_framebuffer(self) -> framebuf.FrameBuffer:
-        if self.mode == 0:
-            self._greyscale_to_colour()
-
-        buffer = framebuf.FrameBuffer(bytearray(self.height * self.width * 2), self.width, self.height, framebuf.RGB565)
-        for x in range(self.width):
-            for y in range(self.height):
-                buffer.pixel(x, y, self.data[x + y * self.width])
-        return buffer
-
-    def _greyscale_to_colour(self):
-        """Convert an 8 bit greyscale image to little-endian RGB565."""
-        self.data = [(pixel & 0b00011100) << 11 |  # low end of green
-                     (pixel & 0b11111000) << 5 |   # blue
-                     (pixel & 0b11111000) |        # red
-                     (pixel & 0b11100000) >> 5     # High end of green
-                     for pixel in self.data]
-        self.mode = 1
-
-
-def init_screen() -> LCD:
-    """Initialise LCD object."""
+                header = d.read(3)
+                if header == V2_MAGIC:
+                    header += d.read(struct.calcsize(V2_HEADER) - 3)
+                    self._load_v2(filename, d, header)
+                else:
+                    self._load_v1(filename, d, header)
+
+    def _load_v1(self, filename: str, stream, header: bytes):
+        if len(header) != 3 or header[0] not in self.valid_modes:
+            raise SyntaxError(f"Error reading image from '{filename}'. Invalid image mode.")
+        self.mode = header[0]
+        self.width = header[1]
+        self.height = header[2]
+        self._decode(filename, stream, FORMAT_INDEXED, ENCODING_RAW, self._palette(self.mode))
+
+    def _load_v2(self, filename: str, stream, header: bytes):
+        try:
+            _, version, pixel_format, encoding, self.width, self.height, palette_size = struct.unpack(V2_HEADER,
+                                                                                                    header)
+        except ValueError:
+            raise SyntaxError(f"Error reading image from '{filename}'. Truncated header.")
+        if version != 2 or pixel_format not in (FORMAT_RGB565, FORMAT_INDEXED) or \
+                encoding not in (ENCODING_RAW, ENCODING_RLE):
+            raise SyntaxError(f"Error reading image from '{filename}'. Unsupported image format.")
+        self.mode = pixel_format
+        palette = None
+        if pixel_format == FORMAT_INDEXED:
+            palette_buffer = bytearray(palette_size * 2)
+            if palette_size == 0 or _readinto_all(stream, palette_buffer) != len(palette_buffer):
+                raise SyntaxError(f"Error reading image from '{filename}'. Invalid palette.")
+            palette = framebuf.FrameBuffer(palette_buffer, palette_size, 1, framebuf.RGB565)
+        self._decode(filename, stream, pixel_format, encoding, palette)
+
+    def _decode(self, filename: str, stream, pixel_format: int, encoding: int, palette):
+        """Decode the pixel payload into the frame buffer."""
+        num_pixels = self.width * self.height
+        buffer = bytearray(num_pixels * 2)
+        if pixel_format == FORMAT_RGB565:
+            target = memoryview(buffer)
+            line_format = framebuf.RGB565
+        else:
+            target = memoryview(buffer)[num_pixels:]
+            line_format = framebuf.GS8
+
+        if encoding == ENCODING_RAW:
+            valid = _readinto_all(stream, target) == len(target) and not stream.read(1)
+        else:
+            # Each run is filled natively with hline, split where it crosses the end of a row. The image can't be
+            # treated as one long row as frame buffer widths are limited to 65535.
+            decoded = framebuf.FrameBuffer(target, self.width, self.height, line_format)
+            runs = stream.read()
+            step = 3 if pixel_format == FORMAT_RGB565 else 2
+            x = 0
+            y = 0
+            valid = len(runs) % step == 0
+            for index in range(0, len(runs) - step + 1, step):
+                count = runs[index]
+                if step == 3:
+                    value = runs[index + 1] | runs[index + 2] << 8
+                else:
+                    value = runs[index + 1]
+                while count and y < self.height:
+                    span = min(count, self.width - x)
+                    decoded.hline(x, y, span, value)
+                    count -= span
+                    x += span
+                    if x == self.width:
+                        x = 0
+                        y += 1
+                if count:
+                    valid = False
+                    break
+            valid = valid and x == 0 and y == self.height
+        if not valid:
+            raise SyntaxError(f"Error reading image from '{filename}'. Number of pixels does not match width and "
+                              f"height.")
+
+        self.framebuffer = Sprite(buffer, self.width, self.height)
+        if pixel_format == FORMAT_INDEXED:
+            # Each destination pixel is written only after its source byte and all earlier ones have been read
+            indexed = framebuf.FrameBuffer(target, self.width, self.height, framebuf.GS8)
+            self.framebuffer.blit(indexed, 0, 0, -1, palette)
+
+    def get_framebuffer(self) -> Sprite:
+        return self.framebuffer
+
+    @classmethod
+    def _palette(cls, mode: int) -> framebuf.FrameBuffer:
+        """Get the table mapping a stored pixel byte to its RGB565 colour for the given mode."""
+        if mode not in cls._palettes:
+            palette = framebuf.FrameBuffer(bytearray(256 * 2), 256, 1, framebuf.RGB565)
+            for value in range(256):
+                palette.pixel(value, 0, _greyscale_to_colour(value) if mode == 0 else value)
+            cls._palettes[mode] = palette
+        return cls._palettes[mode]
+
+
+class Atlas(Image):
+    """Several images packed into a single file by tools/build_atlas.py, each drawn by name.
+
+    Sprites are strided views of the one atlas buffer, so they cost no pixel storage of their own."""
+
+    def __init__(self, filename: str):
+        self.sprites = {}
+        super().__init__(filename)
+
+    def _load_image(self, filename: str):
+        with open(filename, 'rb') as f:
+            with deflate.DeflateIO(f, deflate.ZLIB) as d:
+                header = d.read(struct.calcsize(ATLAS_HEADER))
+                if len(header) != struct.calcsize(ATLAS_HEADER):
+                    raise SyntaxError(f"Error reading atlas from '{filename}'. Truncated header.")
+                magic, version, count = struct.unpack(ATLAS_HEADER, header)
+                if magic != ATLAS_MAGIC or version != 1:
+                    raise SyntaxError(f"Error reading atlas from '{filename}'. Unsupported atlas format.")
+                index = []
+                for _ in range(count):
+                    length = d.read(1)
+                    name = d.read(length[0]) if length else b""
+                    entry = d.read(struct.calcsize(ATLAS_ENTRY))
+                    if not length or len(name) != length[0] or len(entry) != struct.calcsize(ATLAS_ENTRY):
+                        raise SyntaxError(f"Error reading atlas from '{filename}'. Truncated index.")
+                    index.append((name.decode(), struct.unpack(ATLAS_ENTRY, entry)))
+                header = d.read(struct.calcsize(V2_HEADER))
+                if header[:3] != V2_MAGIC:
+                    raise SyntaxError(f"Error reading atlas from '{filename}'. Missing image.")
+                self._load_v2(filename, d, header)
+
+        buffer = memoryview(self.framebuffer.buffer)
+        for name, (x, y, width, height) in index:
+            if x + width > self.width or y + height >= self.height:
+                raise SyntaxError(f"Error reading atlas from '{filename}'. Sprite '{name}' is out of bounds.")
+            self.sprites[name] = Sprite(buffer[(y * self.width + x) * 2:], width, height, self.width)
+
+    def get_sprite(self, name: str) -> Sprite:
+        return self.sprites[name]
+
+    def blit(self, screen: LCD, name: str, x: int, y: int, key: int = -1):
+        """Draw the named sprite with its top left corner at x, y.
+        :param key: A colour to treat as transparent, or -1 for none.
+        """
+        screen.blit(self.sprites[name], x, y, key)
+
+
+def _greyscale_to_colour(pixel: int) -> int:
+    """Convert an 8 bit greyscale value to little-endian RGB565."""
+    return ((pixel & 0b00011100) << 11 |  # low end of green
+            (pixel & 0b11111000) << 5 |   # blue
+            (pixel & 0b11111000) |        # red
+            (pixel & 0b11100000) >> 5)    # High end of green
+
+
+def _readinto_all(stream, buffer) -> int:
+    """Fill buffer from stream, returning the number of bytes read."""
+    buffer = memoryview(buffer)
+    read = 0
+    while read < len(buffer):
+        count = stream.readinto(buffer[read:])
+        if not count:
+            break
+        read += count
+    return read
+
+
+def init_screen(double_buffer: bool = False, baudrate: int = DEFAULT_BAUDRATE) -> LCD:
+    """Initialise LCD object.
+    :param double_buffer: Send frames to the display in the background, see LCD.
+    :param baudrate: SPI clock for the display in Hz.
+    """
     pwm = PWM(Pin(BL))
     pwm.freq(1000)
     pwm.duty_u16(32768)
-    screen = LCD()
+    screen = LCD(double_buffer, baudrate)
     screen.fill(screen.BLACK)
     screen.show()
     return screen
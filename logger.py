@@ -0,0 +1,66 @@
+DEBUG = 10
+INFO = 20
+WARNING = 30
+ERROR = 40
+LEVEL_NAMES = {DEBUG: "DEBUG", INFO: "INFO", WARNING: "WARNING", ERROR: "ERROR"}
+
+
+class Logger:
+    """A levelled logger which keeps the most recent messages in a ring buffer.
+
+    Messages are given as a format string and arguments, and are only formatted if their level is enabled, so
+    disabled calls cost no string building. Messages at or above echo_level are also printed.
+    """
+
+    def __init__(self, level: int = INFO, echo_level: int = INFO, capacity: int = 64):
+        """
+        :param level: Messages below this level are discarded.
+        :param echo_level: Messages at or above this level are printed as well as stored.
+        :param capacity: The number of messages kept for dump.
+        """
+        self.level = level
+        self.echo_level = echo_level
+        self._lines = [None] * capacity
+        self._next = 0
+
+    def enabled(self, level: int) -> bool:
+        """Whether messages at level are kept. Use to skip work done only to build log arguments."""
+        return level >= self.level
+
+    def log(self, level: int, message: str, *args):
+        if level < self.level:
+            return
+        if args:
+            message = message % args
+        line = f"{LEVEL_NAMES.get(level, level)}: {message}"
+        self._lines[self._next] = line
+        self._next = (self._next + 1) % len(self._lines)
+        if level >= self.echo_level:
+            print(line)
+
+    def debug(self, message: str, *args):
+        self.log(DEBUG, message, *args)
+
+    def info(self, message: str, *args):
+        self.log(INFO, message, *args)
+
+    def warning(self, message: str, *args):
+        self.log(WARNING, message, *args)
+
+    def error(self, message: str, *args):
+        self.log(ERROR, message, *args)
+
+    def lines(self):
+        """Iterate over the stored messages, oldest first."""
+        for offset in range(len(self._lines)):
+            line = self._lines[(self._next + offset) % len(self._lines)]
+            if line is not None:
+                yield line
+
+    def dump(self):
+        """Print the stored messages, oldest first."""
+        for line in self.lines():
+            print(line)
+
+
+log = Logger()
@@ -1,42 +1,114 @@
-from time import sleep
+import asyncio
 
-from ext.aht.aht20 import AHT20
-from ext.waveshare.lcd import LCD
+from ext.aht.aht20 import AsyncAHT20
+from ext.waveshare.lcd import LCD, DEFAULT_BAUDRATE
 
 import wifi
+import datalog
+import font
+import metrics
 import progress
+import publish
 import rtc
+import scheduler
 import sensors
+import widgets
 from image import init_screen
-from sensors import sample_sensor, init_ath
-
-
-def loop(sensor: AHT20, screen: LCD, wlan: wifi.StatefulWLAN, clock: rtc.Clock):
-    progress_icon = progress.ProgressIcon(screen, 145, 3)
-    temperature = sensors.Temperature(10)
-    humidity = sensors.Humidity(10)
-    print("Loop initialised")
-    print(clock.time())
-    time = 0
-    while True:
-        print(f"Tick {time}")
-        if time % 1 == 0:
-            sample_sensor(sensor, temperature, humidity)
-            update_screen(screen, temperature, humidity, progress_icon)
-            # plot_graph(plot, temperature.history)
-        if time % 10 == 0:
-            wlan.check_status(screen)
-        time += 1
-        if time == 10:
-            time = 0
-        sleep(1)
-
-
-def update_screen(screen: LCD, temperature: sensors.Temperature, humidity: sensors.Humidity, progress_icon: progress.ProgressIcon):
-    temperature.print_to_screen(screen)
-    humidity.print_to_screen(screen)
-    progress_icon.tick(screen)
-    screen.show()
+from logger import log
+from sensors import sample_sensor_async, init_ath
+
+READOUT_FONT = "fonts/readout.bin"
+# The widest text each readout shows over the sensor's range, which sizes the area it clears
+TEMPERATURE_WIDEST = "Temp: -40.00 C"
+HUMIDITY_WIDEST = "Humidity: 100.00 %"
+SAMPLE_PERIOD_MS = 1000
+RENDER_PERIOD_MS = 1000
+WIFI_PERIOD_MS = 1000
+TIME_SYNC_PERIOD_MS = 3600_000
+STATS_PERIOD_MS = 60_000
+METRICS_PORT = 80
+PUBLISH_PERIOD_MS = 30_000
+
+
+def loop(sensor: AsyncAHT20, screen: LCD, wlan: wifi.StatefulWLAN, clock: rtc.Clock, data_log: datalog.DataLog,
+         publisher: publish.Publisher = None):
+    temperature = sensors.Temperature(10, SAMPLE_PERIOD_MS // 1000)
+    humidity = sensors.Humidity(10, SAMPLE_PERIOD_MS // 1000)
+
+    readout_font = load_font(READOUT_FONT)
+    # Clear any boot messages; every widget starts dirty so the first frame draws the whole layout
+    screen.fill(screen.BLACK)
+    layout = widgets.Compositor(screen)
+    layout.add(widgets.Readout(temperature, 2, 4, readout_width(readout_font, TEMPERATURE_WIDEST), readout_font))
+    layout.add(widgets.Readout(humidity, 2, 22, readout_width(readout_font, HUMIDITY_WIDEST), readout_font))
+    layout.add(wlan.icon)
+    layout.add(progress.ProgressIcon(145, 3))
+    log.info("Loop initialised at %s", clock.time())
+
+    tasks = scheduler.Scheduler()
+    tasks.add("sample", SAMPLE_PERIOD_MS, lambda: sample(sensor, temperature, humidity, clock, data_log, publisher))
+    # Offset so that the first render follows the first sample
+    tasks.add("render", RENDER_PERIOD_MS, layout.render, offset_ms=RENDER_PERIOD_MS // 2)
+    tasks.add("wifi", WIFI_PERIOD_MS, wlan.check_status)
+    tasks.add("time", TIME_SYNC_PERIOD_MS, lambda: sync_clock(wlan, clock))
+    if publisher is not None:
+        tasks.add("publish", PUBLISH_PERIOD_MS, publisher.flush, offset_ms=PUBLISH_PERIOD_MS)
+    tasks.add("stats", STATS_PERIOD_MS, lambda: report_stats(tasks, screen, publisher), offset_ms=STATS_PERIOD_MS)
+
+    def on_wifi_change(old: str, new: str):
+        # If there was no connection for the first sync, sync as soon as there is one
+        if new == wifi.CONNECTED and not clock.synced:
+            asyncio.create_task(sync_clock(wlan, clock))
+    wlan.on_change(on_wifi_change)
+    server = metrics.MetricsServer({"temperature_celsius": temperature, "humidity_percent": humidity}, METRICS_PORT)
+    asyncio.run(run(tasks, server))
+
+
+async def run(tasks: scheduler.Scheduler, server: metrics.MetricsServer):
+    await server.start()
+    await tasks.run()
+
+
+async def sample(sensor: AsyncAHT20, temperature: sensors.Temperature, humidity: sensors.Humidity, clock: rtc.Clock,
+                 data_log: datalog.DataLog, publisher: publish.Publisher = None):
+    """Take a reading, record it in the log and queue it to be published. Readings are only displayed until the clock
+    has been set, as before then it still has the RTC's power-on time."""
+    await sample_sensor_async(sensor, temperature, humidity)
+    if not clock.synced:
+        return
+    timestamp = clock.timestamp()
+    data_log.append(timestamp, temperature.value, humidity.value)
+    if publisher is not None:
+        publisher.add(timestamp, temperature.value, humidity.value)
+
+
+async def sync_clock(wlan: wifi.StatefulWLAN, clock: rtc.Clock):
+    """Set the clock from NTP if there is a connection."""
+    if wlan.state == wifi.CONNECTED:
+        await clock.sync()
+
+
+def report_stats(tasks: scheduler.Scheduler, screen: LCD, publisher: publish.Publisher = None):
+    log.info(tasks.report())
+    log.info(screen.report())
+    if publisher is not None:
+        log.info(publisher.report())
+
+
+def load_font(filename: str) -> font.Font:
+    """Load a font made by tools/font_to_binary.py. Returns None if there isn't one so the built-in font is used."""
+    try:
+        return font.Font(filename)
+    except OSError:
+        log.info("No font at %s, using built-in font", filename)
+        return None
+
+
+def readout_width(readout_font: font.Font, text: str) -> int:
+    """Width of text in the readout font, or in the built-in 8x8 font if there isn't one."""
+    if readout_font is None:
+        return 8 * len(text)
+    return readout_font.measure(text)
 
 
 def load_config() -> dict:
@@ -45,23 +117,60 @@ def load_config() -> dict:
 
     config = {}
     for line in data:
-        line = line.split(":")
+        # Only the first colon separates the key, values such as passwords may contain more
+        line = line.split(":", 1)
         config[line[0].strip()] = line[1].strip()
     return config
 
 
+def update_config(key: str, value: str):
+    """Set one setting in config.txt, leaving every other line as it is."""
+    with open("config.txt") as input_file:
+        data = input_file.readlines()
+
+    line = f"{key}: {value}\n"
+    for index, existing in enumerate(data):
+        if existing.split(":", 1)[0].strip() == key:
+            data[index] = line
+            break
+    else:
+        if data and not data[-1].endswith("\n"):
+            data[-1] += "\n"
+        data.append(line)
+    with open("config.txt", "w") as output_file:
+        output_file.write("".join(data))
+
+
+def calibrate_display():
+    """Find the fastest SPI clock the display runs at reliably and save it to config.txt as spi_baudrate.
+
+    Run once from the REPL with the display in view: import main; main.calibrate_display()
+    """
+    screen = init_screen()
+
+    def confirm(baudrate: int, bytes_per_second: float) -> bool:
+        answer = input(f"{baudrate / 1_000_000:.1f} MHz, {bytes_per_second / 1000:.0f} kB/s. "
+                       f"Is the test pattern drawn correctly? [y/n] ")
+        return answer.strip().lower().startswith("y")
+
+    baudrate = screen.calibrate(confirm)
+    update_config("spi_baudrate", str(baudrate))
+    log.info("Display SPI clock set to %d Hz", baudrate)
+
+
 def main():
     config = load_config()
-    screen = init_screen()
-    print("Screen initialised")
+    screen = init_screen(config.get("double_buffer", "false").lower() == "true",
+                         int(config.get("spi_baudrate", DEFAULT_BAUDRATE)))
+    log.info("Screen initialised")
     sensor = init_ath()
-    print("Sensor initialised")
+    log.info("Sensor initialised")
     wlan = wifi.StatefulWLAN(config["ssid"], config["password"])
-    connection_success = wlan.initialise(screen)
+    wlan.initialise(screen)
     clock = rtc.Clock()
-    if connection_success:
-        clock.initialise()
-    loop(sensor, screen, wlan, clock)
+    data_log = datalog.DataLog()
+    log.info("Data log initialised")
+    loop(sensor, screen, wlan, clock, data_log, publish.make_publisher(config, wlan))
 
 
 if __name__ == '__main__':
@@ -0,0 +1,224 @@
+import asyncio
+
+from logger import log
+
+MAX_CONNECTIONS = 2
+REQUEST_TIMEOUT_S = 5
+MAX_HEADER_LINES = 32
+CHUNK_SIZE = 512  # History responses are sent in chunks of about this many bytes
+# Each chunk buffer starts with room for the chunk size as three hex digits and CRLF, and has room after CHUNK_SIZE
+# for one more point and the closing CRLF
+CHUNK_DATA = 5
+CHUNK_MARGIN = 64
+HEX_DIGITS = b"0123456789abcdef"
+DEFAULT_SPAN_S = 3600
+
+RESPONSE_BUSY = b"HTTP/1.1 503 Service Unavailable\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+RESPONSE_NOT_FOUND = b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+RESPONSE_BAD_REQUEST = b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\nConnection: close\r\n\r\n"
+HEADER_CHUNKED_JSON = (b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n"
+                       b"Connection: close\r\n\r\n")
+CONTENT_TYPE_JSON = "application/json"
+CONTENT_TYPE_PROMETHEUS = "text/plain; version=0.0.4"
+
+
+class MetricsServer:
+    """An HTTP server for the sensor readings.
+
+    - /metrics gives the latest values in the Prometheus text format.
+    - /metrics.json gives the latest values as a JSON object.
+    - /history/<metric>?span=<seconds> gives min, mean and max from the history as JSON, streamed in chunks so that
+      a long history is never held in memory at once.
+
+    The latest value responses are built once per new reading and the same bytes are sent to every request until the
+    next reading. At most max_connections requests are served at once, others get 503.
+    """
+
+    def __init__(self, sensors: dict, port: int = 80, max_connections: int = MAX_CONNECTIONS):
+        """
+        :param sensors: sensors.Sensor by metric name. Names are used as is in the Prometheus output so should
+            include the unit, for example temperature_celsius.
+        :param port: The TCP port to listen on.
+        :param max_connections: The most requests handled at once.
+        """
+        self.sensors = sensors
+        self.port = port
+        self.max_connections = max_connections
+        self.connections = 0
+        self.requests = 0
+        self.server = None
+        self._values = None  # The values the cached responses were built for
+        self._prometheus = None
+        self._json = None
+        # One chunk buffer for each connection, reused from request to request
+        self._chunks = [bytearray(CHUNK_DATA + CHUNK_SIZE + CHUNK_MARGIN) for _ in range(max_connections)]
+        for chunk in self._chunks:
+            chunk[3:CHUNK_DATA] = b"\r\n"
+
+    async def start(self, host: str = "0.0.0.0"):
+        self.server = await asyncio.start_server(self._serve, host, self.port)
+        log.info("Metrics server listening on port %d", self.port)
+
+    def close(self):
+        if self.server is not None:
+            self.server.close()
+            self.server = None
+
+    async def _serve(self, reader, writer):
+        try:
+            if self.connections >= self.max_connections:
+                writer.write(RESPONSE_BUSY)
+                await writer.drain()
+                return
+            self.connections += 1
+            try:
+                await asyncio.wait_for(self._handle(reader, writer), REQUEST_TIMEOUT_S)
+            finally:
+                self.connections -= 1
+        except Exception as e:
+            log.warning("Metrics request failed: %s", e)
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    async def _handle(self, reader, writer):
+        request = await reader.readline()
+        # The headers are not used but must be read before replying
+        for _ in range(MAX_HEADER_LINES):
+            line = await reader.readline()
+            if not line or line == b"\r\n":
+                break
+        parts = request.split()
+        if len(parts) < 2 or parts[0] != b"GET":
+            writer.write(RESPONSE_BAD_REQUEST)
+            await writer.drain()
+            return
+        self.requests += 1
+        path, _, query = parts[1].decode().partition("?")
+        if path == "/metrics":
+            self._update_responses()
+            writer.write(self._prometheus)
+        elif path == "/metrics.json":
+            self._update_responses()
+            writer.write(self._json)
+        elif path.startswith("/history/") and path[9:] in self.sensors:
+            try:
+                span_s = int(_query_value(query, "span", DEFAULT_SPAN_S))
+            except ValueError:
+                writer.write(RESPONSE_BAD_REQUEST)
+            else:
+                await self._send_history(writer, self.sensors[path[9:]], span_s)
+        else:
+            writer.write(RESPONSE_NOT_FOUND)
+        await writer.drain()
+
+    def _update_responses(self):
+        """Rebuild the cached latest value responses if there has been a reading since they were built."""
+        values = tuple(sensor.value if len(sensor.history.raw) else None for sensor in self.sensors.values())
+        if values == self._values:
+            return
+        self._values = values
+        lines = []
+        fields = []
+        for name, value in zip(self.sensors, values):
+            if value is None:
+                fields.append(f'"{name}": null')
+            else:
+                lines.append(f"# TYPE {name} gauge\n{name} {value:.2f}\n")
+                fields.append(f'"{name}": {value:.2f}')
+        self._prometheus = _response(CONTENT_TYPE_PROMETHEUS, "".join(lines))
+        self._json = _response(CONTENT_TYPE_JSON, "{" + ", ".join(fields) + "}")
+
+    async def _send_history(self, writer, sensor, span_s: int):
+        """Send the history of sensor over the last span_s seconds with chunked transfer encoding.
+
+        The points are written straight from the stored fixed point values into the connection's chunk buffer, so
+        streaming a long history allocates nothing per point. The stream copies what it cannot send at once, so the
+        buffer can be refilled after each drain."""
+        tier = sensor.history.select(span_s)
+        start, count = tier.window_range(span_s)
+        decimals = len(str(tier.mean.scale)) - 1
+        writer.write(HEADER_CHUNKED_JSON)
+        chunk = self._chunks.pop()
+        try:
+            end = _write_bytes(chunk, CHUNK_DATA, b'{"resolution_s": ')
+            end = _write_fixed(chunk, end, tier.resolution_s, 0)
+            end = _write_bytes(chunk, end, b', "points": [')
+            means = tier.mean.iter_raw(start, count)
+            highs = tier.max.iter_raw(start, count)
+            separator = b"["
+            for low in tier.min.iter_raw(start, count):
+                end = _write_bytes(chunk, end, separator)
+                separator = b", ["
+                end = _write_fixed(chunk, end, low, decimals)
+                end = _write_bytes(chunk, end, b", ")
+                end = _write_fixed(chunk, end, next(means), decimals)
+                end = _write_bytes(chunk, end, b", ")
+                end = _write_fixed(chunk, end, next(highs), decimals)
+                end = _write_bytes(chunk, end, b"]")
+                if end >= CHUNK_DATA + CHUNK_SIZE:
+                    await _write_chunk(writer, chunk, end)
+                    end = CHUNK_DATA
+            end = _write_bytes(chunk, end, b"]}")
+            await _write_chunk(writer, chunk, end)
+            writer.write(b"0\r\n\r\n")
+        finally:
+            self._chunks.append(chunk)
+
+
+async def _write_chunk(writer, chunk: bytearray, end: int):
+    """Send chunk[CHUNK_DATA:end] as one chunk, with its size written into the space before it."""
+    size = end - CHUNK_DATA
+    for index in (2, 1, 0):
+        chunk[index] = HEX_DIGITS[size & 0xF]
+        size >>= 4
+    chunk[end:end + 2] = b"\r\n"
+    writer.write(memoryview(chunk)[:end + 2])
+    await writer.drain()
+
+
+def _write_bytes(buffer: bytearray, offset: int, data: bytes) -> int:
+    """Copy data into buffer at offset. Returns the offset after it."""
+    end = offset + len(data)
+    buffer[offset:end] = data
+    return end
+
+
+def _write_fixed(buffer: bytearray, offset: int, raw: int, decimals: int) -> int:
+    """Write the fixed point value raw / 10 ** decimals into buffer at offset as a decimal number with that many
+    decimal places. Returns the offset after it."""
+    if raw < 0:
+        buffer[offset] = 45  # "-"
+        offset += 1
+        raw = -raw
+    digits = decimals + 1
+    limit = 10 ** digits
+    while raw >= limit:
+        digits += 1
+        limit *= 10
+    end = offset + digits + (1 if decimals else 0)
+    # Digits are written from the least significant up
+    position = end
+    for index in range(digits):
+        if index == decimals and decimals:
+            position -= 1
+            buffer[position] = 46  # "."
+        position -= 1
+        buffer[position] = 48 + raw % 10
+        raw //= 10
+    return end
+
+
+def _response(content_type: str, body: str) -> bytes:
+    body = body.encode()
+    return (f"HTTP/1.1 200 OK\r\nContent-Type: {content_type}\r\nContent-Length: {len(body)}\r\n"
+            f"Connection: close\r\n\r\n").encode() + body
+
+
+def _query_value(query: str, key: str, default):
+    """Get the value of key from a URL query string, or default if it is not there."""
+    for item in query.split("&"):
+        name, _, value = item.partition("=")
+        if name == key:
+            return value
+    return default
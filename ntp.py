@@ -0,0 +1,114 @@
+import asyncio
+import errno
+import random
+import socket
+import struct
+import time
+
+from logger import log
+from scheduler import ticks_ms, ticks_diff
+
+try:
+    from time import ticks_us
+except ImportError:
+    # CPython, for running on a host
+    def ticks_us() -> int:
+        return int(time.monotonic() * 1_000_000)
+
+NTP_HOST = "pool.ntp.org"
+NTP_PORT = 123
+NTP_DELTA = 2208988800  # Seconds from the NTP epoch of 1900 to the Unix epoch
+PACKET_SIZE = 48
+TIMEOUT_MS = 1000
+POLL_INTERVAL_MS = 2  # Also the resolution of the round trip measurement
+
+
+class SNTPClient:
+    """An SNTP client which waits for the reply without blocking other asyncio tasks.
+
+    The server's receive and transmit timestamps are used to remove its processing time from the measured round
+    trip, and the time is taken as the transmit timestamp plus half of the remaining network delay. The originate
+    timestamp of the reply must echo the request so that stray or late packets are ignored.
+    """
+
+    def __init__(self, host: str = NTP_HOST, port: int = NTP_PORT, timeout_ms: int = TIMEOUT_MS):
+        self.host = host
+        self.port = port
+        self.timeout_ms = timeout_ms
+        self.last_delay_us = 0
+        self._address = None  # Cached result of the DNS lookup, cleared on failure
+        self._request = bytearray(PACKET_SIZE)
+
+    def address(self):
+        """The server address, looked up once and then reused until a query fails."""
+        if self._address is None:
+            self._address = socket.getaddrinfo(self.host, self.port)[0][-1]
+        return self._address
+
+    async def query(self) -> tuple:
+        """Get the time from the server.
+        :return: The Unix time in milliseconds and the ticks_ms value at which it was measured, or None if the server
+            could not be reached or sent an invalid reply.
+        """
+        try:
+            return await self._exchange(self.address())
+        except OSError as e:
+            log.warning("NTP query to %s failed: %s", self.host, e)
+            # The pool may have moved on from this server, so look it up again next time
+            self._address = None
+            return None
+
+    async def _exchange(self, address) -> tuple:
+        request = self._request
+        request[0] = 0x23  # Leap indicator 0, version 4, client mode
+        # The transmit timestamp only has to be unique as the server echoes it back as the originate timestamp
+        struct.pack_into("!II", request, 40, random.getrandbits(32), random.getrandbits(32))
+
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.setblocking(False)
+            s.sendto(request, address)
+            sent_us = ticks_us()
+            start_ms = ticks_ms()
+            while True:
+                try:
+                    response = s.recv(PACKET_SIZE)
+                except OSError as e:
+                    if e.args[0] != errno.EAGAIN:
+                        raise
+                    if ticks_diff(ticks_ms(), start_ms) >= self.timeout_ms:
+                        raise OSError(errno.ETIMEDOUT)
+                    await asyncio.sleep(POLL_INTERVAL_MS / 1000)
+                    continue
+                received_us = ticks_us()
+                received_ms = ticks_ms()
+                if self._valid(response):
+                    break
+        finally:
+            s.close()
+
+        receive_us = _timestamp_us(response, 32)
+        transmit_us = _timestamp_us(response, 40)
+        delay_us = max(ticks_diff(received_us, sent_us) - (transmit_us - receive_us), 0)
+        self.last_delay_us = delay_us
+        return (transmit_us + delay_us // 2) // 1000, received_ms
+
+    def _valid(self, response: bytes) -> bool:
+        if len(response) < PACKET_SIZE or response[24:32] != self._request[40:48]:
+            return False
+        mode = response[0] & 0x07
+        stratum = response[1]
+        if mode != 4 or stratum == 0:
+            # Stratum 0 is a kiss of death asking the client to back off
+            log.warning("NTP server %s refused the request", self.host)
+            return False
+        return True
+
+
+def _timestamp_us(packet: bytes, offset: int) -> int:
+    """Convert the NTP timestamp at offset in packet to Unix time in microseconds."""
+    seconds, fraction = struct.unpack_from("!II", packet, offset)
+    if seconds < NTP_DELTA:
+        # The 32 bit seconds field wraps in 2036
+        seconds += 1 << 32
+    return (seconds - NTP_DELTA) * 1_000_000 + (fraction * 1_000_000 >> 32)
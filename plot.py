@@ -1,8 +1,35 @@
 from math import log10
 
-import collections
-
 from ext.waveshare.lcd import LCD
+from history import RingBuffer
+from logger import log, DEBUG
+
+FIXED_POINT_BITS = 16
+FIXED_POINT_HALF = 1 << (FIXED_POINT_BITS - 1)
+
+
+class AxisTransform:
+    """Integer mapping from data values to pixel positions, computed once per axis range.
+
+    Data values are integers, either whole numbers or fixed point values multiplied by a scale factor. The gradient is
+    held in fixed point so mapping a point needs only an integer multiply and shift, and the product stays within
+    a small int for values inside the axis range.
+    """
+
+    def __init__(self, data_start: int, data_end: int, pixel_start: int, pixel_end: int):
+        """
+        :param data_start: Data value at the start of the axis.
+        :param data_end: Data value at the end of the axis.
+        :param pixel_start: Pixel position of data_start.
+        :param pixel_end: Pixel position of data_end.
+        """
+        self.data_start = data_start
+        self.pixel_start = pixel_start
+        self.gradient = round(((pixel_end - pixel_start) << FIXED_POINT_BITS) / (data_end - data_start))
+
+    def map(self, value: int) -> int:
+        """Get the pixel position of a data value."""
+        return self.pixel_start + (((value - self.data_start) * self.gradient + FIXED_POINT_HALF) >> FIXED_POINT_BITS)
 
 
 class ScatterPlot:
@@ -21,6 +48,16 @@ class ScatterPlot:
         self.x_len, self.y_len = size
         self.colour = line_colour
         self.show_border = False
+        # State from the last update, used to redraw only what has changed
+        self._axes = None
+        self._x_labels = None
+        self._y_labels = None
+        self._transforms = None
+        self._plotted = 0
+        self._last_point = None
+        # Inclusive x0, y0 and exclusive x1, y1 of everything drawn by the last full redraw. The labels are drawn
+        # outside the bounding box.
+        self._bounds = (self.x, self.y, self.x + self.x_len, self.y + self.y_len)
 
     def plot_border(self):
         self.screen.rect(self.x, self.y, self.x_len, self.y_len, self.colour)
@@ -53,6 +90,7 @@ class ScatterPlot:
             self.screen.vline(x_pos, y_pos, tick_length, self.colour)
             # Print label
             self.screen.text(label, x_pos - (4 * len(label)), y_pos + tick_length + 4, self.colour)
+            self._include(x_pos - (4 * len(label)), y_pos + tick_length + 4, 8 * len(label), 8)
 
     def plot_y_labels(self, y_labels: list[str], y_axis: tuple[int, int, int, int]):
         """Plot the ticks and labels on the y-axis. Assumes labels are evenly spaced."""
@@ -66,61 +104,127 @@ class ScatterPlot:
             self.screen.hline(x_pos, y_pos, tick_length, self.colour)
             # Print label
             self.screen.text(label, x_pos - (8 * len(label)) - tick_length, y_pos - 4, self.colour)
-
-    def update_plot(self, data: tuple[list[float], list[float]], x_range: tuple[int, int] = None,
-                    y_range: tuple[int, int] = None, x_ticks: tuple[int, int] = None, y_ticks: tuple[int, int] = None):
+            self._include(x_pos - (8 * len(label)) - tick_length, y_pos - 4, 8 * len(label), 8)
+
+    def _include(self, x: int, y: int, w: int, h: int):
+        """Grow the bounds of the drawn area to include a rectangle."""
+        x0, y0, x1, y1 = self._bounds
+        self._bounds = (min(x0, x), min(y0, y), max(x1, x + w), max(y1, y + h))
+
+    def update_plot(self, data: tuple[list[int], list[int]], x_range: tuple[int, int] = None,
+                    y_range: tuple[int, int] = None, x_ticks: tuple[int, int] = None, y_ticks: tuple[int, int] = None,
+                    x_scale: int = 1, y_scale: int = 1):
+        """Draw the data. The axes and labels are only redrawn if the labels change, and if the data are the
+        previous data with points appended only the new points are drawn.
+        :param data: Integer x and y values, multiplied by x_scale and y_scale if they are fixed point.
+        :param x_scale: The x values are the real values multiplied by this.
+        :param y_scale: The y values are the real values multiplied by this.
+        """
         x_data, y_data = data
-        self.screen.fill_rect(0, self.y, 160, 128, self.screen.BLACK)
-        if self.show_border:
-            self.plot_border()
-
-        x_axis, y_axis = self.plot_axis()
-
-        x_labels = self.get_plot_labels(x_data, 8)
-        y_labels = self.get_plot_labels(y_data, 6)
-
-        self.plot_x_labels(x_labels, x_axis)
-        self.plot_y_labels(y_labels, y_axis)
-
-        self.plot_data_points(data, x_labels, y_labels, x_axis, y_axis)
+        x_label_values, x_labels = self.axis_labels(x_data, 8, x_scale)
+        y_label_values, y_labels = self.axis_labels(y_data, 6, y_scale)
+
+        if self._axes is None or x_labels != self._x_labels or y_labels != self._y_labels:
+            # Clear the labels of the previous redraw as well as the bounding box
+            x0, y0, x1, y1 = self._bounds
+            self.screen.fill_rect(x0, y0, x1 - x0, y1 - y0, self.screen.BLACK)
+            self._bounds = (self.x, self.y, self.x + self.x_len, self.y + self.y_len)
+            if self.show_border:
+                self.plot_border()
+            self._axes = self.plot_axis()
+            x_axis, y_axis = self._axes
+            self.plot_x_labels(x_labels, x_axis)
+            self.plot_y_labels(y_labels, y_axis)
+            self._x_labels = x_labels
+            self._y_labels = y_labels
+            self._transforms = (
+                AxisTransform(round(x_label_values[0] * x_scale), round(x_label_values[-1] * x_scale),
+                              x_axis[0], x_axis[2]),
+                AxisTransform(round(y_label_values[0] * y_scale), round(y_label_values[-1] * y_scale),
+                              y_axis[3], y_axis[1]))
+            first = 0
+        elif 0 < self._plotted < len(x_data) and \
+                (x_data[self._plotted - 1], y_data[self._plotted - 1]) == self._last_point:
+            first = self._plotted
+        else:
+            self._clear_data_area()
+            first = 0
+
+        x_axis = self._axes[0]
+        if len(x_data) > x_axis[2] - x_axis[0] + 1:
+            # More points than pixel columns, so draw the envelope. A new point can change the last column so
+            # appends are not drawn incrementally.
+            if first:
+                self._clear_data_area()
+            self.plot_envelope(data, self._transforms[0], self._transforms[1])
+            self._plotted = 0
+        else:
+            self.plot_data_points(data, self._transforms[0], self._transforms[1], first)
+            self._plotted = len(x_data)
+        self._last_point = (x_data[-1], y_data[-1])
 
         self.screen.show()
 
-    def plot_data_points(self, data: tuple[list[float], list[float]], x_labels: list[str], y_labels: list[str],
-                         x_axis: tuple[int, int, int, int], y_axis: tuple[int, int, int, int]):
-        x_axis_min = float(x_labels[0])
-        x_axis_max = float(x_labels[-1])
-        print(f"x axis range: {x_axis_min}, {x_axis_max}")
-        x_axis_range = x_axis_max - x_axis_min
-        y_axis_min = float(y_labels[0])
-        y_axis_max = float(y_labels[-1])
-        print(f"y axis range: {y_axis_min}, {y_axis_max}")
-        y_axis_range = y_axis_max - y_axis_min
-        x_axis_pixel_min = x_axis[0]
-        x_axis_pixel_max = x_axis[2]
-        print(f"x axis pixel range: {x_axis_pixel_min}, {x_axis_pixel_max}")
-        x_axis_pixel_range = x_axis_pixel_max - x_axis_pixel_min
-        y_axis_pixel_min = y_axis[1]
-        y_axis_pixel_max = y_axis[3]
-        print(f"y axis pixel range: {y_axis_pixel_min}, {y_axis_pixel_max}")
-        y_axis_pixel_range = y_axis_pixel_max - y_axis_pixel_min
-        for index in range(len(data[0])):
-            print(f"data: x {data[0][index]}, y{data[1][index]}")
-            data_x_fraction = (data[0][index] - x_axis_min) / x_axis_range
-            print(f"data: x fraction {data_x_fraction}")
-            x_pixel_position = round(x_axis_pixel_min + (x_axis_pixel_range * data_x_fraction))
-            print(f"data: x pixel position {x_pixel_position}")
-            data_y_fraction = (data[1][index] - y_axis_min) / y_axis_range
-            print(f"data: y fraction {data_y_fraction}")
-            y_pixel_position = round(y_axis_pixel_max - (y_axis_pixel_range * data_y_fraction))
-            print(f"data: y pixel position {y_pixel_position}")
+    def _clear_data_area(self):
+        """Clear the area above the x-axis and right of the y-axis, leaving the axes and labels."""
+        x_axis, y_axis = self._axes
+        left = y_axis[0] + 1
+        bottom = x_axis[1]
+        self.screen.fill_rect(left, self.y, self.x + self.x_len - left, bottom - self.y, self.screen.BLACK)
+        if self.show_border:
+            self.plot_border()
+
+    def plot_data_points(self, data: tuple[list[int], list[int]], x_transform: AxisTransform,
+                         y_transform: AxisTransform, first: int = 0):
+        """Plot the data points from index first onwards."""
+        x_data, y_data = data
+        x_map = x_transform.map
+        y_map = y_transform.map
+        # Checked once so that the per point calls are skipped entirely when debug logging is off
+        debug = log.enabled(DEBUG)
+        for index in range(first, len(x_data)):
+            x_pixel_position = x_map(x_data[index])
+            y_pixel_position = y_map(y_data[index])
+            if debug:
+                log.debug("data: x %s, y %s, pixel %s, %s", x_data[index], y_data[index], x_pixel_position,
+                          y_pixel_position)
             self.screen.pixel(x_pixel_position, y_pixel_position, self.colour)
 
+    def plot_envelope(self, data: tuple[list[int], list[int]], x_transform: AxisTransform,
+                      y_transform: AxisTransform):
+        """Draw the minimum to maximum of the points in each pixel column as a vertical line. Points are mapped and
+        reduced in a single pass, so the drawing cost is bounded by the plot width and spikes are kept."""
+        x_map = x_transform.map
+        y_map = y_transform.map
+        column = None
+        top = bottom = 0
+        for x_value, y_value in zip(data[0], data[1]):
+            x_pixel_position = x_map(x_value)
+            y_pixel_position = y_map(y_value)
+            if x_pixel_position != column:
+                if column is not None:
+                    self.screen.vline(column, top, bottom - top + 1, self.colour)
+                column = x_pixel_position
+                top = bottom = y_pixel_position
+            elif y_pixel_position < top:
+                top = y_pixel_position
+            elif y_pixel_position > bottom:
+                bottom = y_pixel_position
+        if column is not None:
+            self.screen.vline(column, top, bottom - top + 1, self.colour)
+
     @staticmethod
-    def get_plot_labels(axis_data: list[float], num_axis_points: int) -> list[str]:
-        """Generate reasonable axis labels by considering the range of the data and rounding to nice numbers."""
-        step = (max(axis_data) - min(axis_data)) / num_axis_points
-        print(f"step: {step}")
+    def axis_labels(axis_data: list[int], num_axis_points: int, scale: int = 1) -> tuple[list[float], list[str]]:
+        """Generate reasonable axis labels by considering the range of the data and rounding to nice numbers.
+        :param axis_data: The data values, multiplied by scale.
+        :param num_axis_points: The number of labels.
+        :param scale: The data values are the real values multiplied by this.
+        :return: The label values and the label text.
+        """
+        low = min(axis_data) / scale
+        high = max(axis_data) / scale
+        step = (high - low) / num_axis_points
+        log.debug("step: %s", step)
         if step != 0:
             # round to 1 sig fig
             rounded_step = round(step, -int(log10(abs(step))))
@@ -128,22 +232,21 @@ class ScatterPlot:
                 rounded_step = 1
         else:
             rounded_step = 1
-        print(f"rounded step: {rounded_step}")
-        labels = [(int(min(axis_data) / rounded_step) * rounded_step + (i * rounded_step)) for i in range(num_axis_points)]
-                
-        print(f"axis labels: {labels}")
-        labels = [str(label) for label in labels]
-        
-        # Round labels to a sig fig which captures the range
-        #label_sig_fig = round(log10(max(labels) - min(labels)))
-        
-
-        return labels
-
-
-def plot_graph(plot: ScatterPlot, data: collections.deque):
-    x_data = list(range(0, len(data)))
-    y_data = list(data)
-    data = (x_data, y_data)
-    print(data)
-    plot.update_plot(data)
+        log.debug("rounded step: %s", rounded_step)
+        start = int(low / rounded_step) * rounded_step
+        values = [start + (i * rounded_step) for i in range(num_axis_points)]
+        log.debug("axis labels: %s", values)
+        return values, [str(value) for value in values]
+
+    @staticmethod
+    def get_plot_labels(axis_data: list[float], num_axis_points: int) -> list[str]:
+        """Generate reasonable axis labels by considering the range of the data and rounding to nice numbers."""
+        return ScatterPlot.axis_labels(axis_data, num_axis_points)[1]
+
+
+def plot_graph(plot: ScatterPlot, data: RingBuffer):
+    x_data = range(0, len(data))
+    # The stored fixed point values are plotted directly so mapping to pixels needs no float arithmetic
+    y_data = list(data.iter_raw())
+    log.debug("plot data: %s, %s", x_data, y_data)
+    plot.update_plot((x_data, y_data), y_scale=data.scale)
@@ -0,0 +1,232 @@
+import asyncio
+import socket
+import struct
+
+import wifi
+from datalog import RECORD_FORMAT, RECORD_SIZE, SCALE
+from logger import log
+from scheduler import ticks_ms, ticks_diff, ticks_add
+
+# Packet header: magic, version, sequence number, number of records. The records follow in datalog.RECORD_FORMAT.
+PACKET_MAGIC = b"TMP"
+PACKET_HEADER = "<3sBIH"
+PACKET_HEADER_SIZE = struct.calcsize(PACKET_HEADER)
+CONNECT_TIMEOUT_S = 5
+# After a failed DNS lookup or connection, the time before another is tried. Lookups block, as MicroPython has no
+# asynchronous DNS, so they are not repeated on every flush while the network or server is down.
+RETRY_MS = 60_000
+
+
+class UDPTransport:
+    """Sends each packet as one UDP datagram. The host name is looked up once and the address reused."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self._address = None
+        self._socket = None
+        self._retry_at = None  # ticks_ms before which a failed lookup is not retried
+
+    def address(self):
+        if self._address is None:
+            if self._retry_at is not None and ticks_diff(ticks_ms(), self._retry_at) < 0:
+                raise OSError(f"Waiting to look up {self.host} again")
+            try:
+                self._address = socket.getaddrinfo(self.host, self.port)[0][-1]
+            except OSError:
+                self._retry_at = ticks_add(ticks_ms(), RETRY_MS)
+                raise
+            self._retry_at = None
+        return self._address
+
+    async def send(self, packet: memoryview):
+        address = self.address()
+        if self._socket is None:
+            self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self._socket.sendto(packet, address)
+
+    def close(self):
+        if self._socket is not None:
+            self._socket.close()
+            self._socket = None
+
+
+class MQTTTransport:
+    """Publishes each packet to a topic on an MQTT 3.1.1 broker at QoS 0.
+
+    Only the parts of MQTT needed to publish are implemented. The connection is opened on the first send and kept
+    open, with keep alive disabled so that no pings are needed between batches. Connecting is abandoned after
+    timeout_s, and after a failure it is not tried again for RETRY_MS.
+    """
+
+    def __init__(self, host: str, port: int = 1883, topic: str = "temperature", client_id: str = "pico",
+                 timeout_s: float = CONNECT_TIMEOUT_S):
+        self.host = host
+        self.port = port
+        self.topic = topic.encode()
+        self.client_id = client_id.encode()
+        self.timeout_s = timeout_s
+        self._reader = None
+        self._writer = None
+        self._retry_at = None  # ticks_ms before which a failed connection is not retried
+
+    async def _connect(self):
+        if self._retry_at is not None and ticks_diff(ticks_ms(), self._retry_at) < 0:
+            raise OSError(f"Waiting to connect to {self.host} again")
+        try:
+            await asyncio.wait_for(self._handshake(), self.timeout_s)
+        except (OSError, EOFError, asyncio.TimeoutError) as e:
+            # EOFError is a CONNACK cut short by the broker closing the connection
+            self.close()
+            self._retry_at = ticks_add(ticks_ms(), RETRY_MS)
+            if isinstance(e, OSError):
+                raise
+            raise OSError(f"MQTT connection to {self.host} failed: {e!r}")
+        self._retry_at = None
+
+    async def _handshake(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        # Protocol name and level 4, clean session, keep alive 0
+        variable = b"\x00\x04MQTT\x04\x02\x00\x00" + struct.pack("!H", len(self.client_id)) + self.client_id
+        self._writer.write(b"\x10" + _remaining_length(len(variable)) + variable)
+        await self._writer.drain()
+        connack = await self._reader.readexactly(4)
+        if connack[0] != 0x20 or connack[3] != 0:
+            raise OSError(f"MQTT connection refused: {connack}")
+
+    async def send(self, packet: memoryview):
+        if self._writer is None:
+            await self._connect()
+        try:
+            topic = struct.pack("!H", len(self.topic)) + self.topic
+            self._writer.write(b"\x30" + _remaining_length(len(topic) + len(packet)) + topic)
+            self._writer.write(packet)
+            await self._writer.drain()
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            self._reader = None
+
+
+def _remaining_length(length: int) -> bytes:
+    """Encode length as an MQTT variable length integer."""
+    encoded = bytearray()
+    while True:
+        byte = length & 0x7F
+        length >>= 7
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+class Publisher:
+    """Sends readings to a collector in batches.
+
+    Readings are queued in a fixed size ring buffer in RAM. flush, called every batch period, sends the queue as
+    packets of up to batch_records readings each. While there is no Wi-Fi connection readings stay queued, and once
+    the queue is full the oldest are dropped; the data log still holds them. After a reconnect the backlog is sent at
+    most max_packets per flush, spaced by packet_interval_ms, so that it does not swamp the link or the collector.
+    """
+
+    def __init__(self, transport, wlan: wifi.StatefulWLAN, capacity: int = 1024, batch_records: int = 60,
+                 max_packets: int = 4, packet_interval_ms: int = 100):
+        """
+        :param transport: An object with an async send(packet) method and close(), such as UDPTransport or
+            MQTTTransport.
+        :param wlan: Packets are only sent while this is connected.
+        :param capacity: The most readings queued.
+        :param batch_records: The most readings in one packet.
+        :param max_packets: The most packets sent by one flush.
+        :param packet_interval_ms: Time between packets within a flush.
+        """
+        self.transport = transport
+        self.wlan = wlan
+        self.capacity = capacity
+        self.batch_records = batch_records
+        self.max_packets = max_packets
+        self.packet_interval_ms = packet_interval_ms
+        self.sequence = 0
+        self.sent = 0  # Readings sent
+        self.dropped = 0  # Readings dropped because the queue was full
+        self.errors = 0
+        self._queue = bytearray(capacity * RECORD_SIZE)
+        self._head = 0  # Index of the oldest queued reading
+        self._len = 0
+        self._packet = bytearray(PACKET_HEADER_SIZE + batch_records * RECORD_SIZE)
+        self._packet_view = memoryview(self._packet)
+
+    def __len__(self) -> int:
+        return self._len
+
+    def add(self, timestamp: int, temperature: float, humidity: float):
+        """Queue a reading to be sent by the next flush."""
+        if self._len == self.capacity:
+            self._head = (self._head + 1) % self.capacity
+            self._len -= 1
+            self.dropped += 1
+        index = (self._head + self._len) % self.capacity
+        struct.pack_into(RECORD_FORMAT, self._queue, index * RECORD_SIZE, timestamp, round(temperature * SCALE),
+                         round(humidity * SCALE))
+        self._len += 1
+
+    async def flush(self):
+        """Send queued readings if there is a connection."""
+        for i in range(self.max_packets):
+            if not self._len or self.wlan.state != wifi.CONNECTED:
+                return
+            if i:
+                await asyncio.sleep(self.packet_interval_ms / 1000)
+            count = self._fill_packet()
+            dropped = self.dropped
+            try:
+                await self.transport.send(self._packet_view[:PACKET_HEADER_SIZE + count * RECORD_SIZE])
+            except OSError as e:
+                # The readings stay queued for the next flush
+                self.errors += 1
+                log.warning("Publishing failed: %s", e)
+                return
+            self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+            self.sent += count
+            # Readings added while sending to a full queue have already pushed some of the sent readings out
+            count -= min(self.dropped - dropped, count)
+            self._head = (self._head + count) % self.capacity
+            self._len -= count
+
+    def _fill_packet(self) -> int:
+        """Copy the oldest queued readings into the packet buffer after a header. Returns the number copied."""
+        count = min(self._len, self.batch_records)
+        struct.pack_into(PACKET_HEADER, self._packet, 0, PACKET_MAGIC, 1, self.sequence, count)
+        # The readings may wrap around the end of the queue
+        first = min(count, self.capacity - self._head)
+        start = self._head * RECORD_SIZE
+        end = PACKET_HEADER_SIZE + first * RECORD_SIZE
+        self._packet_view[PACKET_HEADER_SIZE:end] = memoryview(self._queue)[start:start + first * RECORD_SIZE]
+        if first < count:
+            self._packet_view[end:end + (count - first) * RECORD_SIZE] = \
+                memoryview(self._queue)[:(count - first) * RECORD_SIZE]
+        return count
+
+    def report(self) -> str:
+        return f"publish: sent {self.sent}, queued {self._len}, dropped {self.dropped}, errors {self.errors}"
+
+
+def make_publisher(config: dict, wlan: wifi.StatefulWLAN) -> Publisher:
+    """Create a Publisher from the publish_* settings in config.txt, or None if publish_host is not set.
+
+    publish_transport is udp (the default) or mqtt, publish_port defaults to 5005 for UDP and 1883 for MQTT and
+    publish_topic sets the MQTT topic.
+    """
+    host = config.get("publish_host")
+    if not host:
+        return None
+    if config.get("publish_transport", "udp") == "mqtt":
+        transport = MQTTTransport(host, int(config.get("publish_port", 1883)),
+                                  config.get("publish_topic", "temperature"))
+    else:
+        transport = UDPTransport(host, int(config.get("publish_port", 5005)))
+    return Publisher(transport, wlan)
@@ -1,48 +1,145 @@
+import asyncio
 import machine
-import socket
-import struct
 import time
 
+import ntp
+from logger import log
+from scheduler import ticks_ms, ticks_diff, ticks_add
+
+MIN_DRIFT_INTERVAL_MS = 600_000  # Shorter intervals give a drift estimate dominated by network jitter
+DRIFT_GAIN = 0.5
+MAX_DRIFT_PPM = 500
+
+
 class Clock:
-    def __init__(self):
+    """The real time clock, set from NTP.
+
+    Between syncs the time is kept from ticks_ms since the last sync, corrected for the drift of the crystal measured
+    over previous syncs. Syncs must be more often than ticks_ms wraps, about every six days.
+
+    The formatted time and date are cached. Until the current second ends they are returned without reading the
+    clock beyond one ticks_ms, and when it does only the fields which rolled over are rebuilt.
+    """
+
+    def __init__(self, ntp_host: str = ntp.NTP_HOST):
         self.clock = machine.RTC()
+        self.ntp = ntp.SNTPClient(ntp_host)
+        self.synced = False
+        self.drift_ppm = 0  # Rate of the local clock relative to NTP time, positive when running slow
+        self.last_error_ms = 0  # Difference between NTP and the local estimate at the last sync
+        self._sync_ticks = 0  # ticks_ms at the last sync
+        self._sync_ms = 0  # Unix time in milliseconds at the last sync
+        self._last_timestamp_ms = 0
+
+        self._second_end = None  # ticks_ms at which the cached strings expire, None to rebuild them
+        self._second = None  # Unix seconds, minutes and days the cached strings show
+        self._minute = None
+        self._day = None
+        self._hms = bytearray(b"00:00:00")  # Digits are written in place as fields roll over
+        self._time = None
+        self._hm = None
+        self._date = None
+        self._slash_date = None
+        self._datetime = None
+
+    def _local_ms(self, ticks: int) -> int:
+        """The Unix time in milliseconds at the ticks_ms value ticks, estimated from the last sync."""
+        elapsed = ticks_diff(ticks, self._sync_ticks)
+        return self._sync_ms + elapsed + int(elapsed * self.drift_ppm / 1_000_000)
+
+    def now_ms(self) -> int:
+        """The current Unix time in milliseconds."""
+        if not self.synced:
+            return int(time.time() * 1000)
+        return self._local_ms(ticks_ms())
 
-    @staticmethod
-    def time(seconds: bool = True) -> str:
+    def timestamp(self) -> int:
+        """Returns the current time in seconds since the epoch. See timestamp_ms."""
+        return self.timestamp_ms() // 1000
+
+    def timestamp_ms(self) -> int:
+        """Returns the current time in milliseconds since the epoch for time stamping records. Unlike now_ms this
+        never goes backwards, even if a sync steps the clock back, so records stay in time order."""
+        now = self.now_ms()
+        if now < self._last_timestamp_ms:
+            return self._last_timestamp_ms
+        self._last_timestamp_ms = now
+        return now
+
+    def _update_strings(self):
+        """Rebuild the cached strings if the second has changed."""
+        ticks = ticks_ms()
+        if self._second_end is not None and ticks_diff(ticks, self._second_end) < 0:
+            return
+        now = self.now_ms()
+        self._second_end = ticks_add(ticks, 1000 - now % 1000)
+        second = now // 1000
+        if second == self._second:
+            return
+        self._second = second
+        hms = self._hms
+        _write_digits(hms, 6, second % 60)
+        minute = second // 60
+        if minute != self._minute:
+            self._minute = minute
+            _write_digits(hms, 3, minute % 60)
+            _write_digits(hms, 0, minute // 60 % 24)
+            self._hm = str(hms[:5], "ascii")
+            day = minute // 1440
+            if day != self._day:
+                self._day = day
+                t = time.gmtime(day * 86400)
+                self._date = f"{t[2]:02}-{t[1]:02}-{t[0]}"
+                self._slash_date = f"{t[2]:02}/{t[1]:02}/{t[0]}"
+        self._time = str(hms, "ascii")
+        self._datetime = None
+
+    def time(self, seconds: bool = True) -> str:
         """Returns a string representing the current time in UTC."""
-        t = time.localtime()
-        if seconds:
-            return f"{t[3]:02}:{t[4]:02}:{t[5]:02}"
-        else:
-            return f"{t[3]:02}:{t[4]:02}"
-
-    @staticmethod
-    def date():
-        t = time.localtime()
-        return f"{t[2]:02}-{t[1]:02}-{t[0]}"
-
-    @staticmethod
-    def datetime():
-        t = time.localtime()
-        return f"{t[3]:02}:{t[4]:02}:{t[5]:02} {t[2]:02}/{t[1]:02}/{t[0]}"
-
-
-    def initialise(self):
-        """Get the time from an NTP server and use this to set the clock."""
-        ntp_request = bytearray(48)
-        ntp_request[0] = 0x23
-        addr = socket.getaddrinfo("pool.ntp.org", 123)[0][-1]
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        try:
-            s.settimeout(1)
-            s.sendto(ntp_request, addr)
-            msg = s.recv(48)
-        finally:
-            s.close()
-        # Bytes 40-44 are the 32 bits representing the seconds part of the NTP server TX time
-        val = struct.unpack("!I", msg[40:44])[0]
-        # Subtract the epoch time
-        t = val - 2208988800
-        tm = time.gmtime(t)
+        self._update_strings()
+        return self._time if seconds else self._hm
+
+    def date(self) -> str:
+        self._update_strings()
+        return self._date
+
+    def datetime(self) -> str:
+        self._update_strings()
+        if self._datetime is None:
+            self._datetime = f"{self._time} {self._slash_date}"
+        return self._datetime
+
+    async def sync(self) -> bool:
+        """Set the clock from NTP. Returns False if the server could not be reached, leaving the clock running on
+        its drift corrected estimate."""
+        result = await self.ntp.query()
+        if result is None:
+            return False
+        unix_ms, measured = result
+        if self.synced:
+            error_ms = unix_ms - self._local_ms(measured)
+            elapsed_ms = ticks_diff(measured, self._sync_ticks)
+            self.last_error_ms = error_ms
+            if elapsed_ms >= MIN_DRIFT_INTERVAL_MS:
+                # Move part of the way towards the rate that would have removed the error, to smooth out jitter
+                drift = self.drift_ppm + DRIFT_GAIN * error_ms * 1_000_000 / elapsed_ms
+                self.drift_ppm = max(-MAX_DRIFT_PPM, min(MAX_DRIFT_PPM, drift))
+        self._sync_ticks = measured
+        self._sync_ms = unix_ms
+        self.synced = True
+        self._second_end = None
+
+        # The RTC has whole seconds, so set it on the next second boundary
+        now_ms = self.now_ms()
+        await asyncio.sleep((1000 - now_ms % 1000) / 1000)
+        tm = time.gmtime(self.now_ms() // 1000)
         self.clock.datetime((tm[0], tm[1], tm[2], tm[6] + 1, tm[3], tm[4], tm[5], 0))
-        print(f"Set time to: {self.datetime()}")
\ No newline at end of file
+        log.info("Set time to: %s, error %d ms, delay %d ms, drift %0.1f ppm", self.datetime(), self.last_error_ms,
+                 self.ntp.last_delay_us // 1000, self.drift_ppm)
+        return True
+
+
+def _write_digits(buffer: bytearray, index: int, value: int):
+    """Write value as two ASCII digits at index."""
+    buffer[index] = 48 + value // 10
+    buffer[index + 1] = 48 + value % 10
@@ -0,0 +1,112 @@
+import asyncio
+import time
+
+from logger import log
+
+try:
+    from time import ticks_ms, ticks_diff, ticks_add
+except ImportError:
+    # CPython, for running on a host
+    def ticks_ms() -> int:
+        return int(time.monotonic() * 1000)
+
+    def ticks_diff(a: int, b: int) -> int:
+        return a - b
+
+    def ticks_add(a: int, b: int) -> int:
+        return a + b
+
+
+async def sleep_ms(ms: int):
+    await asyncio.sleep(ms / 1000)
+
+
+class PeriodicTask:
+    """A callback run at a fixed rate. Deadlines are computed from the start time rather than from the end of the
+    previous run, so the period does not drift with the run time of the callback."""
+
+    def __init__(self, name: str, period_ms: int, callback, offset_ms: int = 0, ticks=ticks_ms, sleep=sleep_ms):
+        """
+        :param name: Name used in reports.
+        :param period_ms: Time between the starts of successive runs.
+        :param callback: A function taking no arguments. If it returns a coroutine that is awaited.
+        :param offset_ms: Delay before the first run.
+        :param ticks: The millisecond tick source.
+        :param sleep: A coroutine function sleeping for a number of milliseconds.
+        """
+        self.name = name
+        self._ticks = ticks
+        self._sleep = sleep
+        self.period_ms = period_ms
+        self.callback = callback
+        self.offset_ms = offset_ms
+        self.runs = 0
+        self.overruns = 0  # Runs which finished after the next deadline
+        self.skipped = 0  # Deadlines missed entirely because of overruns
+        self.errors = 0
+        self.last_jitter_ms = 0
+        self.max_jitter_ms = 0
+        self.total_jitter_ms = 0
+
+    async def run(self):
+        deadline = ticks_add(self._ticks(), self.offset_ms)
+        while True:
+            # Sleeping for 0 when behind still lets other tasks run
+            await self._sleep(max(ticks_diff(deadline, self._ticks()), 0))
+
+            jitter = ticks_diff(self._ticks(), deadline)
+            self.last_jitter_ms = jitter
+            self.max_jitter_ms = max(self.max_jitter_ms, jitter)
+            self.total_jitter_ms += jitter
+            self.runs += 1
+            try:
+                result = self.callback()
+                if hasattr(result, "send"):
+                    await result
+            except Exception as e:
+                self.errors += 1
+                log.error("Task %s failed: %s", self.name, e)
+
+            deadline = ticks_add(deadline, self.period_ms)
+            if ticks_diff(self._ticks(), deadline) >= 0:
+                self.overruns += 1
+                while ticks_diff(self._ticks(), deadline) >= 0:
+                    deadline = ticks_add(deadline, self.period_ms)
+                    self.skipped += 1
+
+    @property
+    def mean_jitter_ms(self) -> float:
+        if self.runs == 0:
+            return 0
+        return self.total_jitter_ms / self.runs
+
+    def report(self) -> str:
+        return (f"{self.name}: runs {self.runs}, jitter mean {self.mean_jitter_ms:.1f} ms max {self.max_jitter_ms} ms, "
+                f"overruns {self.overruns}, skipped {self.skipped}, errors {self.errors}")
+
+
+class Scheduler:
+    """Runs a set of independent periodic tasks on the asyncio event loop."""
+
+    def __init__(self, ticks=ticks_ms, sleep=sleep_ms):
+        """
+        :param ticks: The millisecond tick source used by every task.
+        :param sleep: A coroutine function sleeping for a number of milliseconds.
+        """
+        self.tasks = []
+        self._ticks = ticks
+        self._sleep = sleep
+
+    def add(self, name: str, period_ms: int, callback, offset_ms: int = 0) -> PeriodicTask:
+        """Add a task to be run every period_ms. See PeriodicTask for the arguments."""
+        task = PeriodicTask(name, period_ms, callback, offset_ms, self._ticks, self._sleep)
+        self.tasks.append(task)
+        return task
+
+    async def run(self):
+        """Run all tasks until cancelled."""
+        await asyncio.gather(*[task.run() for task in self.tasks])
+
+    def report(self) -> str:
+        """Jitter and overrun statistics for every task, one per line."""
+        return "\n".join(task.report() for task in self.tasks)
@@ -1,52 +1,63 @@
-import collections
-
 from machine import I2C, Pin
 
-from ext.aht.aht20 import AHT20
-from ext.waveshare.lcd import LCD
+from ext.aht.aht20 import AHT20, AsyncAHT20
+from history import TieredHistory
 
 
 class Sensor:
-    def __init__(self, history_len: int):
+    def __init__(self, history_len: int, sample_period_s: int = 1):
+        """
+        :param history_len: The number of raw samples to keep. Longer spans are kept as per-minute and per-hour
+            summaries in history.
+        :param sample_period_s: Time between samples in seconds.
+        """
         self.history_len = history_len
-        self.history = collections.deque([], self.history_len)
+        self.history = TieredHistory(raw_capacity=history_len, sample_period_s=sample_period_s)
 
     def update_value(self, value: float):
-        self.history.appendleft(value)
-        print(list(self.history))
+        self.history.append(value)
 
     @property
-    def value(self):
-        return self.history[0]
+    def value(self) -> float:
+        return self.history.latest
 
-    def print_to_screen(self, screen: LCD):
+    def readout(self) -> str:
+        """Text showing the current value."""
         raise NotImplementedError("Not implemented in base class")
 
 
 class Temperature(Sensor):
-    def __init__(self, history_len: int):
-        super().__init__(history_len)
+    def __init__(self, history_len: int, sample_period_s: int = 1):
+        super().__init__(history_len, sample_period_s)
 
-    def print_to_screen(self, screen: LCD):
-        screen.fill_rect(2, 4, 110, 8, screen.BLACK)
-        screen.text("Temp: %0.2f C" % self.value, 2, 4, screen.WHITE)
+    def readout(self) -> str:
+        return "Temp: %0.2f C" % self.value
 
 
 class Humidity(Sensor):
-    def __init__(self, history_len: int):
-        super().__init__(history_len)
+    def __init__(self, history_len: int, sample_period_s: int = 1):
+        super().__init__(history_len, sample_period_s)
+
+    def readout(self) -> str:
+        return "Humidity: %0.2f %%" % self.value
+
 
-    def print_to_screen(self, screen: LCD):
-        screen.fill_rect(2, 22, 120, 8, screen.BLACK)
-        screen.text("Humidity: %0.2f %%" % self.value, 2, 22, screen.WHITE)
+def sample_sensor(sensor: AHT20, temperature: Temperature, humidity: Humidity):
+    """Take one measurement from the sensor and record both values."""
+    temp, relative_humidity = sensor.measure()
+    temperature.update_value(round(temp, 2))
+    humidity.update_value(round(relative_humidity, 2))
 
 
-def sample_sensor(sensor: AHT20, temperature: sensors.Temperature, humidity: sensors.Humidity):
-    temperature.update_value(round(sensor.temperature, 2))
-    humidity.update_value(round(sensor.relative_humidity, 2))
+async def sample_sensor_async(sensor: AsyncAHT20, temperature: Temperature, humidity: Humidity):
+    """Take one measurement from the sensor without blocking other tasks and record both values."""
+    sensor.trigger()
+    temp, relative_humidity = await sensor.result()
+    temperature.update_value(round(temp, 2))
+    humidity.update_value(round(relative_humidity, 2))
 
 
-def init_ath() -> AHT20:
+def init_ath() -> AsyncAHT20:
     """Initialise connection to ATH20"""
     i2c = I2C(0, scl=Pin(21), sda=Pin(20))
-    return AHT20(i2c)
+    return AsyncAHT20(i2c)
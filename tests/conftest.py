@@ -0,0 +1,11 @@
+"""Run the device code on CPython: the stand-ins in tests/fakes replace the MicroPython only modules."""
+import asyncio
+import os
+import sys
+
+REPO = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(REPO, "tests", "fakes"), REPO, os.path.join(REPO, "tools")]
+
+if not hasattr(asyncio, "sleep_ms"):
+    # MicroPython extension used by the sensor driver
+    asyncio.sleep_ms = lambda ms: asyncio.sleep(ms / 1000)
@@ -0,0 +1,15 @@
+"""Host stand-in for MicroPython's deflate module. Only decompression of zlib streams is supported."""
+import io
+import zlib
+
+AUTO = 0
+RAW = 1
+ZLIB = 2
+GZIP = 3
+
+
+class DeflateIO(io.BytesIO):
+    def __init__(self, stream, format=AUTO, wbits=0, close=False):
+        if format not in (AUTO, ZLIB):
+            raise ValueError("only zlib streams are supported")
+        super().__init__(zlib.decompress(stream.read()))
@@ -0,0 +1,150 @@
+"""Host stand-in for MicroPython's framebuf module.
+
+Implements the formats and drawing methods used by the logger in pure Python, with the same buffer checks as the
+device: the buffer must be writable and large enough for the given size and stride. As on the device, sizes wrap at
+65536.
+"""
+
+MONO_VLSB = 0
+RGB565 = 1
+GS4_HMSB = 2
+MONO_HLSB = 3
+MONO_HMSB = 4
+GS2_HMSB = 5
+GS8 = 6
+
+# 8x8 stand-in for the built-in font: every non-space character is a solid block
+_FONT_SIZE = 8
+
+
+class FrameBuffer:
+    def __init__(self, buf, width, height, format, stride=None):
+        view = memoryview(buf)
+        if view.readonly:
+            raise TypeError("object with buffer protocol required")
+        if format not in (RGB565, GS8, MONO_HLSB):
+            raise ValueError("invalid format")
+        self._buf = view.cast("B") if view.format != "B" else view
+        # The device stores the sizes as 16 bit unsigned integers
+        self._width = width & 0xFFFF
+        self._height = height & 0xFFFF
+        self._format = format
+        self._stride = (width if stride is None else stride) & 0xFFFF
+        if format == MONO_HLSB:
+            self._stride = (self._stride + 7) & ~7
+            needed = self._stride // 8 * height
+        else:
+            needed = self._stride * height * (2 if format == RGB565 else 1)
+        if len(self._buf) < needed:
+            raise ValueError("buffer too small")
+
+    def _get(self, x, y):
+        if self._format == RGB565:
+            i = (y * self._stride + x) * 2
+            return self._buf[i] | self._buf[i + 1] << 8
+        if self._format == GS8:
+            return self._buf[y * self._stride + x]
+        i = (y * self._stride + x) >> 3
+        return self._buf[i] >> (7 - (x & 7)) & 1
+
+    def _set(self, x, y, c):
+        if not (0 <= x < self._width and 0 <= y < self._height):
+            return
+        if self._format == RGB565:
+            i = (y * self._stride + x) * 2
+            self._buf[i] = c & 0xFF
+            self._buf[i + 1] = c >> 8 & 0xFF
+        elif self._format == GS8:
+            self._buf[y * self._stride + x] = c & 0xFF
+        else:
+            i = (y * self._stride + x) >> 3
+            bit = 0x80 >> (x & 7)
+            self._buf[i] = self._buf[i] | bit if c else self._buf[i] & ~bit
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            if 0 <= x < self._width and 0 <= y < self._height:
+                return self._get(x, y)
+            return None
+        self._set(x, y, c)
+
+    def fill(self, c):
+        self.fill_rect(0, 0, self._width, self._height, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(x, 0)
+        y0 = max(y, 0)
+        x1 = min(x + w, self._width)
+        y1 = min(y + h, self._height)
+        if x1 <= x0 or y1 <= y0:
+            return
+        if self._format == RGB565:
+            row = bytes((c & 0xFF, c >> 8 & 0xFF)) * (x1 - x0)
+            for yy in range(y0, y1):
+                i = (yy * self._stride + x0) * 2
+                self._buf[i:i + len(row)] = row
+        elif self._format == GS8:
+            row = bytes((c & 0xFF,)) * (x1 - x0)
+            for yy in range(y0, y1):
+                i = yy * self._stride + x0
+                self._buf[i:i + len(row)] = row
+        else:
+            for yy in range(y0, y1):
+                for xx in range(x0, x1):
+                    self._set(xx, yy, c)
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c, f=False):
+        if f:
+            self.fill_rect(x, y, w, h, c)
+        else:
+            self.hline(x, y, w, c)
+            self.hline(x, y + h - 1, w, c)
+            self.vline(x, y, h, c)
+            self.vline(x + w - 1, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        dx = abs(x2 - x1)
+        dy = -abs(y2 - y1)
+        sx = 1 if x1 < x2 else -1
+        sy = 1 if y1 < y2 else -1
+        error = dx + dy
+        while True:
+            self._set(x1, y1, c)
+            if x1 == x2 and y1 == y2:
+                return
+            e2 = 2 * error
+            if e2 >= dy:
+                error += dy
+                x1 += sx
+            if e2 <= dx:
+                error += dx
+                y1 += sy
+
+    def text(self, s, x, y, c=1):
+        for index, char in enumerate(s):
+            if char != " ":
+                self.fill_rect(x + index * _FONT_SIZE, y, _FONT_SIZE, _FONT_SIZE, c)
+
+    def blit(self, fbuf, x, y, key=-1, palette=None):
+        for sy in range(fbuf._height):
+            for sx in range(fbuf._width):
+                c = fbuf._get(sx, sy)
+                if palette is not None:
+                    c = palette._get(c, 0)
+                if c != key:
+                    self._set(x + sx, y + sy, c)
+
+    def scroll(self, xstep, ystep):
+        copy = FrameBuffer(bytearray(self._buf), self._width, self._height, self._format, self._stride)
+        for y in range(self._height):
+            for x in range(self._width):
+                sx = x - xstep
+                sy = y - ystep
+                if 0 <= sx < self._width and 0 <= sy < self._height:
+                    self._set(x, y, copy._get(sx, sy))
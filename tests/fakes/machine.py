@@ -0,0 +1,79 @@
+"""Host stand-in for the parts of MicroPython's machine module used by the logger.
+
+Set trace to a list to record every pin change as ("pin", id, value) and every SPI write as ("spi", bytes).
+"""
+import time
+
+trace = None
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+
+    def __init__(self, id, mode=-1, *args, **kwargs):
+        self.id = id
+        self.level = 0
+
+    def __call__(self, value=None):
+        if value is None:
+            return self.level
+        self.level = value
+        if trace is not None:
+            trace.append(("pin", self.id, value))
+
+    def value(self, value=None):
+        return self(value)
+
+
+class SPI:
+    """Counts the bytes written, which is all the display needs to be measured.
+
+    Writes return at once unless delay_us_per_byte is set. The bytes are then traced as they are when the write ends,
+    as the hardware reads the buffer during the transfer.
+    """
+
+    def __init__(self, id, baudrate=1_000_000, **kwargs):
+        self.id = id
+        self.baudrate = baudrate
+        self.count = 0
+        self.writes = 0
+        self.delay_us_per_byte = 0
+
+    def init(self, baudrate=None, **kwargs):
+        if baudrate is not None:
+            self.baudrate = baudrate
+
+    def write(self, buf):
+        if self.delay_us_per_byte:
+            time.sleep(len(buf) * self.delay_us_per_byte / 1_000_000)
+        self.count += len(buf)
+        self.writes += 1
+        if trace is not None:
+            trace.append(("spi", bytes(buf)))
+
+
+class PWM:
+    def __init__(self, pin):
+        self.pin = pin
+
+    def freq(self, value=None):
+        pass
+
+    def duty_u16(self, value=None):
+        pass
+
+
+class I2C:
+    def __init__(self, id, **kwargs):
+        self.id = id
+
+
+class RTC:
+    def __init__(self):
+        self._datetime = (2021, 1, 1, 4, 0, 0, 0, 0)
+
+    def datetime(self, value=None):
+        if value is None:
+            return self._datetime
+        self._datetime = value
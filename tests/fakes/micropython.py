@@ -0,0 +1,5 @@
+"""Host stand-in for MicroPython's micropython module."""
+
+
+def const(value):
+    return value
@@ -0,0 +1,33 @@
+"""Host stand-in for MicroPython's network module, with a scriptable station interface.
+
+Set WLAN.status_code to the CYW43 link status the interface should report.
+"""
+
+STA_IF = 0
+AP_IF = 1
+
+
+class WLAN:
+    def __init__(self, interface=STA_IF):
+        self.interface = interface
+        self.status_code = 0
+        self.connects = 0
+        self.disconnects = 0
+
+    def active(self, value=None):
+        return True
+
+    def status(self, param=None):
+        return self.status_code
+
+    def connect(self, ssid=None, password=None, **kwargs):
+        self.connects += 1
+
+    def disconnect(self):
+        self.disconnects += 1
+
+    def isconnected(self):
+        return self.status_code == 3
+
+    def ifconfig(self):
+        return ("192.168.1.2", "255.255.255.0", "192.168.1.1", "192.168.1.1")
@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from ext.aht.aht20 import AHT20, AsyncAHT20
+
+# Frames read back from an AHT20: status, 20 bits of humidity, 20 bits of temperature and the CRC
+IDLE = bytes.fromhex("1c 00 00 00 00 00 00")
+FRAME_23_5C_45RH = bytes.fromhex("1c 73 33 35 e1 48 39")
+FRAME_MINUS_10_25C_80_5RH = bytes.fromhex("1c ce 14 83 2e 14 83")
+
+
+class ReplayI2C:
+    """Answers each read with the next of the given frames, then keeps repeating the last one. Writes are
+    recorded."""
+
+    def __init__(self, frames=(IDLE,)):
+        self.frames = list(frames)
+        self.last = IDLE
+        self.reads = 0
+        self.writes = []
+
+    def writeto(self, address, buf):
+        self.writes.append(bytes(buf))
+
+    def readfrom_into(self, address, buf):
+        if self.frames:
+            self.last = self.frames.pop(0)
+        self.reads += 1
+        buf[:] = self.last[:len(buf)]
+
+
+def test_init_resets_and_initialises():
+    i2c = ReplayI2C()
+    AHT20(i2c)
+    assert i2c.writes == [b"\xba", b"\xbe\x08\x00"]
+
+
+def test_init_fails_if_not_calibrated():
+    with pytest.raises(RuntimeError):
+        AHT20(ReplayI2C([bytes.fromhex("14 00 00 00 00 00 00")]))
+
+
+@pytest.mark.parametrize("frame, expected", [(FRAME_23_5C_45RH, (23.5, 45.0)),
+                                             (FRAME_MINUS_10_25C_80_5RH, (-10.25, 80.5))])
+def test_measure(frame, expected):
+    i2c = ReplayI2C()
+    sensor = AHT20(i2c)
+    i2c.frames = [frame]
+    temperature, humidity = sensor.measure()
+    assert i2c.writes[-1] == b"\xac\x33\x00"
+    assert temperature == pytest.approx(expected[0], abs=0.001)
+    assert humidity == pytest.approx(expected[1], abs=0.001)
+
+
+def test_measure_waits_while_busy():
+    i2c = ReplayI2C()
+    sensor = AHT20(i2c)
+    busy = bytes([0x9C]) + FRAME_23_5C_45RH[1:]
+    i2c.frames = [busy, busy, FRAME_23_5C_45RH]
+    i2c.reads = 0
+    assert sensor.measure()[0] == pytest.approx(23.5, abs=0.001)
+    assert i2c.reads == 4
+
+
+BAD_CRC = FRAME_23_5C_45RH[:6] + b"\x00"
+BUSY = bytes([0x9C]) + FRAME_23_5C_45RH[1:]
+UNCALIBRATED = bytes([0x14]) + FRAME_23_5C_45RH[1:]
+
+
+@pytest.fixture
+def async_sensor():
+    i2c = ReplayI2C()
+    sensor = AsyncAHT20(i2c, retries=2)
+    # Keep the tests quick
+    sensor.CONVERSION_TIME_MS = 1
+    sensor.BUSY_TIMEOUT_MS = 20
+    i2c.writes.clear()
+    return sensor, i2c
+
+
+def triggers(i2c) -> int:
+    return i2c.writes.count(b"\xac\x33\x00")
+
+
+def test_async_result(async_sensor):
+    sensor, i2c = async_sensor
+    i2c.frames = [FRAME_MINUS_10_25C_80_5RH]
+    sensor.trigger()
+    temperature, humidity = asyncio.run(sensor.result())
+    assert (temperature, humidity) == pytest.approx((-10.25, 80.5), abs=0.001)
+    assert triggers(i2c) == 1
+
+
+def test_bad_crc_is_retried(async_sensor):
+    sensor, i2c = async_sensor
+    i2c.frames = [BAD_CRC, FRAME_23_5C_45RH]
+    assert asyncio.run(sensor.result())[0] == pytest.approx(23.5, abs=0.001)
+    assert triggers(i2c) == 2
+
+
+def test_busy_past_timeout_is_retried(async_sensor):
+    sensor, i2c = async_sensor
+    # With no time allowed for polling a busy conversion is abandoned straight away and another triggered
+    sensor.BUSY_TIMEOUT_MS = 0
+    i2c.frames = [BUSY, FRAME_23_5C_45RH]
+    assert asyncio.run(sensor.result())[1] == pytest.approx(45.0, abs=0.001)
+    assert triggers(i2c) == 2
+
+
+def test_busy_then_ready_within_timeout(async_sensor):
+    sensor, i2c = async_sensor
+    i2c.frames = [BUSY, BUSY, FRAME_23_5C_45RH]
+    assert asyncio.run(sensor.result())[0] == pytest.approx(23.5, abs=0.001)
+    assert triggers(i2c) == 1
+
+
+def test_uncalibrated_sends_initialise(async_sensor):
+    sensor, i2c = async_sensor
+    i2c.frames = [UNCALIBRATED, FRAME_23_5C_45RH]
+    assert asyncio.run(sensor.result())[0] == pytest.approx(23.5, abs=0.001)
+    assert b"\xbe\x08\x00" in i2c.writes
+    assert triggers(i2c) == 2
+
+
+def test_gives_up_after_retries(async_sensor):
+    sensor, i2c = async_sensor
+    i2c.frames = [BAD_CRC]
+    with pytest.raises(RuntimeError):
+        asyncio.run(sensor.result())
+    assert triggers(i2c) == 3
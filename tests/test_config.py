@@ -0,0 +1,45 @@
+import pytest
+
+import main
+
+CONFIG = "ssid: home:net\npassword: ab:cd\ndouble_buffer: true\n"
+
+
+@pytest.fixture(autouse=True)
+def in_tmp(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def write(text: str):
+    with open("config.txt", "w") as f:
+        f.write(text)
+
+
+def read() -> str:
+    with open("config.txt") as f:
+        return f.read()
+
+
+def test_values_may_contain_colons():
+    write(CONFIG)
+    assert main.load_config() == {"ssid": "home:net", "password": "ab:cd", "double_buffer": "true"}
+
+
+def test_update_adds_setting_and_keeps_others():
+    write(CONFIG)
+    main.update_config("spi_baudrate", "31250000")
+    assert read() == CONFIG + "spi_baudrate: 31250000\n"
+    assert main.load_config()["password"] == "ab:cd"
+
+
+def test_update_replaces_existing_setting():
+    write("spi_baudrate: 10000000\n" + CONFIG)
+    main.update_config("spi_baudrate", "25000000")
+    assert read() == "spi_baudrate: 25000000\n" + CONFIG
+
+
+def test_update_after_last_line_without_newline():
+    write(CONFIG.rstrip("\n"))
+    main.update_config("spi_baudrate", "25000000")
+    assert main.load_config()["double_buffer"] == "true"
+    assert main.load_config()["spi_baudrate"] == "25000000"
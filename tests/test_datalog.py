@@ -0,0 +1,108 @@
+import os
+
+import pytest
+
+import datalog
+from datalog import DataLog, RECORD_SIZE
+
+# Clock times a few seconds apart in 2026, and the Pico RTC's power-on time
+START = 1_780_000_000
+POWER_ON = 1_609_459_200
+
+
+@pytest.fixture(autouse=True)
+def in_tmp(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+
+def fill(log: DataLog, count: int, start: int = START, step: int = 2):
+    for i in range(count):
+        assert log.append(start + i * step, 20 + i / 100, 50 - i / 100)
+
+
+def test_records_round_trip():
+    log = DataLog(buffer_records=4, segment_records=16)
+    fill(log, 10)
+    records = list(log.records())
+    assert len(records) == 10
+    assert records[3] == (START + 6, 20.03, 49.97)
+
+
+def test_time_range_across_segments():
+    log = DataLog(buffer_records=4, segment_records=8, max_segments=20)
+    fill(log, 100)
+    assert len(log.segments) == 13
+    timestamps = [record[0] for record in log.records(START + 41, START + 120)]
+    assert timestamps == list(range(START + 42, START + 121, 2))
+    assert [record[0] for record in log.records(START + 190)] == [START + 190, START + 192, START + 194,
+                                                                  START + 196, START + 198]
+    assert len(list(log.records(0, START))) == 1
+    assert list(log.records(START + 1000)) == []
+
+
+def test_time_range_with_empty_newest_segment():
+    log = DataLog(buffer_records=8, segment_records=8)
+    fill(log, 16)
+    log.flush()
+    # Reopening with the newest segment exactly full leaves it to be rotated on the next write
+    log = DataLog(buffer_records=8, segment_records=8)
+    assert [record[0] for record in log.records(START + 20)] == list(range(START + 20, START + 32, 2))
+
+
+def test_oldest_segments_deleted():
+    log = DataLog(buffer_records=4, segment_records=8, max_segments=3)
+    fill(log, 40)
+    log.flush()
+    assert len(os.listdir("log")) == 3
+    assert next(log.records())[0] == START + 2 * 16
+
+
+def test_older_records_rejected_across_reboot():
+    log = DataLog(buffer_records=4)
+    fill(log, 6)
+    log.flush()
+
+    log = DataLog(buffer_records=4)
+    assert log.last_timestamp == START + 10
+    # The first sample after a cold boot is stamped with the RTC's power-on time
+    assert not log.append(POWER_ON, 21.0, 40.0)
+    assert log.rejected == 1
+    assert log.append(START + 10, 21.0, 40.0)
+    assert log.append(START + 12, 21.0, 40.0)
+    assert [record[0] for record in log.records()] == list(range(START, START + 11, 2)) + [START + 10, START + 12]
+
+
+def test_interrupted_write_recovered():
+    log = DataLog(buffer_records=4)
+    fill(log, 4)
+    with open(log._path(log.segments[-1]), "ab") as f:
+        f.write(b"\x01\x02\x03")
+
+    log = DataLog(buffer_records=4)
+    assert log.last_timestamp == START + 6
+    assert len(log.segments) == 2
+    assert log.append(START + 8, 21.0, 40.0)
+    assert [record[0] for record in log.records()] == [START, START + 2, START + 4, START + 6, START + 8]
+
+
+def test_partial_first_record_discarded():
+    os.mkdir("log")
+    with open("log/00000.bin", "wb") as f:
+        f.write(bytes(RECORD_SIZE - 2))
+    log = DataLog(buffer_records=4)
+    assert log.last_timestamp == 0
+    assert log.segments == [0]
+    fill(log, 3)
+    assert [record[0] for record in log.records()] == [START, START + 2, START + 4]
+
+
+def test_last_timestamp_only_reads_newest_record(monkeypatch):
+    log = DataLog(buffer_records=4, segment_records=8)
+    fill(log, 20)
+    log.flush()
+    reads = []
+    real_open = open
+    monkeypatch.setattr(datalog, "open", lambda path, mode="r": reads.append(path) or real_open(path, mode),
+                        raising=False)
+    assert DataLog(buffer_records=4, segment_records=8).last_timestamp == START + 38
+    assert reads == [log._path(log.segments[-1])]
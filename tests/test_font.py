@@ -0,0 +1,58 @@
+import zlib
+
+import pytest
+
+np = pytest.importorskip("numpy")
+font_to_binary = pytest.importorskip("font_to_binary")
+
+import font
+
+# 10 pixels wide so that each row spans two bytes
+GLYPHS = {
+    "1": np.array([[x == 4 or (y == 4 and x < 8) for x in range(10)] for y in range(5)]),
+    "-": np.array([[y == 2 and 0 < x < 5 for x in range(6)] for y in range(5)]),
+}
+
+
+@pytest.fixture
+def font_file(tmp_path):
+    path = str(tmp_path / "font.bin")
+    font_to_binary.write_font(path, 5, GLYPHS)
+    return path
+
+
+def test_glyph_round_trip(font_file):
+    loaded = font.Font(font_file)
+    assert loaded.height == 5
+    for char, bits in GLYPHS.items():
+        sprite = loaded.glyph(char, 0xFFFF, 0x1234)
+        assert (sprite.width, sprite.height) == (bits.shape[1], bits.shape[0])
+        for y in range(sprite.height):
+            for x in range(sprite.width):
+                assert sprite.pixel(x, y) == (0xFFFF if bits[y, x] else 0x1234)
+
+
+def test_glyph_cached(font_file):
+    loaded = font.Font(font_file, cache_size=1)
+    sprite = loaded.glyph("1", 0xFFFF, 0)
+    assert loaded.glyph("1", 0xFFFF, 0) is sprite
+    assert loaded.glyph("1", 0x07E0, 0) is not sprite
+    assert loaded.glyph("1", 0xFFFF, 0) is not sprite
+    assert loaded.glyph("x", 0xFFFF, 0) is None
+
+
+def test_text_falls_back_to_built_in_font(font_file):
+    from ext.waveshare.lcd import LCD
+    loaded = font.Font(font_file)
+    screen = LCD()
+    assert loaded.text(screen, "1-x", 0, 0, 0xFFFF) == 10 + 6 + 8
+    assert loaded.measure("1-x") == 24
+
+
+def test_truncated_bitmaps(font_file):
+    with open(font_file, "rb") as f:
+        data = zlib.decompress(f.read())
+    with open(font_file, "wb") as f:
+        f.write(zlib.compress(data[:-1]))
+    with pytest.raises(SyntaxError):
+        font.Font(font_file)
@@ -0,0 +1,79 @@
+import pytest
+
+from history import RingBuffer, TieredHistory
+
+
+def fill(history: TieredHistory, count: int):
+    for i in range(count):
+        history.append(20 + (i % 10) / 10)
+
+
+def test_select_finest_tier_covering_span():
+    history = TieredHistory()
+    fill(history, 2 * 3600)
+    assert history.select(300).resolution_s == 1
+    assert history.select(3600).resolution_s == 60
+    assert history.select(2 * 3600).resolution_s == 60
+
+
+def test_select_longest_span_when_none_cover():
+    # 30 minutes of samples: raw holds 10 minutes, minutes hold 30 and there are no hour buckets yet
+    history = TieredHistory()
+    fill(history, 1800)
+    tier = history.select(3600)
+    assert tier.resolution_s == 60
+    assert len(list(tier.window(3600))) == 30
+
+
+def test_select_raw_before_first_minute():
+    history = TieredHistory()
+    fill(history, 30)
+    assert history.select(3600).resolution_s == 1
+    assert len(list(history.window(3600))) == 30
+
+
+def test_select_empty_history():
+    assert TieredHistory().select(3600).resolution_s == 1
+
+
+def test_select_finest_of_equal_spans():
+    # With 10 minutes of samples raw and minutes both hold 600 s
+    history = TieredHistory()
+    fill(history, 600)
+    assert history.select(3600).resolution_s == 1
+
+
+def test_window_min_mean_max():
+    history = TieredHistory(sample_period_s=30)
+    for value in (1.0, 3.0, 2.0, 6.0):
+        history.append(value)
+    assert list(history.minutes.window(120)) == [(1.0, 2.0, 3.0), (2.0, 4.0, 6.0)]
+
+
+def test_ring_buffer_wraps_around():
+    buffer = RingBuffer(5)
+    for value in range(8):
+        buffer.append(value)
+    assert len(buffer) == 5
+    assert list(buffer) == [3, 4, 5, 6, 7]
+    assert (buffer[0], buffer[-1], buffer.latest) == (3, 7, 7)
+    assert list(buffer.window(2)) == [6, 7]
+    assert list(buffer.iter_raw(1, 2)) == [400, 500]
+
+
+def test_ring_buffer_stats_follow_overwrites():
+    # Repeated extremes are evicted one copy at a time, then the last copy goes
+    values = [5, 1, 9, 1, 9, 3, 4, 2, 8, 2, 7, 6, -3, 0.25]
+    buffer = RingBuffer(4)
+    for value in values:
+        buffer.append(value)
+        expected = list(buffer)
+        assert (buffer.min, buffer.max) == (min(expected), max(expected))
+        assert buffer.mean == pytest.approx(sum(expected) / len(expected))
+
+
+def test_ring_buffer_clamps_to_int16():
+    buffer = RingBuffer(2)
+    buffer.append(400)
+    buffer.append(-400)
+    assert list(buffer) == [327.67, -327.68]
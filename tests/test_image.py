@@ -0,0 +1,152 @@
+import zlib
+
+import pytest
+
+import image
+
+
+def grey_to_rgb565(pixel: int) -> int:
+    """The original per-pixel greyscale conversion."""
+    return ((pixel & 0b00011100) << 11 | (pixel & 0b11111000) << 5 | (pixel & 0b11111000) |
+            (pixel & 0b11100000) >> 5)
+
+
+def write_compressed(path, payload: bytes) -> str:
+    path.write_bytes(zlib.compress(payload))
+    return str(path)
+
+
+def pixels(sprite) -> list:
+    return [sprite.pixel(x, y) for y in range(sprite.height) for x in range(sprite.width)]
+
+
+@pytest.fixture
+def greyscale_v1(tmp_path):
+    width, height = 7, 5
+    values = [(i * 37) & 0xFF for i in range(width * height)]
+    return write_compressed(tmp_path / "grey.bin", bytes([0, width, height] + values)), values
+
+
+def test_v1_greyscale_matches_original_conversion(greyscale_v1):
+    filename, values = greyscale_v1
+    loaded = image.Image(filename)
+    assert (loaded.width, loaded.height) == (7, 5)
+    assert pixels(loaded.get_framebuffer()) == [grey_to_rgb565(value) for value in values]
+
+
+def test_framebuffer_built_once(greyscale_v1):
+    loaded = image.Image(greyscale_v1[0])
+    assert loaded.get_framebuffer() is loaded.get_framebuffer()
+
+
+def test_v1_wrong_pixel_count(tmp_path):
+    filename = write_compressed(tmp_path / "short.bin", bytes([0, 4, 4]) + bytes(15))
+    with pytest.raises(SyntaxError):
+        image.Image(filename)
+
+
+try:
+    import image_to_binary
+except ImportError:
+    # The tools need numpy, Pillow and matplotlib
+    image_to_binary = None
+needs_tools = pytest.mark.skipif(image_to_binary is None, reason="image tools not importable")
+
+# An RGB565 test image with a few long runs and some noise
+WIDTH, HEIGHT = 300, 3
+PATTERN = [0xF800] * 280 + [0x07E0, 0x001F, 0xFFFF, 0x1234] * 5
+RGB_PIXELS = [PATTERN[(i * 3) % len(PATTERN)] for i in range(WIDTH * HEIGHT)]
+
+
+@needs_tools
+@pytest.mark.parametrize("indexed", [False, True], ids=["rgb565", "indexed"])
+@pytest.mark.parametrize("rle", [False, True], ids=["raw", "rle"])
+def test_v2_round_trip(tmp_path, indexed, rle):
+    payload = image_to_binary.encode_payload(RGB_PIXELS, WIDTH, HEIGHT, indexed, rle)
+    assert payload[4] == (image.FORMAT_INDEXED if indexed else image.FORMAT_RGB565)
+    assert payload[5] == (image.ENCODING_RLE if rle else image.ENCODING_RAW)
+    loaded = image.Image(write_compressed(tmp_path / "v2.bin", payload))
+    assert (loaded.width, loaded.height) == (WIDTH, HEIGHT)
+    assert pixels(loaded.get_framebuffer()) == RGB_PIXELS
+    assert image_to_binary.decode_image(zlib.compress(payload)) == (WIDTH, HEIGHT, RGB_PIXELS)
+
+
+@needs_tools
+def test_too_many_colours_stored_as_rgb565():
+    colours = list(range(300))
+    payload = image_to_binary.encode_payload(colours, 300, 1, indexed=True, rle=False)
+    assert payload[4] == image.FORMAT_RGB565
+
+
+@needs_tools
+def test_v1_legacy_conversion(tmp_path, greyscale_v1):
+    filename, values = greyscale_v1
+    converted = str(tmp_path / "converted.bin")
+    image_to_binary.legacy_to_v2(filename, converted)
+    original = pixels(image.Image(filename).get_framebuffer())
+    assert pixels(image.Image(converted).get_framebuffer()) == original
+    assert original == [image_to_binary.greyscale_to_colour(value) for value in values]
+
+
+@needs_tools
+def test_truncated_rle_rejected(tmp_path):
+    payload = image_to_binary.encode_payload(RGB_PIXELS, WIDTH, HEIGHT, indexed=False, rle=True)
+    with pytest.raises(SyntaxError):
+        image.Image(write_compressed(tmp_path / "truncated.bin", payload[:-3]))
+
+
+@needs_tools
+@pytest.mark.parametrize("indexed", [False, True], ids=["rgb565", "indexed"])
+def test_rle_image_larger_than_frame_buffer_width(tmp_path, indexed):
+    # 320x240 is more pixels than fit in one 65535 pixel wide row
+    width, height = 320, 240
+    colours = (0xF800, 0x07E0, 0x001F)
+    values = [colours[(x // 100 + y // 7) % 3] for y in range(height) for x in range(width)]
+    payload = image_to_binary.encode_payload(values, width, height, indexed, rle=True)
+    loaded = image.Image(write_compressed(tmp_path / "large.bin", payload))
+    assert pixels(loaded.get_framebuffer()) == values
+
+
+try:
+    import build_atlas
+except ImportError:
+    build_atlas = None
+
+
+@pytest.fixture
+def atlas_file(tmp_path):
+    if build_atlas is None:
+        pytest.skip("image tools not importable")
+    sprites = {"tall": (3, 5, 0xF800), "wide": (6, 2, 0x07E0), "dot": (1, 1, 0x001F)}
+    paths = {}
+    expected = {}
+    for name, (width, height, colour) in sprites.items():
+        # A different colour in the last column so the row stride is checked
+        values = [0xFFFF if x == width - 1 else colour for y in range(height) for x in range(width)]
+        paths[name] = str(tmp_path / f"{name}.bin")
+        with open(paths[name], "wb") as f:
+            f.write(image_to_binary.encode_image(values, width, height))
+        expected[name] = values
+    filename = str(tmp_path / "atlas.bin")
+    build_atlas.build_atlas(paths, filename, max_width=8)
+    return filename, expected
+
+
+def test_atlas_round_trip(atlas_file):
+    filename, expected = atlas_file
+    atlas = image.Atlas(filename)
+    assert set(atlas.sprites) == set(expected)
+    for name, values in expected.items():
+        assert pixels(atlas.get_sprite(name)) == values
+    # The spare row below the sprites is blank
+    framebuffer = atlas.get_framebuffer()
+    assert [framebuffer.pixel(x, atlas.height - 1) for x in range(atlas.width)] == [0] * atlas.width
+
+
+def test_truncated_atlas_index_rejected(tmp_path, atlas_file):
+    with open(atlas_file[0], "rb") as f:
+        data = zlib.decompress(f.read())
+    # Cut off in the header, a name and an entry of the index
+    for length in (4, 8, 12):
+        with pytest.raises(SyntaxError):
+            image.Atlas(write_compressed(tmp_path / "truncated.bin", data[:length]))
@@ -0,0 +1,135 @@
+import pytest
+
+import machine
+
+from ext.waveshare.lcd import LCD, MAX_DIRTY_REGIONS
+
+FULL_FRAME_BYTES = 11 + 160 * 128 * 2
+
+
+@pytest.fixture
+def screen():
+    screen = LCD()
+    screen.show()
+    screen.spi.count = 0
+    return screen
+
+
+def test_full_frame():
+    screen = LCD()
+    count = screen.spi.count
+    screen.fill(screen.BLACK)
+    screen.show()
+    assert screen.spi.count - count == FULL_FRAME_BYTES == 40971
+    assert screen.bytes_sent == FULL_FRAME_BYTES
+
+
+def test_show_without_changes_sends_nothing(screen):
+    screen.show()
+    assert screen.spi.count == 0
+
+
+def test_readout_and_progress_squares(screen):
+    # The readout line and two squares of the progress bar, as redrawn every sample
+    screen.fill_rect(2, 4, 110, 8, screen.BLACK)
+    screen.text("21.4C 45.0%", 2, 4, screen.WHITE)
+    screen.fill_rect(145, 3, 3, 3, screen.GREEN)
+    screen.fill_rect(149, 3, 3, 3, screen.GREEN)
+    assert screen.dirty == [[2, 4, 111, 11], [145, 3, 147, 5], [149, 3, 151, 5]]
+    screen.show()
+    assert screen.spi.count == (11 + 110 * 8 * 2) + 2 * (11 + 3 * 3 * 2) == 1829
+    assert screen.spi.count < FULL_FRAME_BYTES / 10
+    assert screen.dirty == []
+
+
+def test_touching_regions_merge(screen):
+    screen.fill_rect(10, 10, 5, 5, screen.WHITE)
+    screen.fill_rect(15, 10, 5, 5, screen.WHITE)
+    screen.pixel(12, 15, screen.WHITE)
+    assert screen.dirty == [[10, 10, 19, 15]]
+
+
+def test_merge_chains_through_grown_region(screen):
+    screen.pixel(0, 0, screen.WHITE)
+    screen.pixel(4, 0, screen.WHITE)
+    screen.hline(1, 0, 3, screen.WHITE)
+    assert screen.dirty == [[0, 0, 4, 0]]
+
+
+def test_regions_collapse_to_bounding_box(screen):
+    for i in range(MAX_DIRTY_REGIONS + 1):
+        screen.pixel(i * 10, i * 5, screen.WHITE)
+    assert screen.dirty == [[0, 0, MAX_DIRTY_REGIONS * 10, MAX_DIRTY_REGIONS * 5]]
+
+
+def test_regions_are_clipped(screen):
+    screen.fill_rect(150, 120, 20, 20, screen.WHITE)
+    screen.fill_rect(-5, -5, 3, 3, screen.WHITE)
+    assert screen.dirty == [[150, 120, 159, 127]]
+
+
+def test_double_buffer_sends_same_bytes():
+    screen = LCD(double_buffer=True)
+    screen.show()
+    screen.wait()
+    screen.spi.count = 0
+    screen.fill_rect(2, 4, 110, 8, screen.WHITE)
+    screen.show()
+    screen.wait()
+    assert screen.spi.count == 11 + 110 * 8 * 2
+    assert screen._front[(4 * 160 + 2) * 2] == 0xFF
+
+
+def test_transfer_error_does_not_block_show():
+    import threading
+
+    screen = LCD(double_buffer=True)
+    write = screen.spi.write
+
+    def failing_write(buf):
+        screen.spi.write = write
+        raise OSError("SPI failure")
+
+    screen.spi.write = failing_write
+    screen.show()
+
+    def next_frame():
+        screen.wait()
+        screen.fill_rect(0, 0, 2, 2, screen.WHITE)
+        screen.show()
+        screen.wait()
+
+    thread = threading.Thread(target=next_frame, daemon=True)
+    thread.start()
+    thread.join(1)
+    assert not thread.is_alive(), "show blocked after a failed transfer"
+    assert screen.transfer_errors == 1
+    assert isinstance(screen.last_transfer_error, OSError)
+    assert screen.frames == 1
+    assert "errors 1" in screen.report()
+
+
+def test_drawing_during_transfer(monkeypatch):
+    screen = LCD(double_buffer=True)
+    screen.wait()
+    trace = []
+    monkeypatch.setattr(machine, "trace", trace)
+    # About 80 ms for a full frame
+    screen.spi.delay_us_per_byte = 2
+
+    def frames() -> list:
+        return [event[1] for event in trace if event[0] == "spi" and len(event[1]) == len(screen.buffer)]
+
+    screen.fill(0xF800)
+    first = bytes(screen.buffer)
+    screen.show()
+    assert screen._idle.locked(), "the first frame was sent before show returned"
+    # Draw the next frame while the first is still being sent
+    screen.fill(0x001F)
+    second = bytes(screen.buffer)
+    screen.show()
+    # The second show waited for the whole of the first frame before copying over it
+    assert frames() == [first]
+    screen.wait()
+    assert frames() == [first, second]
+    assert screen.transfer_errors == 0
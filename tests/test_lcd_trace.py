@@ -0,0 +1,59 @@
+"""The driver must send the display exactly what the original byte at a time driver sent."""
+import os
+
+import machine
+import pytest
+
+import ext.waveshare.lcd as lcd
+
+TRACE = os.path.join(os.path.dirname(__file__), "data", "st7735_trace.txt")
+
+
+def load_trace(path: str) -> list:
+    """Read a trace as a list of (dc, byte) pairs."""
+    stream = []
+    with open(path) as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            kind, data = line.split(" ", 1)
+            dc = 1 if kind == "D" else 0
+            for item in data.split():
+                value, _, count = item.partition("*")
+                stream.extend([(dc, int(value, 16))] * int(count or 1))
+    return stream
+
+
+def spi_stream(trace: list) -> list:
+    """Turn recorded pin changes and SPI writes into the (dc, byte) pairs seen by the display."""
+    cs = dc = None
+    stream = []
+    for event in trace:
+        if event[0] == "pin":
+            if event[1] == lcd.CS:
+                cs = event[2]
+            elif event[1] == lcd.DC:
+                dc = event[2]
+        else:
+            assert cs == 0, "SPI write with CS high"
+            stream.extend((dc, byte) for byte in event[1])
+    return stream
+
+
+@pytest.fixture
+def trace():
+    machine.trace = []
+    yield machine.trace
+    machine.trace = None
+
+
+def test_init_and_full_frame_match_recorded_trace(trace):
+    screen = lcd.LCD()
+    screen.show()
+    assert spi_stream(trace) == load_trace(TRACE)
+
+
+def test_cs_released_after_each_transfer(trace):
+    screen = lcd.LCD()
+    screen.show()
+    assert [event for event in trace if event[0] == "pin" and event[1] == lcd.CS][-1] == ("pin", lcd.CS, 1)
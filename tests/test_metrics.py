@@ -0,0 +1,121 @@
+import asyncio
+import json
+import subprocess
+import sys
+
+import pytest
+
+import metrics
+import sensors
+from conftest import REPO
+
+
+def make_sensors(samples: int, history_len: int = 10) -> dict:
+    temperature = sensors.Temperature(history_len)
+    humidity = sensors.Humidity(history_len)
+    for i in range(samples):
+        temperature.update_value(20 + (i % 50) / 10 - 2.5)
+        humidity.update_value(40 + (i % 7))
+    return {"temperature_celsius": temperature, "humidity_percent": humidity}
+
+
+async def request(port: int, path: str, method: str = "GET") -> tuple[bytes, list, bytes]:
+    """Make a request and return the status line, the chunk sizes and the body."""
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(f"{method} {path} HTTP/1.1\r\nHost: pico\r\n\r\n".encode())
+    await writer.drain()
+    status = await reader.readline()
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line == b"\r\n":
+            break
+        name, _, value = line.decode().partition(":")
+        headers[name.lower()] = value.strip()
+    chunks = []
+    body = b""
+    if headers.get("transfer-encoding") == "chunked":
+        while True:
+            size = int(await reader.readline(), 16)
+            chunk = await reader.readexactly(size + 2)
+            assert chunk.endswith(b"\r\n")
+            if not size:
+                break
+            chunks.append(size)
+            body += chunk[:-2]
+    else:
+        body = await reader.readexactly(int(headers["content-length"]))
+    writer.close()
+    return status, chunks, body
+
+
+def serve(sensor_map: dict, *paths) -> list:
+    async def run():
+        server = metrics.MetricsServer(sensor_map, 0)
+        await server.start("127.0.0.1")
+        port = server.server.sockets[0].getsockname()[1]
+        try:
+            return [await request(port, path) for path in paths]
+        finally:
+            server.close()
+
+    return asyncio.run(run())
+
+
+def test_default_span_before_first_hour():
+    # 200 samples: 3 minute buckets and no hour buckets yet
+    sensor_map = make_sensors(200)
+    status, chunks, body = serve(sensor_map, "/history/temperature_celsius")[0]
+    assert status.startswith(b"HTTP/1.1 200")
+    history = json.loads(body)
+    assert history["resolution_s"] == 60
+    assert len(history["points"]) == 3
+
+
+def test_history_matches_stored_values():
+    sensor_map = make_sensors(200)
+    tier = sensor_map["temperature_celsius"].history.minutes
+    body = serve(sensor_map, "/history/temperature_celsius?span=600")[0][2]
+    points = ", ".join(f"[{low:.2f}, {mean:.2f}, {high:.2f}]" for low, mean, high in tier.window(600))
+    assert body.decode() == f'{{"resolution_s": 60, "points": [{points}]}}'
+
+
+def test_long_history_sent_in_bounded_chunks():
+    sensor_map = make_sensors(600, history_len=600)
+    status, chunks, body = serve(sensor_map, "/history/humidity_percent?span=600")[0]
+    points = json.loads(body)["points"]
+    assert len(points) == 600
+    assert points[0] == [40.0, 40.0, 40.0]
+    assert len(chunks) > 10
+    assert max(chunks) <= metrics.CHUNK_SIZE + metrics.CHUNK_MARGIN - 2
+
+
+def test_latest_values():
+    sensor_map = make_sensors(3)
+    (_, _, prometheus), (_, _, body) = serve(sensor_map, "/metrics", "/metrics.json")
+    assert b"temperature_celsius 17.70\n" in prometheus
+    assert json.loads(body) == {"temperature_celsius": 17.7, "humidity_percent": 42.0}
+
+
+def test_bad_requests():
+    sensor_map = make_sensors(3)
+    statuses = [response[0] for response in serve(sensor_map, "/nothing", "/history/pressure",
+                                                   "/history/temperature_celsius?span=long")]
+    assert statuses == [b"HTTP/1.1 404 Not Found\r\n", b"HTTP/1.1 404 Not Found\r\n",
+                        b"HTTP/1.1 400 Bad Request\r\n"]
+
+
+@pytest.mark.parametrize("raw, decimals, text", [(0, 2, "0.00"), (5, 2, "0.05"), (-5, 2, "-0.05"), (1234, 2, "12.34"),
+                                                 (-32768, 2, "-327.68"), (32767, 2, "327.67"), (3600, 0, "3600"),
+                                                 (0, 0, "0"), (7, 1, "0.7")])
+def test_write_fixed(raw, decimals, text):
+    buffer = bytearray(b"#" * 12)
+    end = metrics._write_fixed(buffer, 1, raw, decimals)
+    assert buffer[1:end].decode() == text
+    assert buffer[end:] == b"#" * (12 - end)
+
+
+def test_imports_without_hardware():
+    # Only the standard library and the logger are needed, so the server can be run on a host as it is
+    code = f"import sys; sys.path.insert(0, {REPO!r}); import metrics; assert 'machine' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
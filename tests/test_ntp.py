@@ -0,0 +1,164 @@
+import asyncio
+import socket
+import struct
+import threading
+import time
+
+import pytest
+
+import ntp
+import rtc
+from scheduler import ticks_ms
+
+OFFSET_S = 1234.5  # The server's clock is this far ahead of the host's
+# The server's clock runs from the same monotonic clock as ticks_ms, so the true time at any tick is known exactly
+EPOCH_S = time.time() - time.monotonic() + OFFSET_S
+
+
+def server_ms(ticks: int) -> float:
+    """The server's Unix time in milliseconds at the ticks_ms value ticks."""
+    return ticks + EPOCH_S * 1000
+
+
+def accuracy_ms(client: ntp.SNTPClient) -> float:
+    """SNTP is accurate to half the round trip, which includes any delay in polling for the reply on a loaded host.
+    A few milliseconds are added as the result and the tick readings are truncated to whole milliseconds."""
+    return client.last_delay_us / 2000 + 3
+
+
+class Server:
+    """A local SNTP server stand-in answering from the host clock plus OFFSET_S."""
+
+    def __init__(self):
+        self.processing_s = 0  # Time between the receive and transmit timestamps
+        self.stray = False  # Send a reply with the wrong originate timestamp first
+        self.stratum = 2
+        self.silent = False
+        self.requests = 0
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(("127.0.0.1", 0))
+        self.port = self.socket.getsockname()[1]
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                request, address = self.socket.recvfrom(ntp.PACKET_SIZE)
+            except OSError:
+                return
+            self.requests += 1
+            if self.silent:
+                continue
+            receive = time.monotonic() + EPOCH_S
+            time.sleep(self.processing_s)
+            reply = bytes([0x24, self.stratum]) + bytes(22) + request[40:48] + _timestamp(receive)
+            if self.stray:
+                self.socket.sendto(reply[:24] + bytes(8) + reply[32:] + _timestamp(time.monotonic() + EPOCH_S + 100),
+                                   address)
+            self.socket.sendto(reply + _timestamp(time.monotonic() + EPOCH_S), address)
+
+    def close(self):
+        self.socket.close()
+
+
+def _timestamp(unix_s: float) -> bytes:
+    return struct.pack("!II", int(unix_s) + ntp.NTP_DELTA, int(unix_s % 1 * (1 << 32)))
+
+
+@pytest.fixture
+def server():
+    server = Server()
+    yield server
+    server.close()
+
+
+def query(server: Server, timeout_ms: int = 500):
+    client = ntp.SNTPClient("127.0.0.1", server.port, timeout_ms)
+    return client, asyncio.run(client.query())
+
+
+def assert_accurate(client: ntp.SNTPClient, unix_ms: int, measured: int):
+    assert abs(unix_ms - server_ms(measured)) <= accuracy_ms(client)
+
+
+def test_query(server):
+    client, (unix_ms, measured) = query(server)
+    assert_accurate(client, unix_ms, measured)
+
+
+def test_server_processing_time_removed(server):
+    server.processing_s = 0.1
+    client, (unix_ms, measured) = query(server)
+    # The round trip took over 100 ms, but the time is as accurate as without the delay
+    assert client.last_delay_us < 20_000
+    assert_accurate(client, unix_ms, measured)
+
+
+def test_stray_reply_ignored(server):
+    server.stray = True
+    client, (unix_ms, measured) = query(server)
+    assert_accurate(client, unix_ms, measured)
+
+
+def test_timeout(server):
+    server.silent = True
+    start = time.monotonic()
+    client, result = query(server, timeout_ms=200)
+    assert result is None
+    # The timeout is measured in whole ticks_ms, which can be up to a millisecond less than the real time
+    assert 0.199 <= time.monotonic() - start < 0.5
+    assert server.requests == 1
+    # Looked up again on the next query
+    assert client._address is None
+
+
+def test_kiss_of_death_ignored(server):
+    server.stratum = 0
+    assert query(server, timeout_ms=100)[1] is None
+
+
+def test_other_tasks_run_while_waiting(server):
+    server.processing_s = 0.1
+    client = ntp.SNTPClient("127.0.0.1", server.port)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def run():
+        return await asyncio.gather(client.query(), ticker())
+
+    result, _ = asyncio.run(run())
+    assert result is not None
+    assert len(ticks) == 5 and ticks[-1] - ticks[0] < 0.09
+
+
+def test_clock_sync_and_drift(server):
+    clock = rtc.Clock("127.0.0.1")
+    clock.ntp.port = server.port
+    assert asyncio.run(clock.sync())
+    first_accuracy_ms = accuracy_ms(clock.ntp)
+    now = ticks_ms()
+    assert abs(clock._local_ms(now) - server_ms(now)) <= first_accuracy_ms
+    assert clock.clock.datetime()[0] == time.gmtime(server_ms(now) / 1000)[0]
+
+    # Pretend the last sync was 1000 s ago and the local clock has lost 100 ms since, 100 ppm slow
+    clock._sync_ticks -= 1_000_000
+    clock._sync_ms -= 1_000_000 + 100
+    assert asyncio.run(clock.sync())
+    # Both syncs can be out by their accuracy
+    assert abs(clock.last_error_ms - 100) <= first_accuracy_ms + accuracy_ms(clock.ntp)
+    # Over 1000 s each millisecond of error is 1 ppm
+    assert clock.drift_ppm == pytest.approx(rtc.DRIFT_GAIN * clock.last_error_ms, rel=0.01)
+
+
+def test_timestamps_never_go_back(server):
+    clock = rtc.Clock("127.0.0.1")
+    clock.ntp.port = server.port
+    assert asyncio.run(clock.sync())
+    first = clock.timestamp_ms()
+    # A later sync steps the clock back by a second
+    clock._sync_ms -= 1000
+    assert clock.timestamp_ms() == first
@@ -0,0 +1,76 @@
+from ext.waveshare.lcd import LCD
+from plot import ScatterPlot, AxisTransform
+
+ORIGIN = (40, 20)
+SIZE = (110, 80)
+
+
+def draw(screen: LCD, *updates) -> bytes:
+    plot = ScatterPlot(screen, ORIGIN, SIZE)
+    for y_data in updates:
+        plot.update_plot((range(len(y_data)), y_data))
+    return bytes(screen.buffer)
+
+
+def test_labels_drawn_outside_box():
+    screen = LCD()
+    draw(screen, [1000, 1500, 2000])
+    # The y labels are left of the box and the x labels extend below it
+    assert any(screen.pixel(x, y) for x in range(ORIGIN[0]) for y in range(128))
+    assert any(screen.pixel(x, y) for x in range(160) for y in range(ORIGIN[1] + SIZE[1], 128))
+
+
+def test_redraw_clears_old_labels():
+    redrawn = draw(LCD(), [1000, 1500, 2000], [1, 2, 3, 4])
+    assert redrawn == draw(LCD(), [1, 2, 3, 4])
+
+
+def test_redraw_clears_labels_from_all_earlier_updates():
+    redrawn = draw(LCD(), [1000, 1500, 2000], [100, 100, 100], [1, 2, 3, 4])
+    assert redrawn == draw(LCD(), [1, 2, 3, 4])
+
+
+def test_appended_point_drawn_incrementally():
+    screen = LCD()
+    plot = ScatterPlot(screen, ORIGIN, SIZE)
+    plot.update_plot((range(4), [10, 20, 30, 40]))
+    sent = screen.spi.count
+    plot.update_plot((range(5), [10, 20, 30, 40, 20]))
+    # Only the window and pixel of the new point
+    assert screen.spi.count - sent == 11 + 2
+
+
+def test_axis_transform():
+    transform = AxisTransform(100, 200, 10, 60)
+    assert [transform.map(value) for value in (100, 150, 200)] == [10, 35, 60]
+    reversed_transform = AxisTransform(0, 10, 90, 10)
+    assert reversed_transform.map(5) == 50
+
+
+def test_envelope_draws_min_to_max_per_column():
+    screen = LCD()
+    plot = ScatterPlot(screen, ORIGIN, SIZE)
+    x_transform = AxisTransform(0, 99, 50, 59)
+    y_transform = AxisTransform(0, 100, 90, 40)
+    y_data = [50 + (x * 7) % 11 for x in range(100)]
+    y_data[42] = 100  # A single spike must not be lost
+    plot.plot_envelope((range(100), y_data), x_transform, y_transform)
+
+    columns = {}
+    for x, y in zip(range(100), y_data):
+        columns.setdefault(x_transform.map(x), []).append(y_transform.map(y))
+    assert sorted(columns) == list(range(50, 60))
+    for column, rows in columns.items():
+        lit = [y for y in range(128) if screen.pixel(column, y)]
+        assert lit == list(range(min(rows), max(rows) + 1))
+    assert screen.pixel(x_transform.map(42), 40)
+
+
+def test_long_series_drawn_as_envelope():
+    screen = LCD()
+    plot = ScatterPlot(screen, ORIGIN, SIZE)
+    # Many more points than pixel columns, so every column of the data area gets a line
+    plot.update_plot((range(5000), [1000 + i % 50 for i in range(5000)]))
+    x_axis = plot._axes[0]
+    assert plot._plotted == 0
+    assert all(any(screen.pixel(x, y) for y in range(ORIGIN[1], x_axis[1])) for x in range(x_axis[0] + 1, x_axis[2]))
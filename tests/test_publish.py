@@ -0,0 +1,243 @@
+import asyncio
+import socket
+import struct
+
+import pytest
+
+import publish
+import wifi
+from datalog import RECORD_FORMAT, RECORD_SIZE
+from publish import PACKET_HEADER, PACKET_HEADER_SIZE
+
+
+class Link:
+    state = wifi.CONNECTED
+
+
+class Recorder:
+    """A transport which keeps a copy of every packet, or fails while failing is set."""
+
+    def __init__(self):
+        self.packets = []
+        self.failing = False
+
+    async def send(self, packet):
+        if self.failing:
+            raise OSError("unreachable")
+        self.packets.append(bytes(packet))
+
+    def close(self):
+        pass
+
+
+def decode(packet: bytes) -> tuple[int, list]:
+    """Return the sequence number and timestamps of a packet."""
+    magic, version, sequence, count = struct.unpack_from(PACKET_HEADER, packet)
+    assert (magic, version) == (b"TMP", 1)
+    assert len(packet) == PACKET_HEADER_SIZE + count * RECORD_SIZE
+    return sequence, [struct.unpack_from(RECORD_FORMAT, packet, PACKET_HEADER_SIZE + i * RECORD_SIZE)[0]
+                      for i in range(count)]
+
+
+def make_publisher(transport, **kwargs) -> publish.Publisher:
+    options = {"capacity": 10, "batch_records": 4, "max_packets": 2, "packet_interval_ms": 0}
+    options.update(kwargs)
+    return publish.Publisher(transport, Link(), **options)
+
+
+def test_batches_in_order():
+    transport = Recorder()
+    publisher = make_publisher(transport)
+    for timestamp in range(6):
+        publisher.add(timestamp, 21.5, 40.25)
+    asyncio.run(publisher.flush())
+    assert [decode(packet) for packet in transport.packets] == [(0, [0, 1, 2, 3]), (1, [4, 5])]
+    assert struct.unpack_from(RECORD_FORMAT, transport.packets[0], PACKET_HEADER_SIZE) == (0, 2150, 4025)
+    assert len(publisher) == 0
+    assert publisher.sent == 6
+
+
+def test_queue_overflow_drops_oldest():
+    transport = Recorder()
+    publisher = make_publisher(transport, max_packets=3)
+    for timestamp in range(13):
+        publisher.add(timestamp, 20, 50)
+    assert len(publisher) == 10
+    assert publisher.dropped == 3
+    asyncio.run(publisher.flush())
+    # The queue wrapped around the end of its buffer
+    assert [decode(packet)[1] for packet in transport.packets] == [[3, 4, 5, 6], [7, 8, 9, 10], [11, 12]]
+
+
+def test_backlog_drained_over_several_flushes():
+    transport = Recorder()
+    publisher = make_publisher(transport)
+    for timestamp in range(10):
+        publisher.add(timestamp, 20, 50)
+    asyncio.run(publisher.flush())
+    assert len(transport.packets) == 2
+    assert len(publisher) == 2
+    asyncio.run(publisher.flush())
+    assert decode(transport.packets[-1]) == (2, [8, 9])
+    assert len(publisher) == 0
+
+
+def test_readings_kept_while_offline_or_failing():
+    transport = Recorder()
+    publisher = make_publisher(transport)
+    publisher.add(1, 20, 50)
+    publisher.wlan.state = wifi.BACKOFF
+    asyncio.run(publisher.flush())
+    assert transport.packets == []
+    publisher.wlan.state = wifi.CONNECTED
+    transport.failing = True
+    asyncio.run(publisher.flush())
+    assert publisher.errors == 1
+    assert len(publisher) == 1
+    transport.failing = False
+    asyncio.run(publisher.flush())
+    assert decode(transport.packets[0]) == (0, [1])
+
+
+def test_udp_transport():
+    receiver = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    receiver.bind(("127.0.0.1", 0))
+    receiver.settimeout(1)
+    transport = publish.UDPTransport("127.0.0.1", receiver.getsockname()[1])
+    publisher = make_publisher(transport)
+    publisher.add(7, 20, 50)
+    asyncio.run(publisher.flush())
+    assert decode(receiver.recv(1024)) == (0, [7])
+    transport.close()
+    receiver.close()
+
+
+def test_udp_failed_lookup_not_retried_every_flush(monkeypatch):
+    lookups = []
+
+    def getaddrinfo(host, port):
+        lookups.append(host)
+        raise OSError("no DNS")
+
+    now = [0]
+    monkeypatch.setattr(publish.socket, "getaddrinfo", getaddrinfo)
+    monkeypatch.setattr(publish, "ticks_ms", lambda: now[0])
+    transport = publish.UDPTransport("collector.local", 5005)
+    publisher = make_publisher(transport)
+    publisher.add(1, 20, 50)
+    for _ in range(3):
+        asyncio.run(publisher.flush())
+    assert lookups == ["collector.local"]
+    assert publisher.errors == 3
+    now[0] = publish.RETRY_MS
+    asyncio.run(publisher.flush())
+    assert len(lookups) == 2
+    assert len(publisher) == 1
+
+
+class Broker:
+    """A local MQTT broker stand-in which accepts one client and records what it publishes."""
+
+    def __init__(self, return_code: int = 0, split_connack: bool = False, silent: bool = False):
+        self.return_code = return_code
+        self.split_connack = split_connack
+        self.silent = silent
+        self.connect = None
+        self.published = []
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._client, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def _client(self, reader, writer):
+        try:
+            self.connect = await self._packet(reader)
+            if self.silent:
+                await asyncio.sleep(10)
+            connack = bytes([0x20, 0x02, 0x00, self.return_code])
+            if self.split_connack:
+                # The CONNACK arrives in two reads
+                writer.write(connack[:1])
+                await writer.drain()
+                await asyncio.sleep(0.05)
+                connack = connack[1:]
+            writer.write(connack)
+            await writer.drain()
+            while True:
+                self.published.append(await self._packet(reader))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _packet(reader) -> tuple[int, bytes]:
+        kind = (await reader.readexactly(1))[0]
+        length = 0
+        shift = 0
+        while True:
+            byte = (await reader.readexactly(1))[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return kind, await reader.readexactly(length)
+
+    def close(self):
+        self.server.close()
+
+
+def run_mqtt(broker: Broker, count: int, timeout_s: float = 1) -> tuple:
+    async def run():
+        port = await broker.start()
+        transport = publish.MQTTTransport("127.0.0.1", port, "home/temperature", timeout_s=timeout_s)
+        publisher = make_publisher(transport)
+        for timestamp in range(count):
+            publisher.add(timestamp, 20, 50)
+        await publisher.flush()
+        await asyncio.sleep(0.05)
+        transport.close()
+        broker.close()
+        return transport, publisher
+
+    return asyncio.run(run())
+
+
+def test_mqtt_publish():
+    broker = Broker(split_connack=True)
+    transport, publisher = run_mqtt(broker, 6)
+    assert broker.connect[0] == 0x10
+    assert broker.connect[1][:7] == b"\x00\x04MQTT\x04"
+    assert [kind for kind, _ in broker.published] == [0x30, 0x30]
+    topic_length = struct.unpack_from("!H", broker.published[0][1])[0]
+    assert broker.published[0][1][2:2 + topic_length] == b"home/temperature"
+    assert decode(broker.published[1][1][2 + topic_length:]) == (1, [4, 5])
+    assert publisher.errors == 0
+
+
+def test_mqtt_refused():
+    broker = Broker(return_code=5)
+    transport, publisher = run_mqtt(broker, 1)
+    assert broker.published == []
+    assert publisher.errors == 1
+    assert len(publisher) == 1
+
+
+def test_mqtt_connect_times_out():
+    broker = Broker(silent=True)
+    transport, publisher = run_mqtt(broker, 1, timeout_s=0.1)
+    assert publisher.errors == 1
+    assert len(publisher) == 1
+    assert transport._writer is None
+    # Not retried on the next flush
+    with pytest.raises(OSError):
+        asyncio.run(transport.send(memoryview(b"")))
+
+
+def test_remaining_length():
+    assert publish._remaining_length(0) == b"\x00"
+    assert publish._remaining_length(127) == b"\x7f"
+    assert publish._remaining_length(128) == b"\x80\x01"
+    assert publish._remaining_length(16_383) == b"\xff\x7f"
+    assert publish._remaining_length(2_097_151) == b"\xff\xff\x7f"
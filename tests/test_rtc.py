@@ -0,0 +1,67 @@
+import calendar
+import time
+
+import pytest
+
+import rtc
+
+# 23:59:58.500 on a leap day
+START_MS = calendar.timegm((2024, 2, 29, 23, 59, 58)) * 1000 + 500
+
+
+class Clock:
+    def __init__(self):
+        self.now = 5000
+
+    def __call__(self) -> int:
+        return self.now
+
+
+@pytest.fixture
+def ticks(monkeypatch):
+    ticks = Clock()
+    monkeypatch.setattr(rtc, "ticks_ms", ticks)
+    return ticks
+
+
+@pytest.fixture
+def clock(ticks):
+    clock = rtc.Clock()
+    clock.synced = True
+    clock._sync_ticks = ticks.now
+    clock._sync_ms = START_MS
+    return clock
+
+
+def formatted(unix_ms: int) -> tuple[str, str, str, str]:
+    t = time.gmtime(unix_ms // 1000)
+    return (f"{t[3]:02}:{t[4]:02}:{t[5]:02}", f"{t[3]:02}:{t[4]:02}", f"{t[2]:02}-{t[1]:02}-{t[0]}",
+            f"{t[3]:02}:{t[4]:02}:{t[5]:02} {t[2]:02}/{t[1]:02}/{t[0]}")
+
+
+def strings(clock: rtc.Clock) -> tuple[str, str, str, str]:
+    return clock.time(), clock.time(seconds=False), clock.date(), clock.datetime()
+
+
+def test_strings_match_time_across_rollovers(clock, ticks):
+    # Through the end of the day, month and into the next minute
+    for step in range(0, 65_000, 250):
+        ticks.now = 5000 + step
+        assert strings(clock) == formatted(START_MS + step)
+    assert clock.date() == "01-03-2024"
+
+
+def test_strings_cached_until_second_ends(clock, ticks, monkeypatch):
+    first = strings(clock)
+    calls = []
+    now_ms = clock.now_ms
+    monkeypatch.setattr(clock, "now_ms", lambda: calls.append(1) or now_ms())
+
+    ticks.now += 499
+    assert all(a is b for a, b in zip(strings(clock), first))
+    assert not calls
+
+    ticks.now += 1
+    assert strings(clock) == formatted(START_MS + 500)
+    assert len(calls) == 1
+
@@ -0,0 +1,128 @@
+import asyncio
+import heapq
+import itertools
+
+from scheduler import Scheduler
+
+
+class FakeClock:
+    """Virtual milliseconds for the scheduler. Sleepers wake in deadline order and time only moves when every task is
+    waiting, or when a callback calls advance() to stand in for blocking work."""
+
+    def __init__(self):
+        self.now = 0
+        self._sleepers = []
+        self._order = itertools.count()
+
+    def ticks(self) -> int:
+        return self.now
+
+    def advance(self, ms: int):
+        self.now += ms
+
+    async def sleep(self, ms: int):
+        wake = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._sleepers, (self.now + ms, next(self._order), wake))
+        await wake
+
+    def run(self, scheduler: Scheduler, duration_ms: int):
+        """Run the scheduler until the next wake up would be after duration_ms."""
+        async def drive():
+            running = asyncio.ensure_future(scheduler.run())
+            while True:
+                # Let woken tasks run up to their next sleep
+                for _ in range(10):
+                    await asyncio.sleep(0)
+                when, _, wake = heapq.heappop(self._sleepers)
+                if when > duration_ms:
+                    break
+                self.now = max(self.now, when)
+                wake.set_result(None)
+            running.cancel()
+            try:
+                await running
+            except asyncio.CancelledError:
+                pass
+
+        asyncio.run(drive())
+
+
+def test_fixed_rate_without_drift():
+    clock = FakeClock()
+    starts = []
+
+    async def slow():
+        starts.append(clock.ticks())
+        # Run time must not push later runs back
+        await clock.sleep(8)
+
+    scheduler = Scheduler(clock.ticks, clock.sleep)
+    task = scheduler.add("slow", 20, slow, offset_ms=10)
+    clock.run(scheduler, 300)
+    assert starts == list(range(10, 300, 20))
+    assert task.runs == 15
+    assert (task.max_jitter_ms, task.overruns, task.skipped) == (0, 0, 0)
+
+
+def test_overrun_skips_missed_deadlines():
+    clock = FakeClock()
+    starts = []
+
+    def blocking():
+        starts.append(clock.ticks())
+        clock.advance(35)
+
+    scheduler = Scheduler(clock.ticks, clock.sleep)
+    task = scheduler.add("blocking", 20, blocking)
+    clock.run(scheduler, 190)
+    # Each run misses the next deadline, so the one after that is used rather than starting at once
+    assert starts == [0, 40, 80, 120, 160]
+    assert (task.runs, task.overruns, task.skipped) == (5, 5, 5)
+    assert task.max_jitter_ms == 0
+
+
+def test_late_run_is_measured_as_jitter():
+    clock = FakeClock()
+    starts = []
+
+    def late():
+        starts.append(clock.ticks())
+
+    def blocking():
+        clock.advance(15)
+
+    scheduler = Scheduler(clock.ticks, clock.sleep)
+    task = scheduler.add("late", 20, late, offset_ms=5)
+    scheduler.add("blocking", 100, blocking)
+    clock.run(scheduler, 50)
+    # The first run is held up by the blocking task, later runs are back on the grid
+    assert starts == [15, 25, 45]
+    assert (task.last_jitter_ms, task.max_jitter_ms, task.total_jitter_ms) == (0, 10, 10)
+    assert task.overruns == 0
+
+
+def test_errors_are_counted_and_task_continues():
+    clock = FakeClock()
+
+    def failing():
+        raise ValueError("broken")
+
+    scheduler = Scheduler(clock.ticks, clock.sleep)
+    task = scheduler.add("failing", 10, failing)
+    clock.run(scheduler, 55)
+    assert task.runs == task.errors == 6
+
+
+def test_tasks_are_independent():
+    clock = FakeClock()
+
+    async def slow():
+        await clock.sleep(100)
+
+    scheduler = Scheduler(clock.ticks, clock.sleep)
+    scheduler.add("slow", 200, slow)
+    fast = scheduler.add("fast", 10, lambda: None)
+    clock.run(scheduler, 105)
+    assert fast.runs == 11
+    assert "fast: runs 11" in scheduler.report()
+    assert "slow: runs 1" in scheduler.report()
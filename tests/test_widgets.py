@@ -0,0 +1,109 @@
+import os
+
+import main
+from conftest import REPO
+from ext.waveshare.lcd import LCD
+from font import Font
+from progress import ProgressIcon
+from sensors import Humidity, Temperature
+from widgets import Compositor, Readout
+
+
+def count_shows(screen: LCD) -> list:
+    shows = []
+    show = screen.show
+    screen.show = lambda: shows.append(show())
+    return shows
+
+
+def test_readout_redrawn_only_when_text_changes():
+    screen = LCD()
+    sensor = Temperature(10)
+    compositor = Compositor(screen)
+    readout = compositor.add(Readout(sensor, 2, 4, 110))
+    shows = count_shows(screen)
+
+    # With no readings the area is cleared once and left alone
+    assert compositor.render()
+    assert not compositor.render()
+    assert readout.text is None
+
+    sensor.update_value(21.5)
+    assert compositor.render()
+    assert readout.text == "Temp: 21.50 C"
+    assert screen.pixel(2, 4)
+
+    # A new value which formats the same is not redrawn
+    sensor.update_value(21.501)
+    assert not compositor.render()
+    sensor.update_value(21.51)
+    assert compositor.render()
+    assert readout.text == "Temp: 21.51 C"
+    assert len(shows) == 3
+
+
+def test_one_show_per_frame():
+    screen = LCD()
+    temperature = Temperature(10)
+    humidity = Humidity(10)
+    compositor = Compositor(screen)
+    compositor.add(Readout(temperature, 2, 4, 110))
+    compositor.add(Readout(humidity, 2, 22, 120))
+    shows = count_shows(screen)
+
+    temperature.update_value(21.5)
+    humidity.update_value(45.5)
+    assert compositor.render()
+    assert len(shows) == 1
+    assert not compositor.render()
+    assert len(shows) == 1
+
+    # Invalidating the layout redraws every widget, still with a single show
+    screen.fill(screen.BLACK)
+    compositor.invalidate()
+    assert compositor.render()
+    assert len(shows) == 2
+    assert screen.pixel(2, 4) and screen.pixel(2, 22)
+
+
+def test_progress_icon_advances_every_frame():
+    screen = LCD()
+    compositor = Compositor(screen)
+    icon = compositor.add(ProgressIcon(145, 3))
+    shows = count_shows(screen)
+    for frame in range(1, 10):
+        assert compositor.render()
+        assert icon.position == frame % 8
+        highlighted = [screen.pixel(145 + x, 3 + y) == icon.tick_col for x, y in icon.coords]
+        assert highlighted == [index == icon.position for index in range(8)]
+    assert len(shows) == 9
+
+
+def test_readout_glyphs_converted_once():
+    readout_font = Font(os.path.join(REPO, main.READOUT_FONT))
+    temperature = Temperature(10)
+    humidity = Humidity(10)
+    compositor = Compositor(LCD())
+    readouts = [
+        compositor.add(Readout(temperature, 2, 4, main.readout_width(readout_font, main.TEMPERATURE_WIDEST),
+                               readout_font)),
+        compositor.add(Readout(humidity, 2, 22, main.readout_width(readout_font, main.HUMIDITY_WIDEST), readout_font))]
+    shown = set()
+    for frame in range(50):
+        temperature.update_value(-5 + frame * 1.37)
+        humidity.update_value(40 + frame * 1.13)
+        assert compositor.render()
+        shown.update(*(readout.text for readout in readouts))
+    # Both readouts fit in the cache, so each character is converted the first time it is shown and never again
+    assert shown <= set(readout_font.glyphs)
+    assert readout_font.misses == len(shown)
+
+
+def test_readouts_sized_for_widest_text():
+    readout_font = Font(os.path.join(REPO, main.READOUT_FONT))
+    for widest in (main.TEMPERATURE_WIDEST, main.HUMIDITY_WIDEST):
+        assert set(widest) <= set(readout_font.glyphs)
+    # The temperature shares the top row with the Wi-Fi icon
+    for width_font in (readout_font, None):
+        assert 2 + main.readout_width(width_font, main.TEMPERATURE_WIDEST) <= 120
+        assert 2 + main.readout_width(width_font, main.HUMIDITY_WIDEST) <= 160
@@ -0,0 +1,132 @@
+import pytest
+
+import wifi
+from conftest import REPO
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000
+
+    def __call__(self) -> int:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(wifi, "ticks_ms", clock)
+    return clock
+
+
+@pytest.fixture
+def wlan(clock, monkeypatch):
+    # The Wi-Fi icon is loaded from the images directory
+    monkeypatch.chdir(REPO)
+    wlan = wifi.StatefulWLAN("home", "secret")
+    changes = []
+    wlan.on_change(lambda old, new: changes.append((old, new)))
+    wlan.changes = changes
+    return wlan
+
+
+def fail_attempt(wlan, clock, status: int) -> int:
+    """Make the current attempt fail with status and return the backoff delay chosen."""
+    wlan.status_code = status
+    wlan.check_status()
+    assert wlan.state == wifi.BACKOFF
+    wlan.status_code = wifi.STAT_IDLE
+    return wlan._deadline - clock.now
+
+
+def test_connects(wlan, clock):
+    wlan.check_status()
+    assert wlan.state == wifi.CONNECTING
+    assert wlan.connects == 1
+    wlan.status_code = wifi.STAT_CONNECTING
+    clock.now += 2000
+    wlan.check_status()
+    assert wlan.state == wifi.CONNECTING
+    wlan.status_code = wifi.STAT_GOT_IP
+    wlan.check_status()
+    assert wlan.state == wifi.CONNECTED
+    assert wlan.changes == [(wifi.DISCONNECTED, wifi.CONNECTING), (wifi.CONNECTING, wifi.CONNECTED)]
+    assert wlan.icon.connected
+
+
+def test_attempt_times_out(wlan, clock):
+    wlan.check_status()
+    wlan.status_code = wifi.STAT_CONNECTING
+    clock.now += wifi.CONNECT_TIMEOUT_MS - 1
+    wlan.check_status()
+    assert wlan.state == wifi.CONNECTING
+    clock.now += 1
+    wlan.check_status()
+    assert wlan.state == wifi.BACKOFF
+    assert wlan.last_error == wifi.STAT_CONNECT_FAIL
+    assert wlan.failures == 1
+
+
+def test_backoff_grows_and_is_capped(wlan, clock):
+    delays = []
+    for attempt in range(12):
+        wlan.check_status()
+        assert wlan.state == wifi.CONNECTING
+        delays.append(fail_attempt(wlan, clock, wifi.STAT_NO_AP_FOUND))
+        clock.now += delays[-1]
+    for failures, delay in enumerate(delays, 1):
+        limit = min(wifi.BACKOFF_BASE_MS << (failures - 1), wifi.BACKOFF_MAX_MS)
+        assert limit // 2 <= delay <= limit
+    assert wlan.connects == 12
+
+
+def test_no_attempt_during_backoff(wlan, clock):
+    wlan.check_status()
+    delay = fail_attempt(wlan, clock, wifi.STAT_NO_AP_FOUND)
+    clock.now += delay - 1
+    wlan.check_status()
+    assert wlan.state == wifi.BACKOFF
+    assert wlan.connects == 1
+    clock.now += 1
+    wlan.check_status()
+    assert wlan.state == wifi.CONNECTING
+    assert wlan.connects == 2
+
+
+def test_backoff_is_jittered(wlan, clock):
+    wlan.failures = 8
+    assert len({wlan.backoff_ms() for _ in range(20)}) > 1
+
+
+def test_wrong_password_backs_off_longest(wlan, clock):
+    wlan.check_status()
+    delay = fail_attempt(wlan, clock, wifi.STAT_WRONG_PASSWORD)
+    assert wlan.last_error == wifi.STAT_WRONG_PASSWORD
+    assert wifi.BACKOFF_MAX_MS // 2 <= delay <= wifi.BACKOFF_MAX_MS
+    # It is still retried in case the access point is reconfigured
+    clock.now += delay
+    wlan.check_status()
+    assert wlan.state == wifi.CONNECTING
+
+
+def test_success_resets_failures(wlan, clock):
+    wlan.check_status()
+    clock.now += fail_attempt(wlan, clock, wifi.STAT_NO_AP_FOUND)
+    wlan.check_status()
+    wlan.status_code = wifi.STAT_GOT_IP
+    wlan.check_status()
+    assert wlan.state == wifi.CONNECTED
+    assert wlan.failures == 0
+    assert wlan.last_error is None
+
+
+def test_reconnects_at_once_when_connection_lost(wlan, clock):
+    wlan.check_status()
+    wlan.status_code = wifi.STAT_GOT_IP
+    wlan.check_status()
+    wlan.status_code = wifi.STAT_NO_IP
+    wlan.check_status()
+    assert wlan.state == wifi.CONNECTING
+    assert wlan.connects == 2
+    assert wlan.changes[-1] == (wifi.CONNECTED, wifi.CONNECTING)
+    assert not wlan.icon.connected
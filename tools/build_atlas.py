@@ -0,0 +1,70 @@
+import struct
+from zlib import compress
+
+from image_to_binary import decode_image, encode_payload
+
+# Atlas header: magic, version, number of sprites. Must match image.py.
+ATLAS_MAGIC = b"ATL"
+ATLAS_HEADER = "<3sBB"
+ATLAS_ENTRY = "<HHHH"
+
+
+def pack_sprites(sizes: dict[str, tuple[int, int]], max_width: int = 128) -> dict[str, tuple[int, int, int, int]]:
+    """Place sprites on shelves from tallest to shortest.
+
+    :param sizes: Width and height of each sprite by name.
+    :param max_width: The width at which a new shelf is started.
+    :return: The x, y, width and height of each sprite in the atlas by name.
+    """
+    rects = {}
+    x = y = shelf_height = 0
+    for name in sorted(sizes, key=lambda key: (-sizes[key][1], key)):
+        width, height = sizes[name]
+        if x > 0 and x + width > max_width:
+            x = 0
+            y += shelf_height
+            shelf_height = 0
+        rects[name] = (x, y, width, height)
+        x += width
+        shelf_height = max(shelf_height, height)
+    return rects
+
+
+def build_atlas(sprite_paths: dict[str, str], output_path: str, max_width: int = 128, rle=True):
+    """Pack several images into a single compressed atlas file.
+
+    The file is one zlib stream of ATLAS_HEADER, then for each sprite a length-prefixed ASCII name followed by its x,
+    y, width and height as ATLAS_ENTRY, then the whole atlas as a version 2 image. The atlas image has a spare blank
+    row at the bottom so the device can address every sprite as a strided view of the atlas buffer.
+
+    :param sprite_paths: The path of a version 1 or version 2 image for each sprite name.
+    :param output_path: The path to store the atlas.
+    :param max_width: The maximum width of a row of sprites.
+    :param rle: Run-length encode the atlas pixel data.
+    """
+    sprites = {}
+    for name, path in sprite_paths.items():
+        with open(path, "rb") as input_file:
+            sprites[name] = decode_image(input_file.read())
+
+    rects = pack_sprites({name: (width, height) for name, (width, height, _) in sprites.items()}, max_width)
+    atlas_width = max(x + width for x, _, width, _ in rects.values())
+    atlas_height = max(y + height for _, y, _, height in rects.values())
+    pixels = [0] * (atlas_width * atlas_height)
+    for name, (x, y, width, height) in rects.items():
+        sprite_pixels = sprites[name][2]
+        for row in range(height):
+            start = (y + row) * atlas_width + x
+            pixels[start:start + width] = sprite_pixels[row * width:(row + 1) * width]
+
+    data = bytearray(struct.pack(ATLAS_HEADER, ATLAS_MAGIC, 1, len(rects)))
+    for name, rect in rects.items():
+        encoded_name = name.encode("ascii")
+        data += struct.pack("<B", len(encoded_name)) + encoded_name + struct.pack(ATLAS_ENTRY, *rect)
+    data += encode_payload(pixels + [0] * atlas_width, atlas_width, atlas_height + 1, rle=rle)
+    with open(output_path, "wb") as output_file:
+        output_file.write(compress(bytes(data)))
+
+
+if __name__ == "__main__":
+    build_atlas({"wifi": "images/wifi.bin", "x": "images/x.bin"}, "images/icons.bin")
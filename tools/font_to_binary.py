@@ -1,22 +1,80 @@
+import os
+import struct
+from zlib import compress
+
 from PIL import Image, ImageDraw, ImageFont
 import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 
-matplotlib.use("TkAgg")
-font_size = 128
+# Font header: magic, version, glyph height, number of glyphs. Must match font.py.
+FONT_MAGIC = b"FNT"
+FONT_HEADER = "<3sBBB"
+FONT_ENTRY = "<HBH"  # Character code, width, offset of the glyph bitmap
+
+READOUT_CHARACTERS = "0123456789.-: %CTempHuidty"
+
+
+def rasterise_font(font_path: str, font_size: int, characters: str, threshold: int = 128) -> tuple[int, dict]:
+    """Render each character of a TrueType font as a 1 bit image.
+
+    :param font_path: The path of the TTF file.
+    :param font_size: The font size in pixels.
+    :param characters: The characters to include.
+    :param threshold: Greyscale level from 0 to 255 at and above which a pixel is set.
+    :return: The glyph height and a boolean array of shape (height, width) for each character.
+    """
+    font = ImageFont.truetype(font_path, font_size)
+    ascent, descent = font.getmetrics()
+    height = ascent + descent
+    glyphs = {}
+    for char in characters:
+        width = max(round(font.getlength(char)), 1)
+        img = Image.new("L", (width, height))
+        d = ImageDraw.Draw(img)
+        d.fontmode = "L"
+        d.text((0, 0), char, font=font, fill=255)
+        glyphs[char] = np.asarray(img) >= threshold
+    return height, glyphs
+
+
+def pack_glyph(bits: np.ndarray) -> bytes:
+    """Pack a boolean glyph image into rows of bytes, most significant bit first, as read by framebuf.MONO_HLSB."""
+    height, width = bits.shape
+    row_bytes = (width + 7) // 8
+    padded = np.zeros((height, row_bytes * 8), dtype=bool)
+    padded[:, :width] = bits
+    return np.packbits(padded, axis=1).tobytes()
+
+
+def write_font(output_path: str, height: int, glyphs: dict):
+    """Write glyphs as a compressed font file.
+
+    The file is one zlib stream of FONT_HEADER, a FONT_ENTRY for each glyph and then the packed glyph bitmaps.
+    """
+    entries = bytearray()
+    bitmaps = bytearray()
+    for char, bits in glyphs.items():
+        entries += struct.pack(FONT_ENTRY, ord(char), bits.shape[1], len(bitmaps))
+        bitmaps += pack_glyph(bits)
+    data = struct.pack(FONT_HEADER, FONT_MAGIC, 1, height, len(glyphs)) + entries + bitmaps
+    with open(output_path, "wb") as output_file:
+        output_file.write(compress(bytes(data)))
+
+
+def ttf_to_font(font_path: str, output_path: str, font_size: int, characters: str = READOUT_CHARACTERS,
+                threshold: int = 128):
+    """Rasterise a TrueType font and write it in the device font format."""
+    height, glyphs = rasterise_font(font_path, font_size, characters, threshold)
+    write_font(output_path, height, glyphs)
+
 
-# make a blank image for the text, initialized to transparent text color
-img = Image.new("RGBA", (font_size, font_size))
+def plot_glyph(bits: np.ndarray):
+    plt.imshow(bits, cmap="Greys", interpolation="none")
+    plt.show()
 
-# get a font
-fnt = ImageFont.truetype(r"C:\Users\Peter\Downloads\Roboto\Roboto-Regular.ttf", font_size)
-# get a drawing context
-d = ImageDraw.Draw(img)
-d.fontmode = "L"
-# draw text
-d.text((0, 0), "A", font=fnt, fill=1)
 
-data = np.asarray(img)
-plt.imshow(data, interpolation='none')
-plt.show()
+if __name__ == "__main__":
+    matplotlib.use("TkAgg")
+    # DejaVu Sans is installed with matplotlib, so the readout font can be rebuilt anywhere the tools run
+    ttf_to_font(os.path.join(matplotlib.get_data_path(), "fonts", "ttf", "DejaVuSans.ttf"), "fonts/readout.bin", 14)
@@ -1,4 +1,5 @@
-from zlib import compress
+import struct
+from zlib import compress, decompress
 
 from PIL import Image
 import PIL.ImageOps
@@ -6,11 +7,18 @@ import numpy as np
 import matplotlib.pyplot as plt
 import matplotlib
 
-matplotlib.use("TkAgg")
+# Version 2 header: magic, version, pixel format, encoding, width, height, palette size. Must match image.py.
+V2_MAGIC = b"PIC"
+V2_HEADER = "<3sBBBHHH"
+FORMAT_RGB565 = 0
+FORMAT_INDEXED = 1
+ENCODING_RAW = 0
+ENCODING_RLE = 1
 
 
-def image_to_bin(input_path: str, output_path: str, dimensions: tuple, crop: tuple, invert=False, mode="RGB"):
-    """Convert an image to a compressed binary format.
+def image_to_bin(input_path: str, output_path: str, dimensions: tuple, crop: tuple, invert=False, mode="RGB",
+                 indexed=True, rle=True):
+    """Convert an image to the compressed version 2 binary format.
 
     :param input_path: The path to read the image.
     :param output_path: The path to store the compressed binary.
@@ -18,6 +26,8 @@ def image_to_bin(input_path: str, output_path: str, dimensions: tuple, crop: tup
     :param crop: A 4 value tuple describing the top, bottom, left, and right crop values.
     :param invert: Whether to invert the colour of the image.
     :param mode: "L" for greyscale, "RGB" for RGB.
+    :param indexed: Store a palette and one byte per pixel if the image has at most 256 colours.
+    :param rle: Run-length encode the pixel data.
     """
 
     x, y = dimensions
@@ -31,24 +41,111 @@ def image_to_bin(input_path: str, output_path: str, dimensions: tuple, crop: tup
     data = np.array(data)
 
     plot_cropped_image(data, mode, top_crop, bottom_crop, left_crop, right_crop)
+    data = data[top_crop:bottom_crop, left_crop:right_crop]
     if mode == "L":
-        data = list(data[top_crop:bottom_crop, left_crop:right_crop].flatten())
-        data = [0, (right_crop - left_crop), (bottom_crop - top_crop)] + data
+        data = [greyscale_to_colour(int(pixel)) for pixel in data.flatten()]
     else:
-        data = data[top_crop:bottom_crop, left_crop:right_crop]
         data = data.reshape((data.shape[0] * data.shape[1], 3))
-        data = [(pixel[1] & 0b00011100) << 11 |  # low end of green
-                (pixel[2] & 0b11111000) << 5 |  # blue
-                (pixel[0] & 0b11111000) |  # red
-                (pixel[1] & 0b11100000) >> 5  # High end of green
-                for pixel in data]
-        data = [1, (right_crop - left_crop), (bottom_crop - top_crop)] + data
-
-    data = compress(bytes(data))
+        data = [rgb_to_colour(int(pixel[0]), int(pixel[1]), int(pixel[2])) for pixel in data]
+
+    data = encode_image(data, right_crop - left_crop, bottom_crop - top_crop, indexed, rle)
     with open(output_path, "wb") as output_file:
         output_file.write(data)
 
 
+def rgb_to_colour(red: int, green: int, blue: int) -> int:
+    """Convert 8 bit RGB components to the little-endian RGB565 value used by the device frame buffers."""
+    return ((green & 0b00011100) << 11 |  # low end of green
+            (blue & 0b11111000) << 5 |  # blue
+            (red & 0b11111000) |  # red
+            (green & 0b11100000) >> 5)  # High end of green
+
+
+def greyscale_to_colour(pixel: int) -> int:
+    """Convert an 8 bit greyscale value to the little-endian RGB565 value used by the device frame buffers."""
+    return rgb_to_colour(pixel, pixel, pixel)
+
+
+def encode_image(pixels: list[int], width: int, height: int, indexed=True, rle=True) -> bytes:
+    """Encode RGB565 pixel values in row, column order as a compressed version 2 image."""
+    return compress(encode_payload(pixels, width, height, indexed, rle))
+
+
+def encode_payload(pixels: list[int], width: int, height: int, indexed=True, rle=True) -> bytes:
+    """Encode RGB565 pixel values in row, column order as an uncompressed version 2 header and payload.
+
+    Indexed images store a palette of colours followed by one byte per pixel. RLE payloads are a sequence of
+    (count, value) runs with counts of 1 to 255.
+    """
+    if len(pixels) != width * height:
+        raise ValueError("Number of pixels does not match width and height.")
+    palette = sorted(set(pixels))
+    indexed = indexed and len(palette) <= 256
+    if indexed:
+        lookup = {colour: index for index, colour in enumerate(palette)}
+        values = [lookup[pixel] for pixel in pixels]
+        value_format = "<B"
+    else:
+        palette = []
+        values = pixels
+        value_format = "<H"
+
+    payload = bytearray(struct.pack(V2_HEADER, V2_MAGIC, 2, FORMAT_INDEXED if indexed else FORMAT_RGB565,
+                                    ENCODING_RLE if rle else ENCODING_RAW, width, height, len(palette)))
+    for colour in palette:
+        payload += struct.pack("<H", colour)
+    if rle:
+        index = 0
+        while index < len(values):
+            count = 1
+            while index + count < len(values) and count < 255 and values[index + count] == values[index]:
+                count += 1
+            payload += struct.pack("<B", count) + struct.pack(value_format, values[index])
+            index += count
+    else:
+        for value in values:
+            payload += struct.pack(value_format, value)
+    return bytes(payload)
+
+
+def decode_image(data: bytes) -> tuple[int, int, list[int]]:
+    """Decode a compressed version 1 or version 2 image to its width, height and RGB565 pixel values."""
+    data = decompress(data)
+    if data[:3] != V2_MAGIC:
+        mode, width, height = data[0], data[1], data[2]
+        if mode == 0:
+            return width, height, [greyscale_to_colour(pixel) for pixel in data[3:]]
+        return width, height, list(data[3:])
+
+    _, version, pixel_format, encoding, width, height, palette_size = struct.unpack_from(V2_HEADER, data)
+    offset = struct.calcsize(V2_HEADER)
+    palette = list(struct.unpack_from(f"<{palette_size}H", data, offset))
+    offset += palette_size * 2
+    value_format = "<B" if pixel_format == FORMAT_INDEXED else "<H"
+    value_size = struct.calcsize(value_format)
+    values = []
+    while offset < len(data):
+        count = 1
+        if encoding == ENCODING_RLE:
+            count = data[offset]
+            offset += 1
+        values += [struct.unpack_from(value_format, data, offset)[0]] * count
+        offset += value_size
+    if pixel_format == FORMAT_INDEXED:
+        values = [palette[value] for value in values]
+    if len(values) != width * height:
+        raise ValueError("Number of pixels does not match width and height.")
+    return width, height, values
+
+
+def legacy_to_v2(input_path: str, output_path: str, indexed=True, rle=True):
+    """Convert a version 1 binary, as read by the original device code, to the version 2 format."""
+    with open(input_path, "rb") as input_file:
+        width, height, pixels = decode_image(input_file.read())
+    with open(output_path, "wb") as output_file:
+        output_file.write(encode_image(pixels, width, height, indexed, rle))
+
+
 def plot_cropped_image(data: np.array, mode: str, top_crop: int, bottom_crop: int, left_crop: int, right_crop: int):
     if mode == "L":
         plt.imshow(data, cmap="gray", interpolation=None)
@@ -87,5 +184,6 @@ def greyscale_test_image(input_path: str, output_path: str):
 
 
 if __name__ == "__main__":
+    matplotlib.use("TkAgg")
     image_to_bin("C:/Users/Peter/Desktop/wifi.png", "images/wifi.bin", (16, 16), (1, 15, 0, 16), mode="L", invert=True)
     image_to_bin("C:/Users/Peter/Desktop/x.png", "images/x.bin", (16, 16), (0, 16, 0, 16), mode="RGB")
@@ -0,0 +1,122 @@
+from ext.waveshare.lcd import LCD
+
+import image
+from font import Font
+
+
+class Widget:
+    """A rectangle of the screen which owns its drawing and is only redrawn when marked dirty."""
+
+    def __init__(self, x: int, y: int, width: int, height: int):
+        """
+        :param x: x coordinate of the top left of the bounding box in pixels.
+        :param y: y coordinate of the top left of the bounding box in pixels.
+        :param width: Width of the bounding box in pixels.
+        :param height: Height of the bounding box in pixels.
+        """
+        self.x = x
+        self.y = y
+        self.width = width
+        self.height = height
+        self.dirty = True
+
+    def invalidate(self):
+        """Mark the widget to be redrawn in the next frame."""
+        self.dirty = True
+
+    def update(self):
+        """Called at the start of every frame to check for changes and invalidate the widget if needed."""
+        pass
+
+    def draw(self, screen: LCD):
+        """Draw the widget within its bounding box."""
+        raise NotImplementedError("Not implemented in base class")
+
+    def render(self, screen: LCD) -> bool:
+        """Draw the widget if it is dirty. Returns True if it was drawn."""
+        if not self.dirty:
+            return False
+        self.dirty = False
+        self.draw(screen)
+        return True
+
+
+class Compositor:
+    """Renders the dirty widgets of a layout once per frame followed by a single show."""
+
+    def __init__(self, screen: LCD):
+        self.screen = screen
+        self.widgets = []
+
+    def add(self, widget: Widget) -> Widget:
+        self.widgets.append(widget)
+        return widget
+
+    def invalidate(self):
+        """Mark every widget to be redrawn, for example after the screen has been cleared."""
+        for widget in self.widgets:
+            widget.invalidate()
+
+    def render(self) -> bool:
+        """Draw a frame. Returns True if anything was drawn and sent to the display."""
+        changed = False
+        for widget in self.widgets:
+            widget.update()
+            changed = widget.render(self.screen) or changed
+        if changed:
+            self.screen.show()
+        return changed
+
+
+class Readout(Widget):
+    """A line of text showing the latest value of a sensor, redrawn only when the text changes."""
+
+    def __init__(self, sensor, x: int, y: int, width: int, font: Font = None):
+        """
+        :param sensor: A sensors.Sensor.
+        :param font: Font for the text, or None for the built-in 8x8 font.
+        """
+        super().__init__(x, y, width, 8 if font is None else font.height)
+        self.sensor = sensor
+        self.font = font
+        self.text = None
+
+    def update(self):
+        if not len(self.sensor.history.raw):
+            return
+        text = self.sensor.readout()
+        if text != self.text:
+            self.text = text
+            self.invalidate()
+
+    def draw(self, screen: LCD):
+        screen.fill_rect(self.x, self.y, self.width, self.height, screen.BLACK)
+        if self.text is None:
+            return
+        if self.font is None:
+            screen.text(self.text, self.x, self.y, screen.WHITE)
+        else:
+            self.font.text(screen, self.text, self.x, self.y, screen.WHITE, screen.BLACK)
+
+
+class WifiIcon(Widget):
+    """The Wi-Fi symbol, crossed out when there is no connection."""
+
+    def __init__(self, icons: image.Atlas, x: int, y: int):
+        """
+        :param icons: Atlas containing "wifi" and "x" sprites.
+        """
+        super().__init__(x, y, 16, 16)
+        self.icons = icons
+        self.connected = False
+
+    def set_connected(self, connected: bool):
+        if connected != self.connected:
+            self.connected = connected
+            self.invalidate()
+
+    def draw(self, screen: LCD):
+        screen.fill_rect(self.x, self.y, self.width, self.height, screen.BLACK)
+        self.icons.blit(screen, "wifi", self.x, self.y + 1)
+        if not self.connected:
+            self.icons.blit(screen, "x", self.x, self.y, 0)
@@ -1,65 +1,162 @@
+import random
 from time import sleep
 
-from ext.typing.typing import Optional
 from ext.waveshare.lcd import LCD
 
 import network
 import image
+from logger import log
+from scheduler import ticks_ms, ticks_diff, ticks_add
+from widgets import WifiIcon
+
+# CYW43 link status codes returned by WLAN.status()
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_NO_IP = 2  # Joined but waiting for DHCP
+STAT_GOT_IP = 3
+STAT_CONNECT_FAIL = -1
+STAT_NO_AP_FOUND = -2
+STAT_WRONG_PASSWORD = -3
+
+STATUS_NAMES = {
+    STAT_IDLE: "idle",
+    STAT_CONNECTING: "connecting",
+    STAT_NO_IP: "no IP",
+    STAT_GOT_IP: "got IP",
+    STAT_CONNECT_FAIL: "connection failed",
+    STAT_NO_AP_FOUND: "no access point",
+    STAT_WRONG_PASSWORD: "wrong password",
+}
+
+# Connection states
+DISCONNECTED = "disconnected"
+CONNECTING = "connecting"
+CONNECTED = "connected"
+BACKOFF = "backoff"
+
+CONNECT_TIMEOUT_MS = 15_000
+BACKOFF_BASE_MS = 1000
+BACKOFF_MAX_MS = 300_000
+
 
 class StatefulWLAN(network.WLAN):
+    """A station interface which keeps itself connected.
+
+    check_status advances a state machine without blocking so it can be called often. A connection attempt is left
+    to finish or time out, and after a failure the next attempt waits an exponentially growing, randomly jittered
+    delay so that a missing access point is not hammered with requests.
+    """
+
     def __init__(self, ssid: str, password: str):
         super().__init__(network.STA_IF)
         self.previous_status = None
         self.ssid = ssid
         self.password = password
+        self.state = DISCONNECTED
+        self.failures = 0  # Consecutive failed attempts, used to scale the backoff
+        self.last_error = None  # Status code of the last failed attempt
+        self._deadline = 0  # End of the current attempt or backoff
+        self._callbacks = []
         self.active(True)
 
-        self.wifi_image = image.Image("images/wifi.bin")
-        self.x_image = image.Image("images/x.bin")
+        self.icon = WifiIcon(image.Atlas("images/icons.bin"), 120, 1)
+        self.on_change(lambda old, new: self.icon.set_connected(new == CONNECTED))
 
     def connect(self, **kwargs):
         super().connect(self.ssid, self.password)
 
-    def check_status(self, screen: Optional[LCD] = None) -> int:
-        """Check the status of the Wi-Fi connection."""
+    def on_change(self, callback):
+        """Call callback(old_state, new_state) whenever the connection state changes."""
+        self._callbacks.append(callback)
+
+    def check_status(self) -> int:
+        """Advance the connection state machine by one step without blocking. Returns the link status."""
         status = self.status()
-        print(f"Wifi status: {status}")
-        if status != 3:
-            self.disconnect()
-            self.connect()
-        if screen:
-            self._update_wifi_icon(status, screen)
-        self.previous_status = status
+        if status != self.previous_status:
+            log.debug("Wifi status: %s", STATUS_NAMES.get(status, status))
+            self.previous_status = status
+        now = ticks_ms()
+
+        if self.state == CONNECTED:
+            if status != STAT_GOT_IP:
+                log.warning("Wifi connection lost: %s", STATUS_NAMES.get(status, status))
+                self.failures = 0
+                self._start_attempt(now)
+        elif self.state == CONNECTING:
+            if status == STAT_GOT_IP:
+                self.failures = 0
+                self.last_error = None
+                log.info("Wifi connected, IP %s", self.ifconfig()[0])
+                self._set_state(CONNECTED)
+            elif status < 0:
+                self._fail(status, now)
+            elif ticks_diff(now, self._deadline) >= 0:
+                self._fail(STAT_CONNECT_FAIL, now)
+        elif self.state == BACKOFF:
+            if ticks_diff(now, self._deadline) >= 0:
+                self._start_attempt(now)
+        else:
+            self._start_attempt(now)
         return status
 
-    def _update_wifi_icon(self, status: int, screen: LCD):
-        screen.blit(self.wifi_image.get_framebuffer(), 120, 2)
-        if status != 3:
-            screen.blit(self.x_image.get_framebuffer(), 120, 1, 0)
-        screen.show()
+    def backoff_ms(self) -> int:
+        """The delay before the next attempt after the current run of failures. Half is fixed and half random, so
+        devices which lost the same access point do not retry in step."""
+        delay = min(BACKOFF_BASE_MS << min(self.failures - 1, 16), BACKOFF_MAX_MS)
+        return delay // 2 + random.randint(0, delay // 2)
 
-    def initialise(self, screen: LCD) -> bool:
-        """Initialise the Wi-Fi connection. Return True on success."""
+    def _start_attempt(self, now: int):
+        self.disconnect()
         self.connect()
-        i = 0
-        while i < 10:
-            screen.fill(screen.BLACK)
-            screen.text(f"Connecting... {i}", 5, 5, screen.WHITE)
-            screen.show()
-            sleep(1)
-            status = self.check_status()
-            if status == 3:
+        self._deadline = ticks_add(now, CONNECT_TIMEOUT_MS)
+        self._set_state(CONNECTING)
+
+    def _fail(self, status: int, now: int):
+        self.last_error = status
+        self.failures += 1
+        if status == STAT_WRONG_PASSWORD:
+            # Retrying soon will not help, but the access point may be reconfigured
+            self.failures = max(self.failures, 16)
+        self.disconnect()
+        delay = self.backoff_ms()
+        log.warning("Wifi %s, retrying in %0.1f s", STATUS_NAMES.get(status, status), delay / 1000)
+        self._deadline = ticks_add(now, delay)
+        self._set_state(BACKOFF)
+
+    def _set_state(self, state: str):
+        old = self.state
+        if state == old:
+            return
+        self.state = state
+        for callback in self._callbacks:
+            callback(old, state)
+
+    def initialise(self, screen: LCD, timeout_ms: int = 10_000) -> bool:
+        """Start the Wi-Fi connection and wait up to timeout_ms for it. Return True on success. If it does not
+        connect in time, check_status carries on trying in the background."""
+        start = ticks_ms()
+        shown = None
+        while ticks_diff(ticks_ms(), start) < timeout_ms:
+            self.check_status()
+            if self.state == CONNECTED:
                 screen.fill(screen.BLACK)
                 screen.text(f"IP: {self.ifconfig()[0]}", 5, 5, screen.WHITE)
                 screen.show()
                 sleep(1)
-                print("Wifi connected")
                 return True
-            i += 1
+            message = f"Connecting... {ticks_diff(ticks_ms(), start) // 1000}"
+            if self.state == BACKOFF:
+                message = STATUS_NAMES.get(self.last_error, "Retrying")
+            if message != shown:
+                screen.fill(screen.BLACK)
+                screen.text(message, 5, 5, screen.WHITE)
+                screen.show()
+                shown = message
+            sleep(0.1)
 
         screen.fill(screen.BLACK)
         screen.text(f"Unable to connect to wifi", 5, 5, screen.WHITE)
-        print("Unable to connect to Wifi")
+        log.warning("Unable to connect to Wifi")
         screen.show()
         sleep(1)
         screen.fill(screen.BLACK)